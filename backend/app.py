@@ -1,27 +1,77 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, stream_with_context, url_for
 from flask_cors import CORS
-from dataclasses import dataclass, asdict
-from typing import List, Dict
+from dataclasses import dataclass, fields, replace
+from typing import List, Dict, Sequence
 import random
 import time
 import threading
-from geopy.distance import geodesic
 import folium
-from io import BytesIO
 import json
-import pandas as pd
 from datetime import datetime
 import os
+import sys
+import numpy as np
+from spatial_index import StationSpatialIndex
+from station_store import StationSnapshot, StationStore, parse_since
+from shared_table import SharedStationTable
+from delta_feed import DeltaFeed, parse_bbox
+from serialization import FastJSONProvider, JsonCodec, StationJsonCache, dict_columns, list_format, record_columns
+from ml_export import EXPORT_FORMATS, MLDatasetExporter, is_peak_hour
+from map_cache import RenderedMapCache
+from availability_history import AvailabilityHistory
+from occupancy_model import OccupancyModel
+from station_ranking import RankingQuery, StationRanker
+from road_network import DriveTimeEngine, RoadGraph
+from station_source import StationSource, open_station_source
+from status_ingest import ReplayStatusEvents, SimulatedStatusEvents, StatusEvents, StatusIngest
+from query_cache import NearbyQueryCache
+from metrics import CONTENT_TYPE, SamplingProfiler, registry as metrics_registry, stage, timed_chunks
+from flask_metrics import RequestMetrics
 
 # Configuration
 class Config:
     SECRET_KEY = 'ev-charging-location-based'
     CORS_ORIGINS = ["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:5173", "http://localhost:5174", "http://127.0.0.1:5173", "http://127.0.0.1:5174"]
-    UPDATE_INTERVAL = 30
+    UPDATE_INTERVAL = float(os.environ.get('UPDATE_INTERVAL', 30))  # seconds between update ticks (inventory polls, status events)
+    MAX_BATCH_SIZE = 1000
+    MAP_CACHE_ENTRIES = 64
+    MAP_CACHE_BYTES = 32 * 1024 * 1024
+    MAP_COORDINATE_DECIMALS = 4  # ~11 m, same precision the map info panel shows
+    STREAM_HEARTBEAT = 15  # seconds between keep-alive comments on idle streams
+    ML_EXPORT_BATCH_SIZE = 5000
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')  # 'orjson', 'stdlib', or 'auto' (orjson when installed)
+    DISTANCE_PRECISION = os.environ.get('DISTANCE_PRECISION', 'exact')  # 'exact', 'haversine' or 'equirectangular'
+    SHARED_STATE_PATH = os.environ.get('SHARED_STATE_PATH')  # set to share one station table across gunicorn workers
+    STATION_SOURCE = os.environ.get('STATION_SOURCE')  # CSV, GeoJSON, Parquet or SQLite inventory; unset uses the demo stations
+    STATION_SOURCE_TABLE = os.environ.get('STATION_SOURCE_TABLE', 'stations')  # table read from a SQLite inventory
+    STATUS_EVENTS = os.environ.get('STATUS_EVENTS')  # CSV or JSON Lines status events to replay; unset simulates them for the demo stations
+    STATUS_REPLAY_SPEED = float(os.environ.get('STATUS_REPLAY_SPEED', 1))  # how many times faster than recorded events are replayed
+    STATUS_CHANGE_SHARE = 0.3  # share of the demo stations reporting new free slots each tick
+    STATUS_BATCH_SIZE = 5000  # station changes published per store version while applying events
+    HISTORY_DIR = os.environ.get('HISTORY_DIR')  # set to keep availability history on disk, not just in memory
+    HISTORY_CAPACITY = 1_000_000  # records kept in memory (16 bytes each)
+    HISTORY_MAX_HOURS = 24 * 7
+    OCCUPANCY_MODEL_PATH = os.environ.get('OCCUPANCY_MODEL_PATH')  # model trained offline with occupancy_model.py
+    OCCUPANCY_PERSISTENCE_MINUTES = 20  # how long a station's current state still predicts its state on arrival
+    LIKELY_AVAILABLE_PROBABILITY = 0.6
+    ARRIVAL_CANDIDATES = 10
+    ROAD_GRAPH_PATH = os.environ.get('ROAD_GRAPH_PATH')  # road graph (.npz from road_network.py, or an .osm extract)
+    ROUTE_CANDIDATES = 8  # closest stations compared by drive time when a road graph is loaded
+    ROUTE_CACHE_ENTRIES = 4096
+    QUERY_CACHE_PRECISION = int(os.environ.get('QUERY_CACHE_PRECISION', 6))  # geohash length queries share candidates at (6: ~1.2 x 0.6 km)
+    QUERY_CACHE_ENTRIES = 4096
+    QUERY_CACHE_POSITIONS = 2_000_000  # station positions held across all cached cells (8 bytes each)
+    QUERY_CACHE_NEAREST = 64  # stations kept around a cell for find-nearest, before availability filtering
+    BACKGROUND_UPDATES = os.environ.get('BACKGROUND_UPDATES', 'thread')  # 'thread', 'asyncio' (asgi.py sets it) or 'none'
+    ASGI_THREADS = int(os.environ.get('ASGI_THREADS', 32))  # threads running the synchronous routes under asgi.py
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # fraction of requests stack-sampled; 0 disables (sync/threaded workers only, not gevent)
+    PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))  # sampled requests slower than this keep their profile
+    PROFILE_INTERVAL_MS = 5
+    PROFILE_KEEP = 20
     JALANDHAR_COORDINATES = (31.3260, 75.5762)
     PHAGWARA_COORDINATES = (31.2249, 75.7705)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ChargingStation:
     id: str
     name: str
@@ -36,14 +86,126 @@ class ChargingStation:
     operator: str
     available_slots: int
     total_slots: int
-    timestamp: str
+    
+    def __post_init__(self):
+        # Connector types and operators come from tiny vocabularies; share one string object per value
+        object.__setattr__(self, 'connector_type', sys.intern(self.connector_type))
+        object.__setattr__(self, 'operator', sys.intern(self.operator))
+    
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence]) -> List['ChargingStation']:
+        """Build many stations from equal-length columns, one field at a time (bulk loads).
+        
+        Same records as calling the constructor row by row, at a fraction of
+        the cost: the frozen __init__ pays a guarded setattr per field and row,
+        here each slot is filled with one C-level map over its column.
+        """
+        new = object.__new__
+        stations = [new(cls) for _ in range(len(columns['id']))]
+        for field in STATION_FIELDS:
+            values = columns[field.name]
+            if field.name in ('connector_type', 'operator'):
+                values = map(sys.intern, values)  # what __post_init__ does for single records
+            list(map(getattr(cls, field.name).__set__, stations, values))
+        return stations
+    
+    @property
+    def timestamp(self) -> str:
+        """ISO form of last_updated, derived on demand instead of stored on every record"""
+        return datetime.fromtimestamp(self.last_updated).isoformat()
+    
+    def to_dict(self) -> Dict:
+        """Plain dict of the station, including the derived timestamp"""
+        data = {field.name: getattr(self, field.name) for field in STATION_FIELDS}
+        data['timestamp'] = self.timestamp
+        return data
+
+STATION_FIELDS = fields(ChargingStation)
 
 class LocationBasedChargingService:
-    def __init__(self):
+    def __init__(self, shared_state_path: str = None, source: StationSource = None, status_events: StatusEvents = None):
         self.connector_types = ['Type2', 'CCS', 'CHAdeMO', 'Bharat DC-001']
         self.operators = ['Tata Power', 'BSES', 'Fortum', 'Magenta', 'EVRE']
-        self.stations = self._generate_stations()
+        self.store = StationStore(lambda stations: StationSpatialIndex.from_stations(stations, Config.DISTANCE_PRECISION))
+        self.ranker = StationRanker(self.store, self.drive_minutes)
+        self.query_cache = NearbyQueryCache(self.store, Config.QUERY_CACHE_PRECISION, Config.QUERY_CACHE_ENTRIES,
+                                            Config.QUERY_CACHE_POSITIONS, Config.QUERY_CACHE_NEAREST)
+        self.drive_times = None
+        if Config.ROAD_GRAPH_PATH:
+            self.drive_times = DriveTimeEngine(RoadGraph.load(Config.ROAD_GRAPH_PATH), Config.ROUTE_CACHE_ENTRIES)
+        self.shared_table = None
+        # Without an inventory the built-in demo stations are generated (and their availability simulated)
+        self.source = source
+        self.simulated_events = SimulatedStatusEvents(Config.STATUS_CHANGE_SHARE)
+        if status_events is None and source is None:
+            status_events = self.simulated_events
+        self.status_ingest = StatusIngest(self.store, status_events, Config.STATUS_BATCH_SIZE)
+        load_stations = source.load if source is not None else self._generate_stations
+        if Config.OCCUPANCY_MODEL_PATH and os.path.exists(Config.OCCUPANCY_MODEL_PATH):
+            self.occupancy_model = OccupancyModel.load(Config.OCCUPANCY_MODEL_PATH, persistence_minutes=Config.OCCUPANCY_PERSISTENCE_MINUTES)
+        else:
+            self.occupancy_model = OccupancyModel(Config.OCCUPANCY_PERSISTENCE_MINUTES)
+        if shared_state_path:
+            self.shared_table = SharedStationTable(shared_state_path, ChargingStation)
+            self.shared_table.attach(self.store, load_stations)
+        else:
+            self.stations = load_stations()
+        
+    def snapshot(self) -> StationSnapshot:
+        """Consistent view of all stations; take one per request and read only from it"""
+        if self.shared_table is not None:
+            self.shared_table.sync(self.store)
+        return self.store.snapshot()
+    
+    def lineage(self) -> str:
+        """Id that, together with the version, names one exact station state (used for ETags)"""
+        if self.shared_table is not None and self.shared_table.lineage:
+            return self.shared_table.lineage
+        return self.store.lineage
+    
+    def changed_since(self, version: int, lineage: str = None):
+        """Stations changed after `version` as (snapshot, stations), or (snapshot, None) if the client must resync.
+        
+        Resync when the version is too far back, ahead of ours, or from another lineage.
+        """
+        snapshot = self.snapshot()
+        if lineage is not None and lineage != self.lineage():
+            return snapshot, None
+        changed_ids = self.store.changed_since(version)
+        if changed_ids is None:
+            return snapshot, None
+        stations = [snapshot.get(station_id) for station_id in changed_ids]
+        return snapshot, [station for station in stations if station is not None]
+    
+    def owns_updates(self) -> bool:
+        """Whether this process should run the simulated updates (always, unless another worker owns the shared table)"""
+        return self.shared_table is None or self.shared_table.try_acquire_writer(self.store)
+    
+    @property
+    def version(self) -> int:
+        return self.snapshot().version
+    
+    @property
+    def stations(self) -> Sequence[ChargingStation]:
+        return self.snapshot().stations
+    
+    @stations.setter
+    def stations(self, stations: Sequence[ChargingStation]):
+        """Replace the station set; the store rebuilds the spatial index for it"""
+        self.store.replace_all(stations)
         
+    def sync_source(self) -> bool:
+        """Apply what changed in the station inventory since the last load or poll, as upserts"""
+        if self.source is None:
+            return False
+        polled = self.source.poll()
+        if polled is None:
+            return False
+        stations, complete = polled
+        # Unchanged records are skipped; status-only changes keep the spatial index
+        self.store.upsert(stations, remove_missing=complete)
+        return True
+    
     def _generate_stations(self) -> List[ChargingStation]:
         locations = [
             # Jalandhar stations
@@ -75,45 +237,171 @@ class LocationBasedChargingService:
                 price_per_kwh=round(random.uniform(12.5, 18.5), 2),
                 operator=random.choice(self.operators),
                 available_slots=available_slots,
-                total_slots=4,
-                timestamp=datetime.now().isoformat()
+                total_slots=4
             ))
         return stations
     
-    def find_nearest_station(self, user_lat: float, user_lng: float, max_distance_km: float = 20) -> Dict:
-        """Find the nearest available charging station to user's location"""
-        user_location = (user_lat, user_lng)
+    def find_nearest_station(self, user_lat: float, user_lng: float, max_distance_km: float = 20,
+                             query: RankingQuery = None, snapshot: StationSnapshot = None) -> Dict:
+        """Find the nearest available charging station to user's location, or the best one by query's criteria"""
+        snapshot = snapshot or self.snapshot()
         nearest_station = None
         min_distance = float('inf')
+        score = None
         
-        for station in self.stations:
-            if station.is_available:  # Only consider available stations
-                station_location = (station.latitude, station.longitude)
-                distance = geodesic(user_location, station_location).kilometers
-                
-                if distance < min_distance and distance <= max_distance_km:
-                    min_distance = distance
-                    nearest_station = station
+        drive_minutes = None
         
+        # Only consider available stations
+        if query is None:
+            # With a road graph, the quickest of the closest few wins rather than the closest outright
+            k = 1 if self.drive_times is None else Config.ROUTE_CANDIDATES
+            found, distances = self.query_cache.nearest(snapshot, user_lat, user_lng, k=k, max_distance_km=max_distance_km,
+                                                        mask=snapshot.available)
+            if len(found) > 1:
+                minutes = self.drive_minutes(snapshot, user_lat, user_lng, found, distances)
+                quickest = int(np.argmin(minutes))
+                found, distances, drive_minutes = found[quickest:quickest + 1], distances[quickest:quickest + 1], float(minutes[quickest])
+        else:
+            query = replace(query, only_available=True)
+            found, distances, scores = self.ranker.rank(snapshot, user_lat, user_lng, max_distance_km, query, k=1)
+        if len(found):
+            nearest_station, min_distance = snapshot.stations[found[0]], float(distances[0])
+            score = None if query is None else round(float(scores[0]), 4)
+        
+        result = self._nearest_result(snapshot, user_lat, user_lng, nearest_station, min_distance, max_distance_km, drive_minutes)
+        if score is not None:
+            result['nearest_station']['score'] = score
+        return result
+    
+    def find_likely_available_station(self, user_lat: float, user_lng: float, max_distance_km: float = 20,
+                                      min_probability: float = Config.LIKELY_AVAILABLE_PROBABILITY) -> Dict:
+        """Find the nearest station likely to have a free slot by the time the driver gets there"""
+        snapshot = self.snapshot()
+        now = time.time()
+        best_station, best_distance, best_probability, best_eta = None, float('inf'), 0.0, 0.0
+        
+        # Unavailable stations count too: one may free up before arrival
+        found, distances = snapshot.index.nearest(user_lat, user_lng, k=Config.ARRIVAL_CANDIDATES, max_distance_km=max_distance_km)
+        etas = self.drive_minutes(snapshot, user_lat, user_lng, found, distances)
+        for pos, distance, eta_minutes in zip(found, distances, etas.tolist()):
+            station, distance = snapshot.stations[pos], float(distance)
+            probability = self.occupancy_model.predict(station, eta_minutes, now)
+            if probability > best_probability:
+                best_station, best_distance, best_probability, best_eta = station, distance, probability, eta_minutes
+            # Candidates come nearest first, so the first likely one wins
+            if probability >= min_probability:
+                break
+        
+        result = self._nearest_result(snapshot, user_lat, user_lng, best_station, best_distance, max_distance_km, best_eta)
+        if best_station:
+            result['arrival_prediction'] = {
+                'probability_free': round(best_probability, 3),
+                'eta_minutes': round(best_eta, 1),
+                'likely_available': best_probability >= min_probability
+            }
+        return result
+    
+    def predict_station_availability(self, station_id: str, eta_minutes: float) -> Dict:
+        """Chance that a station has a free slot after eta_minutes, with its learned profile for that weekday"""
+        station = self.snapshot().get(station_id)
+        if station is None:
+            return None
+        now = time.time()
+        arrival = datetime.fromtimestamp(now + eta_minutes * 60)
+        profile = self.occupancy_model.profile(station_id)
+        hourly = None if profile is None else [None if np.isnan(v) else round(float(v), 3) for v in profile[arrival.weekday()]]
+        return {
+            'station_id': station_id,
+            'currently_available': station.available_slots > 0,
+            'eta_minutes': eta_minutes,
+            'arrival_time': arrival.isoformat(),
+            'probability_free': round(self.occupancy_model.predict(station, eta_minutes, now), 3),
+            'weekday': arrival.weekday(),
+            'hourly_profile': hourly
+        }
+    
+    def _nearest_result(self, snapshot: StationSnapshot, user_lat: float, user_lng: float, nearest_station, distance: float, max_distance_km: float, drive_minutes: float = None) -> Dict:
+        """Build the find-nearest response for one user location"""
         if nearest_station:
+            if drive_minutes is None:
+                position = np.array([snapshot.positions[nearest_station.id]], dtype=np.intp)
+                drive_minutes = float(self.drive_minutes(snapshot, user_lat, user_lng, position, [distance])[0])
             return {
                 'success': True,
-                'nearest_station': self._format_station_data(nearest_station, min_distance),
+                'nearest_station': self._format_station_data(nearest_station, distance),
                 'user_location': {'lat': user_lat, 'lng': user_lng},
-                'distance_km': round(min_distance, 2),
-                'estimated_drive_time': self._calculate_drive_time(min_distance),
+                'distance_km': round(distance, 2),
+                'estimated_drive_time': self._calculate_drive_time(distance, drive_minutes),
                 'google_maps_url': self._generate_google_maps_url(user_lat, user_lng, nearest_station.latitude, nearest_station.longitude)
             }
         else:
             return {
                 'success': False,
-                'message': 'No available charging stations found within 20km radius',
+                'message': f'No available charging stations found within {max_distance_km:g}km radius',
                 'user_location': {'lat': user_lat, 'lng': user_lng},
-                'alternative_stations': self._get_alternative_stations(user_lat, user_lng)
+                'alternative_stations': self._get_alternative_stations(snapshot, user_lat, user_lng)
             }
     
+    def find_nearest_stations_batch(self, queries: List[Dict]) -> List[Dict]:
+        """Find the nearest available station for many locations at once.
+        
+        Each query has 'latitude', 'longitude', 'max_distance_km' and an optional
+        'connector_types' list. Distances for a block of queries are computed as one
+        matrix; in exact mode only the stations tied with each row's minimum are re-solved.
+        """
+        snapshot = self.snapshot()
+        stations = snapshot.stations
+        engine = snapshot.index.engine
+        slack = engine.error_bound
+        available = snapshot.available
+        
+        # One station mask per distinct connector filter
+        mask_keys = {}
+        masks = []
+        for query in queries:
+            key = tuple(sorted(query.get('connector_types') or ()))
+            if key not in mask_keys:
+                mask_keys[key] = len(masks)
+                if key:
+                    connectors = np.fromiter((s.connector_type in key for s in stations), dtype=bool, count=len(stations))
+                    masks.append(available & connectors)
+                else:
+                    masks.append(available)
+        mask_table = np.array(masks) if masks else np.empty((0, len(stations)), dtype=bool)
+        row_masks = np.array([mask_keys[tuple(sorted(q.get('connector_types') or ()))] for q in queries], dtype=np.intp)
+        
+        results = []
+        # Keep each distance block around a million cells
+        block = max(1, 1_000_000 // max(len(stations), 1))
+        for start in range(0, len(queries), block):
+            chunk = queries[start:start + block]
+            lats = np.array([q['latitude'] for q in chunk], dtype=np.float64)
+            lngs = np.array([q['longitude'] for q in chunk], dtype=np.float64)
+            limits = np.array([q['max_distance_km'] for q in chunk], dtype=np.float64)
+            distances = engine.approximate_matrix(lats, lngs)
+            allowed = mask_table[row_masks[start:start + block]] & (distances <= (limits * (1 + slack))[:, None])
+            distances = np.where(allowed, distances, np.inf)
+            best = distances.min(axis=1, initial=np.inf)
+            
+            for row, query in enumerate(chunk):
+                nearest_station, min_distance = None, float('inf')
+                if np.isfinite(best[row]):
+                    candidates = np.flatnonzero(distances[row] <= best[row] * (1 + 2 * slack) * (1 + slack))
+                    found, exact = engine.nearest(query['latitude'], query['longitude'], 1, query['max_distance_km'], positions=candidates)
+                    if len(found):
+                        nearest_station, min_distance = stations[found[0]], float(exact[0])
+                results.append(self._nearest_result(snapshot, query['latitude'], query['longitude'], nearest_station, min_distance, query['max_distance_km']))
+        return results
+    
     def _format_station_data(self, station: ChargingStation, distance: float) -> Dict:
         """Format station data for response"""
+        station_data = self.query_cache.record(station, self._station_record)
+        station_data['distance_km'] = round(distance, 2)
+        return station_data
+    
+    @staticmethod
+    def _station_record(station: ChargingStation) -> Dict:
+        """The distance-independent part of a formatted station"""
         return {
             'id': station.id,
             'name': station.name,
@@ -126,80 +414,92 @@ class LocationBasedChargingService:
             'total_slots': station.total_slots,
             'price_per_kwh': station.price_per_kwh,
             'operator': station.operator,
-            'distance_km': round(distance, 2),
             'is_available': station.is_available
         }
     
-    def _calculate_drive_time(self, distance_km: float) -> str:
-        """Calculate estimated drive time based on distance"""
+    def _drive_minutes(self, distance_km: float) -> float:
+        """Estimated drive time in minutes for a distance"""
         avg_speed = 40  # km/h in urban areas
-        time_minutes = int((distance_km / avg_speed) * 60)
+        return (distance_km / avg_speed) * 60
+    
+    def drive_minutes(self, snapshot: StationSnapshot, user_lat: float, user_lng: float, positions, distances) -> np.ndarray:
+        """Drive minutes to the stations at positions: along the road graph if loaded, else from straight-line distance"""
+        minutes = self._drive_minutes(np.asarray(distances, dtype=np.float64))
+        if self.drive_times is not None and len(positions):
+            road_minutes = self.drive_times.minutes(snapshot, user_lat, user_lng, positions)
+            # Points off the network (or unreachable) keep the straight-line estimate
+            minutes = np.where(np.isnan(road_minutes), minutes, road_minutes)
+        return minutes
+    
+    def _calculate_drive_time(self, distance_km: float, minutes: float = None) -> str:
+        """Calculate estimated drive time based on distance, unless the drive minutes are already known"""
+        time_minutes = int(self._drive_minutes(distance_km) if minutes is None else minutes)
         return f"{time_minutes} minutes"
     
     def _generate_google_maps_url(self, from_lat: float, from_lng: float, to_lat: float, to_lng: float) -> str:
         """Generate Google Maps navigation URL"""
         return f"https://www.google.com/maps/dir/{from_lat},{from_lng}/{to_lat},{to_lng}"
     
-    def _get_alternative_stations(self, user_lat: float, user_lng: float, count: int = 3) -> List[Dict]:
+    def _get_alternative_stations(self, snapshot: StationSnapshot, user_lat: float, user_lng: float, count: int = 3) -> List[Dict]:
         """Get alternative stations (including unavailable ones) when no available stations found"""
-        user_location = (user_lat, user_lng)
-        all_stations = []
-        
-        for station in self.stations:
-            station_location = (station.latitude, station.longitude)
-            distance = geodesic(user_location, station_location).kilometers
-            station_data = self._format_station_data(station, distance)
-            all_stations.append(station_data)
-        
-        # Sort by distance and return top N
-        return sorted(all_stations, key=lambda x: x['distance_km'])[:count]
+        # Index returns the top N already sorted by distance
+        found, distances = snapshot.index.nearest(user_lat, user_lng, k=count)
+        return [self._format_station_data(snapshot.stations[pos], float(distance)) for pos, distance in zip(found, distances)]
     
-    def get_nearby_stations(self, user_lat: float, user_lng: float, radius_km: float = 10) -> List[Dict]:
-        """Get all stations within radius (both available and unavailable)"""
-        user_location = (user_lat, user_lng)
+    def get_nearby_stations(self, user_lat: float, user_lng: float, radius_km: float = 10,
+                            query: RankingQuery = None, limit: int = None, snapshot: StationSnapshot = None) -> List[Dict]:
+        """Get stations within radius (both available and unavailable), by distance or ranked by query"""
+        snapshot = snapshot or self.snapshot()
         nearby_stations = []
         
-        for station in self.stations:
-            station_location = (station.latitude, station.longitude)
-            distance = geodesic(user_location, station_location).kilometers
-            
-            if distance <= radius_km:
-                station_data = self._format_station_data(station, distance)
-                station_data['estimated_drive_time'] = self._calculate_drive_time(distance)
-                nearby_stations.append(station_data)
+        if query is None:
+            found, distances = self.query_cache.within(snapshot, user_lat, user_lng, radius_km)
+            found, distances, scores = found[:limit], distances[:limit], None
+        else:
+            found, distances, scores = self.ranker.rank(snapshot, user_lat, user_lng, radius_km, query, k=limit)
+        minutes = self.drive_minutes(snapshot, user_lat, user_lng, found, distances)
+        for i, (pos, distance) in enumerate(zip(found, distances)):
+            distance = float(distance)
+            station_data = self._format_station_data(snapshot.stations[pos], distance)
+            station_data['estimated_drive_time'] = self._calculate_drive_time(distance, minutes[i])
+            if scores is not None:
+                station_data['score'] = round(float(scores[i]), 4)
+            nearby_stations.append(station_data)
         
-        return sorted(nearby_stations, key=lambda x: x['distance_km'])
+        return nearby_stations
     
-    def get_all_stations(self) -> List[ChargingStation]:
-        return self.stations
+    def get_all_stations(self) -> Sequence[ChargingStation]:
+        return self.snapshot().stations
     
     def get_stations_for_ml(self) -> List[Dict]:
         """Get stations data in ML-friendly format"""
         ml_data = []
-        for station in self.stations:
-            station_dict = asdict(station)
+        # Time features are the same for every row, so read the clock once
+        time_features = self.ml_time_features(datetime.now())
+        for station in self.get_all_stations():
+            station_dict = station.to_dict()
             # Add derived features for ML
-            station_dict['utilization_rate'] = 1 - (station.available_slots / station.total_slots)
-            station_dict['is_peak_hours'] = self._is_peak_hours()
-            station_dict['day_of_week'] = datetime.now().weekday()
-            station_dict['hour_of_day'] = datetime.now().hour
+            station_dict['utilization_rate'] = self.utilization_rate(station)
+            station_dict.update(time_features)
             ml_data.append(station_dict)
         return ml_data
     
-    def _is_peak_hours(self) -> bool:
+    @staticmethod
+    def utilization_rate(station: ChargingStation) -> float:
+        return 1 - (station.available_slots / station.total_slots)
+    
+    def ml_time_features(self, now: datetime) -> Dict:
+        """ML features shared by every station at one moment"""
+        return {'is_peak_hours': self._is_peak_hours(now), 'day_of_week': now.weekday(), 'hour_of_day': now.hour}
+    
+    def _is_peak_hours(self, now: datetime = None) -> bool:
         """Check if current time is peak hours (for ML features)"""
-        hour = datetime.now().hour
-        return (7 <= hour <= 10) or (17 <= hour <= 20)
-    
-    def simulate_real_time_updates(self):
-        """Update station availability in real-time"""
-        for station in self.stations:
-            if random.random() < 0.3:  # 30% chance of status change
-                new_slots = random.randint(0, station.total_slots)
-                station.available_slots = new_slots
-                station.is_available = new_slots > 0
-                station.last_updated = time.time()
-                station.timestamp = datetime.now().isoformat()
+        return bool(is_peak_hour((now or datetime.now()).hour))
+    
+    def simulate_real_time_updates(self) -> int:
+        """Update station availability in real-time: a share of the stations reports new free slots"""
+        # Published as column updates, a few thousand stations per version; returns the stations changed
+        return self.status_ingest.apply(self.simulated_events.poll(self.snapshot(), time.time()))
 
 class InteractiveMapGenerator:
     @staticmethod
@@ -343,16 +643,207 @@ class InteractiveMapGenerator:
         
         return m
 
+    LITE_SHELL_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>EV Charging Stations</title>
+    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+    <style>
+        html, body, #map { height: 100%; margin: 0; }
+        .ev-popup p { margin: 4px 0; }
+    </style>
+</head>
+<body>
+<div id="map"></div>
+<script>
+(function () {
+    var config = __CONFIG__;
+    var params = new URLSearchParams(window.location.search);
+    var map = L.map('map').setView(config.center, config.zoom);
+    L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        attribution: '&copy; OpenStreetMap contributors'
+    }).addTo(map);
+    L.polyline(config.route, {color: 'blue', weight: 5, opacity: 0.7}).bindPopup('Jalandhar-Phagwara Highway Route').addTo(map);
+
+    if (params.has('lat') && params.has('lng')) {
+        var user = [parseFloat(params.get('lat')), parseFloat(params.get('lng'))];
+        L.marker(user).bindTooltip('You are here').addTo(map);
+        map.setView(user, 13);
+    }
+
+    var markers = {};
+    var version = null;
+
+    function escapeHtml(text) {
+        return String(text).replace(/[&<>"']/g, function (c) {
+            return {'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'}[c];
+        });
+    }
+
+    function popupHtml(p) {
+        var utilization = (1 - p.available_slots / p.total_slots) * 100;
+        return '<div class="ev-popup" style="width: 280px;">' +
+            '<h4>' + escapeHtml(p.name) + '</h4><hr>' +
+            '<p><b>Status:</b> ' + (p.is_available ? '🟢 Available' : '🔴 Occupied') + '</p>' +
+            '<p><b>Slots:</b> ' + p.available_slots + '/' + p.total_slots + '</p>' +
+            '<p><b>Utilization:</b> ' + utilization.toFixed(1) + '%</p>' +
+            '<p><b>Connector:</b> ' + escapeHtml(p.connector_type) + '</p>' +
+            '<p><b>Power:</b> ' + p.power_kw + ' kW</p>' +
+            '<p><b>Price:</b> ₹' + p.price_per_kwh + '/kWh</p>' +
+            '<p><b>Operator:</b> ' + escapeHtml(p.operator) + '</p>' +
+            '<p><b>Last Updated:</b> ' + new Date(p.last_updated * 1000).toLocaleString() + '</p>' +
+            '</div>';
+    }
+
+    function render(data) {
+        var seen = {};
+        data.features.forEach(function (feature) {
+            var p = feature.properties;
+            var marker = markers[p.id];
+            if (!marker) {
+                var coords = feature.geometry.coordinates;
+                marker = markers[p.id] = L.circleMarker([coords[1], coords[0]], {radius: 8, weight: 2}).addTo(map);
+            }
+            marker.setStyle({color: p.is_available ? 'green' : 'red', fillOpacity: 0.8});
+            marker.bindPopup(popupHtml(p));
+            marker.bindTooltip(escapeHtml(p.name) + ' - ' + p.available_slots + '/' + p.total_slots + ' slots');
+            seen[p.id] = true;
+        });
+        Object.keys(markers).forEach(function (id) {
+            if (!seen[id]) {
+                map.removeLayer(markers[id]);
+                delete markers[id];
+            }
+        });
+    }
+
+    function refresh() {
+        // no-cache revalidates with the stored ETag, so unchanged data costs a 304
+        fetch(config.dataUrl, {cache: 'no-cache'})
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                if (data.version !== version) {
+                    version = data.version;
+                    render(data);
+                }
+            })
+            .catch(function () {});
+    }
+
+    refresh();
+    setInterval(refresh, config.refreshSeconds * 1000);
+})();
+</script>
+</body>
+</html>
+"""
+
+    @staticmethod
+    def create_lite_shell(data_url: str) -> str:
+        """Create the static Leaflet page for lightweight map mode; station markers are fetched from data_url"""
+        center_lat = (Config.JALANDHAR_COORDINATES[0] + Config.PHAGWARA_COORDINATES[0]) / 2
+        center_lng = (Config.JALANDHAR_COORDINATES[1] + Config.PHAGWARA_COORDINATES[1]) / 2
+        config = {
+            'center': [center_lat, center_lng],
+            'zoom': 12,
+            'route': [Config.JALANDHAR_COORDINATES, Config.PHAGWARA_COORDINATES],
+            'dataUrl': data_url,
+            'refreshSeconds': Config.UPDATE_INTERVAL
+        }
+        return InteractiveMapGenerator.LITE_SHELL_TEMPLATE.replace('__CONFIG__', json.dumps(config))
+
+    @staticmethod
+    def create_stations_geojson(stations: List[ChargingStation], version: int) -> Dict:
+        """Compact GeoJSON marker layer for lightweight map mode"""
+        return {
+            'type': 'FeatureCollection',
+            'version': version,
+            'features': [
+                {
+                    'type': 'Feature',
+                    'geometry': {'type': 'Point', 'coordinates': [round(station.longitude, 6), round(station.latitude, 6)]},
+                    'properties': {
+                        'id': station.id,
+                        'name': station.name,
+                        'is_available': station.is_available,
+                        'available_slots': station.available_slots,
+                        'total_slots': station.total_slots,
+                        'connector_type': station.connector_type,
+                        'power_kw': station.power_kw,
+                        'price_per_kwh': station.price_per_kwh,
+                        'operator': station.operator,
+                        'last_updated': int(station.last_updated)
+                    }
+                }
+                for station in stations
+            ]
+        }
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
+json_codec = JsonCodec(Config.JSON_BACKEND)
+app.json = FastJSONProvider(app, json_codec)
 
 # Fix CORS - Allow all origins during development
 CORS(app)
 
 # Initialize services
-charging_service = LocationBasedChargingService()
+station_source = (
+    open_station_source(Config.STATION_SOURCE, ChargingStation, Config.STATION_SOURCE_TABLE) if Config.STATION_SOURCE else None
+)
+status_events = ReplayStatusEvents(Config.STATUS_EVENTS, Config.STATUS_REPLAY_SPEED) if Config.STATUS_EVENTS else None
+charging_service = LocationBasedChargingService(Config.SHARED_STATE_PATH, station_source, status_events)
 map_generator = InteractiveMapGenerator()
+map_cache = RenderedMapCache(Config.MAP_CACHE_ENTRIES, Config.MAP_CACHE_BYTES)
+station_json = StationJsonCache(json_codec)
+charging_service.store.subscribe(station_json.on_publish)
+delta_feed = DeltaFeed(charging_service.store, encoder=station_json.get, lineage=charging_service.lineage)
+ml_exporter = MLDatasetExporter([field.name for field in STATION_FIELDS], Config.ML_EXPORT_BATCH_SIZE)
+# With a shared table only the writer worker persists history; the others keep what they sync in memory
+_owns_history_dir = charging_service.shared_table is None or charging_service.shared_table.is_writer
+availability_history = AvailabilityHistory(Config.HISTORY_DIR if _owns_history_dir else None, Config.HISTORY_CAPACITY)
+availability_history.on_publish(charging_service.snapshot(), None)
+charging_service.store.subscribe(availability_history.on_publish)
+ml_exporter.feature_providers.append(
+    lambda frame, now: availability_history.features(frame['id'].tolist(), now.timestamp())
+)
+
+# Metrics: per-route latency and sizes, stage timings (geodesic, map render, export), update ticks
+profiler = SamplingProfiler(Config.PROFILE_SAMPLE_RATE, Config.PROFILE_SLOW_MS / 1000,
+                            Config.PROFILE_INTERVAL_MS / 1000, Config.PROFILE_KEEP)
+request_metrics = RequestMetrics(metrics_registry, profiler)
+request_metrics.init_app(app)
+update_ticks = metrics_registry.counter('background_update_ticks_total', 'Background update ticks run')
+update_duration = metrics_registry.histogram('background_update_duration_seconds', 'Time spent in one update tick')
+update_lag = metrics_registry.gauge(
+    'background_update_lag_seconds', 'How much later than UPDATE_INTERVAL after the previous tick the last tick started'
+)
+_started = time.monotonic()
+_last_tick_end = None
+metrics_registry.gauge('station_data_age_seconds', 'Seconds since the last update tick finished (or since start-up)',
+                       source=lambda: time.monotonic() - (_last_tick_end or _started))
+metrics_registry.gauge('stations', 'Stations in the current snapshot', source=lambda: len(charging_service.snapshot().stations))
+metrics_registry.gauge('station_state_version', 'Version of the current station snapshot', source=lambda: charging_service.version)
+metrics_registry.counter('map_cache_requests_total', 'Rendered map cache lookups', ('result',), source=lambda: {
+    ('hit',): map_cache.hits, ('miss',): map_cache.misses
+})
+metrics_registry.gauge('map_cache_bytes', 'Bytes held by the rendered map cache', source=lambda: map_cache.stats()['bytes'])
+status_ingest = charging_service.status_ingest
+metrics_registry.counter('status_events_total', 'Station status events received, by outcome', ('result',), source=lambda: {
+    ('applied',): status_ingest.applied, ('unchanged',): status_ingest.unchanged, ('unknown',): status_ingest.unknown,
+    ('superseded',): status_ingest.superseded, ('dropped',): status_ingest.dropped
+})
+query_cache = charging_service.query_cache
+metrics_registry.counter('query_cache_requests_total', 'Nearby/find-nearest cell lookups', ('result',), source=lambda: {
+    ('hit',): query_cache.hits, ('miss',): query_cache.misses, ('fallback',): query_cache.fallbacks
+})
+metrics_registry.gauge('query_cache_entries', 'Cells with a cached candidate set', source=lambda: len(query_cache))
+metrics_registry.gauge('query_cache_positions', 'Station positions held by cached candidate sets',
+                       source=lambda: query_cache.stats()['positions'])
 
 # API Routes
 @app.route('/')
@@ -361,28 +852,123 @@ def home():
         'message': 'EV Charging Station Location-Based Service',
         'endpoints': {
             '/': 'API information',
-            '/api/stations': 'Get all stations data',
-            '/api/stations/ml': 'Get ML-ready station data',
-            '/api/find-nearest': 'Find nearest charging station (POST with lat/lng)',
-            '/api/nearby-stations': 'Get all nearby stations (GET with lat/lng)',
+            '/api/stations': 'Get all stations data (?since=<version or ETag> for changes only, ?format=columns for one array per field, ETag/304 aware)',
+            '/api/stations/ml': 'Get ML-ready station data (?format=columns for one array per field)',
+            '/api/stations/stream': 'Server-Sent Events feed of station changes (optional bbox, resume with Last-Event-ID)',
+            '/api/find-nearest': 'Find nearest charging station (POST with lat/lng, optional rank_by=availability_at_eta)',
+            '/api/find-nearest/batch': 'Find nearest charging stations for many vehicles (POST with vehicles array)',
+            '/api/stations/<station_id>/prediction': 'Predict whether a station will have a free slot (?eta_minutes=15)',
+            '/api/nearby-stations': 'Get all nearby stations (GET with lat/lng; rank with weights=price:1,distance:2, filter by connector_type/operator/min_power_kw; ?format=columns)',
             '/api/navigation-map': 'Get interactive navigation map',
             '/api/map/comprehensive': 'Get comprehensive station map',
-            '/api/ml/data': 'Download ML dataset',
-            '/api/directions': 'Get Google Maps directions'
+            '/api/map/lite': 'Get lightweight map page (static shell, polls GeoJSON markers)',
+            '/api/map/lite/stations.geojson': 'Get station markers as GeoJSON',
+            '/api/ml/data': 'Download ML dataset (?format=csv|parquet|arrow)',
+            '/api/history/utilization': 'Get time-weighted station utilization (?station_id=&hours=24&bucket=3600&metric=utilization|available)',
+            '/api/directions': 'Get Google Maps directions',
+            '/metrics': 'Prometheus metrics: per-route latency and response sizes, stage timings, update ticks',
+            '/metrics/profiles': 'Stack profiles of slow sampled requests (set PROFILE_SAMPLE_RATE)'
         }
     })
 
+def stations_etag(snapshot: StationSnapshot, list_format: str = 'records') -> str:
+    etag = f'{charging_service.lineage()}-{snapshot.version}'
+    return etag if list_format == 'records' else f'{etag}-{list_format}'
+
+STATION_COLUMNS = [field.name for field in STATION_FIELDS]
+
+def stations_body(snapshot: StationSnapshot, since: int = None, list_format: str = 'records', lineage: str = None):
+    """(snapshot, JSON body) for /api/stations: the full list, or the changes after `since` (of `lineage`).
+    
+    The columns format sends {"count": n, "columns": {field: [values...]}}
+    (the derived timestamp left out) instead of an array of objects.
+    """
+    if since is None:
+        if list_format == 'columns':
+            stations = snapshot.stations
+            return snapshot, json_codec.dumps({'count': len(stations), 'columns': record_columns(stations, STATION_COLUMNS)})
+        return snapshot, station_json.encode_list(snapshot.stations)
+    snapshot, changed = charging_service.changed_since(since, lineage)
+    full = changed is None
+    if list_format == 'columns':
+        stations = snapshot.stations if full else changed
+        return snapshot, json_codec.dumps({'version': snapshot.version, 'since': since, 'full': full,
+                                           'count': len(stations), 'columns': record_columns(stations, STATION_COLUMNS)})
+    stations = station_json.encode_list(snapshot.stations if full else changed)
+    # full: `since` can't be answered with changes (too old, ahead, other lineage), so this is the complete list
+    body = b'{"version":%d,"since":%d,"full":%s,"stations":%s}' % (
+        snapshot.version, since, b'true' if full else b'false', stations
+    )
+    return snapshot, body
+
 @app.route('/api/stations', methods=['GET'])
 def get_all_stations():
-    """Get all stations data"""
-    stations = charging_service.get_all_stations()
-    return jsonify([asdict(station) for station in stations])
+    """Get all stations data, or with ?since=<version> (or the ETag) only the stations changed after that version"""
+    lineage, since = None, None
+    if 'since' in request.args:
+        try:
+            lineage, since = parse_since(request.args['since'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': 'Invalid version', 'message': str(e)}), 400
+    try:
+        fmt = list_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid format', 'message': str(e)}), 400
+    
+    snapshot = charging_service.snapshot()
+    etag = stations_etag(snapshot, fmt)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        snapshot, body = stations_body(snapshot, since, fmt, lineage)
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Station-Version'] = str(snapshot.version)
+    return response
+
+@app.route('/api/stations/stream', methods=['GET'])
+def stream_station_updates():
+    """Server-Sent Events feed of station changes, optionally limited to a bounding box"""
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('since'))
+        lineage, last_version = parse_since(last_event_id) if last_event_id else (None, None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid stream parameters', 'message': str(e)}), 400
+    
+    frames = delta_feed.stream(last_version, bbox, Config.STREAM_HEARTBEAT, refresh=charging_service.snapshot,
+                               lineage=lineage)
+    response = Response(stream_with_context(frames), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/api/stations/ml', methods=['GET'])
 def get_ml_stations():
-    """Get stations data in ML-ready format"""
-    ml_data = charging_service.get_stations_for_ml()
-    return jsonify(ml_data)
+    """Get stations data in ML-ready format, encoded straight from the station records"""
+    try:
+        fmt = list_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid format', 'message': str(e)}), 400
+    
+    stations = charging_service.get_all_stations()
+    # Time features are the same for every row, so read the clock once
+    time_features = charging_service.ml_time_features(datetime.now())
+    utilization_rate = charging_service.utilization_rate
+    if fmt == 'columns':
+        columns = record_columns(stations, STATION_COLUMNS)
+        columns['utilization_rate'] = list(map(utilization_rate, stations))
+        for name, value in time_features.items():
+            columns[name] = [value] * len(stations)
+        body = json_codec.dumps({'count': len(stations), 'columns': columns})
+    else:
+        # Same objects as get_stations_for_ml(): the cached station bytes with the features spliced in
+        shared = json_codec.dumps(time_features)[1:-1]
+        body = station_json.encode_list(
+            stations, lambda station: b',"utilization_rate":%s,%s' % (json_codec.dumps(utilization_rate(station)), shared)
+        )
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/find-nearest', methods=['POST'])
 def find_nearest_station():
@@ -408,8 +994,23 @@ def find_nearest_station():
                 'message': 'Please provide valid latitude (-90 to 90) and longitude (-180 to 180)'
             }), 400
         
-        # Find nearest station
-        result = charging_service.find_nearest_station(user_lat, user_lng)
+        # Find nearest station, or with rank_by=availability_at_eta the nearest one likely free on arrival
+        rank_by = data.get('rank_by', 'distance')
+        if rank_by == 'availability_at_eta':
+            min_probability = float(data.get('min_probability', Config.LIKELY_AVAILABLE_PROBABILITY))
+            result = charging_service.find_likely_available_station(user_lat, user_lng, min_probability=min_probability)
+        elif rank_by == 'distance':
+            try:
+                query = RankingQuery.from_params(data)
+            except (ValueError, TypeError) as e:
+                return jsonify({'success': False, 'error': 'Invalid ranking', 'message': str(e)}), 400
+            result = charging_service.find_nearest_station(user_lat, user_lng, query=query)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Invalid ranking',
+                'message': "rank_by must be 'distance' or 'availability_at_eta'"
+            }), 400
         
         return jsonify(result)
         
@@ -420,12 +1021,119 @@ def find_nearest_station():
             'message': 'Please provide valid numeric coordinates'
         }), 400
     except Exception as e:
+        app.logger.exception('find-nearest failed')
         return jsonify({
             'success': False,
             'error': 'Server error',
             'message': str(e)
         }), 500
 
+def _parse_batch_item(item) -> Dict:
+    """Validate one vehicle entry of a batch request, returning the service query or an error response"""
+    if not isinstance(item, dict) or 'latitude' not in item or 'longitude' not in item:
+        return {
+            'success': False,
+            'error': 'Missing location data',
+            'message': 'Please provide latitude and longitude for each vehicle'
+        }
+    try:
+        user_lat = float(item['latitude'])
+        user_lng = float(item['longitude'])
+        max_distance_km = float(item.get('max_distance_km', 20))
+    except (ValueError, TypeError):
+        return {
+            'success': False,
+            'error': 'Invalid data format',
+            'message': 'Please provide valid numeric coordinates'
+        }
+    if not (-90 <= user_lat <= 90) or not (-180 <= user_lng <= 180):
+        return {
+            'success': False,
+            'error': 'Invalid coordinates',
+            'message': 'Please provide valid latitude (-90 to 90) and longitude (-180 to 180)'
+        }
+    if not max_distance_km > 0:
+        return {
+            'success': False,
+            'error': 'Invalid distance',
+            'message': 'max_distance_km must be a positive number'
+        }
+    connector_types = item.get('connector_types', item.get('connector_type'))
+    if isinstance(connector_types, str):
+        connector_types = [connector_types]
+    if connector_types is not None and not (isinstance(connector_types, list) and all(isinstance(c, str) for c in connector_types)):
+        return {
+            'success': False,
+            'error': 'Invalid connector filter',
+            'message': 'connector_type must be a string or a list of strings'
+        }
+    return {
+        'latitude': user_lat,
+        'longitude': user_lng,
+        'max_distance_km': max_distance_km,
+        'connector_types': connector_types
+    }
+
+@app.route('/api/find-nearest/batch', methods=['POST'])
+def find_nearest_stations_batch():
+    """Find the nearest available charging station for a list of vehicle locations"""
+    data = request.get_json(silent=True)
+    vehicles = data.get('vehicles') if isinstance(data, dict) else None
+    
+    if not isinstance(vehicles, list):
+        return jsonify({
+            'success': False,
+            'error': 'Missing vehicle data',
+            'message': 'Please provide a "vehicles" array of {latitude, longitude} objects in the request body'
+        }), 400
+    
+    if len(vehicles) > Config.MAX_BATCH_SIZE:
+        return jsonify({
+            'success': False,
+            'error': 'Batch too large',
+            'message': f'A batch may contain at most {Config.MAX_BATCH_SIZE} vehicles'
+        }), 400
+    
+    parsed = [_parse_batch_item(item) for item in vehicles]
+    queries = [item for item in parsed if 'success' not in item]
+    
+    try:
+        found = iter(charging_service.find_nearest_stations_batch(queries))
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': 'Server error',
+            'message': str(e)
+        }), 500
+    
+    # Per-vehicle errors stay in place so results line up with the request order
+    results = [item if 'success' in item else next(found) for item in parsed]
+    for vehicle, result in zip(vehicles, results):
+        if isinstance(vehicle, dict) and 'vehicle_id' in vehicle:
+            result['vehicle_id'] = vehicle['vehicle_id']
+    
+    return jsonify({
+        'success': True,
+        'results': results,
+        'total_vehicles': len(results),
+        'resolved_vehicles': len([r for r in results if r['success']])
+    })
+
+@app.route('/api/stations/<station_id>/prediction', methods=['GET'])
+def predict_station_availability(station_id):
+    """Predict whether a station will have a free slot when the driver arrives"""
+    try:
+        eta_minutes = float(request.args.get('eta_minutes', 0))
+        if not 0 <= eta_minutes <= 24 * 60:
+            raise ValueError
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid ETA', 'message': 'eta_minutes must be between 0 and 1440'}), 400
+    
+    prediction = charging_service.predict_station_availability(station_id, eta_minutes)
+    if prediction is None:
+        return jsonify({'success': False, 'error': 'Unknown station', 'message': f'No station with id {station_id}'}), 404
+    return jsonify({'success': True, **prediction})
+
 @app.route('/api/nearby-stations', methods=['GET'])
 def get_nearby_stations():
     """Get all stations near user's location"""
@@ -433,45 +1141,90 @@ def get_nearby_stations():
         user_lat = float(request.args.get('lat', Config.JALANDHAR_COORDINATES[0]))
         user_lng = float(request.args.get('lng', Config.JALANDHAR_COORDINATES[1]))
         radius = float(request.args.get('radius', 15))
-        
-        stations = charging_service.get_nearby_stations(user_lat, user_lng, radius)
-        
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid coordinates'}), 400
+
+    # Comparisons are False for NaN, so these reject it along with infinities
+    if not (-90 <= user_lat <= 90) or not (-180 <= user_lng <= 180):
         return jsonify({
-            'success': True,
-            'user_location': {'lat': user_lat, 'lng': user_lng},
-            'radius_km': radius,
-            'stations': stations,
-            'total_stations': len(stations),
-            'available_stations': len([s for s in stations if s['is_available']])
-        })
-        
+            'success': False,
+            'error': 'Invalid coordinates',
+            'message': 'Please provide valid latitude (-90 to 90) and longitude (-180 to 180)'
+        }), 400
+    if not 0 <= radius < float('inf'):
+        return jsonify({'success': False, 'error': 'Invalid radius', 'message': 'radius must be a finite number of km, 0 or more'}), 400
+
+    try:
+        limit = request.args.get('limit', type=int)
+        if 'limit' in request.args and (limit is None or limit <= 0):
+            raise ValueError('limit must be a positive integer')
+        only_available = request.args.get('available_only', 'false').lower() in ('1', 'true', 'yes')
+        query = RankingQuery.from_params(request.args, only_available)
+        if query is None and only_available:
+            query = RankingQuery(only_available=True)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid ranking', 'message': str(e)}), 400
+    try:
+        fmt = list_format(request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid format', 'message': str(e)}), 400
+    
+    try:
+        stations = charging_service.get_nearby_stations(user_lat, user_lng, radius, query, limit)
     except ValueError:
         return jsonify({'success': False, 'error': 'Invalid coordinates'}), 400
 
+    return jsonify({
+        'success': True,
+        'user_location': {'lat': user_lat, 'lng': user_lng},
+        'radius_km': radius,
+        # columns: {field: [values...]} in the same order the station list would have
+        **({'columns': dict_columns(stations)} if fmt == 'columns' else {'stations': stations}),
+        'total_stations': len(stations),
+        'available_stations': len([s for s in stations if s['is_available']])
+    })
+
+def _send_cached_map(entry, download_name: str, mimetype: str = 'text/html', cache_control: str = 'no-cache') -> Response:
+    """Serve a cached map, honouring If-None-Match and Accept-Encoding"""
+    encoding = entry.negotiate(request.accept_encodings)
+    if entry.matches(request.if_none_match):
+        response = Response(status=304)
+    else:
+        response = Response(entry.variants[encoding], mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'inline; filename={download_name}'
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.headers['ETag'] = entry.etags[encoding]
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 @app.route('/api/navigation-map', methods=['GET'])
 def get_navigation_map():
     """Get interactive map with user location and nearest station"""
     try:
-        user_lat = float(request.args.get('lat', Config.JALANDHAR_COORDINATES[0]))
-        user_lng = float(request.args.get('lng', Config.JALANDHAR_COORDINATES[1]))
-        
-        # Find nearest station
-        nearest_result = charging_service.find_nearest_station(user_lat, user_lng)
-        nearest_station = nearest_result.get('nearest_station')
-        nearby_stations = charging_service.get_nearby_stations(user_lat, user_lng, 15)
+        # Snap to the precision shown on the map so nearby requests share a cache entry
+        user_lat = round(float(request.args.get('lat', Config.JALANDHAR_COORDINATES[0])), Config.MAP_COORDINATE_DECIMALS)
+        user_lng = round(float(request.args.get('lng', Config.JALANDHAR_COORDINATES[1])), Config.MAP_COORDINATE_DECIMALS)
+        if not (-90 <= user_lat <= 90) or not (-180 <= user_lng <= 180):
+            raise ValueError('coordinates out of range')
         
-        # Create map
-        m = map_generator.create_location_based_map(user_lat, user_lng, nearest_station, nearby_stations)
+        # One snapshot for the key and the render, so the cached map is exactly that version
+        snapshot = charging_service.snapshot()
         
-        map_bytes = BytesIO()
-        m.save(map_bytes, close_file=False)
-        map_bytes.seek(0)
+        def render() -> str:
+            # Find nearest station
+            nearest_result = charging_service.find_nearest_station(user_lat, user_lng, snapshot=snapshot)
+            nearest_station = nearest_result.get('nearest_station')
+            nearby_stations = charging_service.get_nearby_stations(user_lat, user_lng, 15, snapshot=snapshot)
+            
+            # Create map
+            with stage('folium_render'):
+                m = map_generator.create_location_based_map(user_lat, user_lng, nearest_station, nearby_stations)
+                return m.get_root().render()
         
-        return send_file(
-            map_bytes, 
-            mimetype='text/html', 
-            download_name='ev_charging_navigation_map.html'
-        )
+        entry = map_cache.get_or_render(('navigation', snapshot.version, user_lat, user_lng), render)
+        return _send_cached_map(entry, 'ev_charging_navigation_map.html')
         
     except ValueError:
         return jsonify({'success': False, 'error': 'Invalid coordinates'}), 400
@@ -479,34 +1232,78 @@ def get_navigation_map():
 @app.route('/api/map/comprehensive', methods=['GET'])
 def get_comprehensive_map():
     """Get detailed Folium map with all stations"""
-    stations = charging_service.get_all_stations()
-    m = map_generator.create_comprehensive_map(stations)
+    snapshot = charging_service.snapshot()
+    
+    def render() -> str:
+        with stage('folium_render'):
+            return map_generator.create_comprehensive_map(snapshot.stations).get_root().render()
     
-    map_bytes = BytesIO()
-    m.save(map_bytes, close_file=False)
-    map_bytes.seek(0)
+    entry = map_cache.get_or_render(('comprehensive', snapshot.version), render)
+    return _send_cached_map(entry, 'ev_charging_comprehensive_map.html')
+
+@app.route('/api/map/lite', methods=['GET'])
+def get_lite_map():
+    """Get the static lightweight map page; it polls /api/map/lite/stations.geojson for markers"""
+    data_url = url_for('get_lite_map_data')
+    # The shell never depends on station state, so browsers may keep it for a day
+    entry = map_cache.get_or_render(('lite-shell', data_url), lambda: map_generator.create_lite_shell(data_url))
+    return _send_cached_map(entry, 'ev_charging_lite_map.html', cache_control='public, max-age=86400')
+
+@app.route('/api/map/lite/stations.geojson', methods=['GET'])
+def get_lite_map_data():
+    """Get the station marker layer for the lightweight map as GeoJSON"""
+    snapshot = charging_service.snapshot()
+    
+    def render() -> str:
+        geojson = map_generator.create_stations_geojson(snapshot.stations, snapshot.version)
+        return json_codec.dumps(geojson).decode('utf-8')
     
-    return send_file(map_bytes, mimetype='text/html', download_name='ev_charging_comprehensive_map.html')
+    entry = map_cache.get_or_render(('lite-data', snapshot.version), render)
+    return _send_cached_map(entry, 'ev_charging_stations.geojson', mimetype='application/geo+json')
 
 @app.route('/api/ml/data', methods=['GET'])
 def download_ml_data():
-    """Download complete ML dataset as CSV"""
-    ml_data = charging_service.get_stations_for_ml()
-    
-    # Convert to DataFrame using pandas
-    df = pd.DataFrame(ml_data)
-    
-    # Save to BytesIO
-    csv_bytes = BytesIO()
-    df.to_csv(csv_bytes, index=False)
-    csv_bytes.seek(0)
-    
-    return send_file(
-        csv_bytes,
-        mimetype='text/csv',
-        download_name=f'ev_charging_ml_data_{datetime.now().strftime("%Y%m%d_%H%M")}.csv',
-        as_attachment=True
+    """Download complete ML dataset as CSV (default), Parquet or Arrow IPC stream"""
+    export_format = request.args.get('format', 'csv').lower()
+    now = datetime.now()
+    try:
+        # Streams from one snapshot, batch by batch, so memory stays flat however many stations there are
+        chunks = timed_chunks('pandas_export', ml_exporter.stream(export_format, charging_service.get_all_stations(), now))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid format', 'message': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': 'Format unavailable', 'message': str(e)}), 501
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename=ev_charging_ml_data_{now.strftime("%Y%m%d_%H%M")}.{extension}'
     )
+    return response
+
+@app.route('/api/history/utilization', methods=['GET'])
+def get_utilization_history():
+    """Time-weighted utilization (or ?metric=available, share of time a slot was free) per station and bucket"""
+    station_ids = request.args.get('station_id')
+    station_ids = station_ids.split(',') if station_ids else None
+    end = time.time()
+    try:
+        hours = float(request.args.get('hours', 24))
+        bucket = float(request.args.get('bucket', 3600))
+        if not 0 < hours <= Config.HISTORY_MAX_HOURS or bucket < 60:
+            raise ValueError(f'hours must be in (0, {Config.HISTORY_MAX_HOURS}] and bucket at least 60 seconds')
+        frame = availability_history.downsample(end - hours * 3600, end, bucket, station_ids,
+                                                metric=request.args.get('metric', 'utilization'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': 'Invalid history parameters', 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'start': end - hours * 3600,
+        'end': end,
+        'bucket_seconds': bucket,
+        'series': frame.to_dict(orient='records')
+    })
 
 @app.route('/api/directions', methods=['GET'])
 def get_directions():
@@ -530,15 +1327,49 @@ def get_directions():
     except (ValueError, TypeError):
         return jsonify({'success': False, 'error': 'Invalid coordinates for directions'}), 400
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(metrics_registry.render(), content_type=CONTENT_TYPE)
+
+@app.route('/metrics/profiles', methods=['GET'])
+def get_slow_request_profiles():
+    """Collapsed-stack profiles of the slowest sampled requests, newest first"""
+    return jsonify({
+        'success': True,
+        'enabled': profiler.enabled,
+        'sample_rate': profiler.sample_rate,
+        'slow_ms': profiler.slow_seconds * 1000,
+        'profiles': list(reversed(profiler.profiles))
+    })
+
 # Background updates
+def update_tick():
+    global _last_tick_end
+    start = time.monotonic()
+    if _last_tick_end is not None:
+        update_lag.set(max(0.0, start - _last_tick_end - Config.UPDATE_INTERVAL))
+    # With a shared table only the writer worker simulates or polls; the others pick changes up on read
+    if charging_service.owns_updates():
+        if charging_service.source is not None:
+            charging_service.sync_source()
+        # Simulated for the demo stations, or replayed from STATUS_EVENTS
+        charging_service.status_ingest.tick()
+    # Folds the last hour into the occupancy profiles once it is over; otherwise a no-op
+    charging_service.occupancy_model.update(availability_history)
+    _last_tick_end = time.monotonic()
+    update_ticks.inc()
+    update_duration.observe(_last_tick_end - start)
+
 def background_updates():
     while True:
         time.sleep(Config.UPDATE_INTERVAL)
-        charging_service.simulate_real_time_updates()
+        update_tick()
 
-# Start background thread
-update_thread = threading.Thread(target=background_updates, daemon=True)
-update_thread.start()
+# Start background thread (the ASGI entry point runs the updates as an asyncio task instead)
+if Config.BACKGROUND_UPDATES == 'thread':
+    update_thread = threading.Thread(target=background_updates, daemon=True)
+    update_thread.start()
 
 # Production configuration
 class ProductionConfig:
@@ -0,0 +1,264 @@
+"""ASGI entry point: serve the station API from an event loop.
+
+    uvicorn asgi:app --workers 4
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+GET /api/stations and the Server-Sent Events feed run natively on the loop, so
+an idle stream costs a parked coroutine rather than a worker. Every other route
+is the regular Flask view, called on a bounded thread pool; its response body is
+then sent from the loop, so a slow client downloading a map or the ML export
+never holds a thread while the bytes drain. The simulated updates run as an
+asyncio task instead of the daemon thread app.py starts under WSGI.
+"""
+import os
+
+# This module schedules the updates on its own loop
+os.environ.setdefault('BACKGROUND_UPDATES', 'asyncio')
+
+import asyncio
+import contextvars
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+from werkzeug.http import parse_etags
+from app import (Config, app as flask_app, charging_service, delta_feed, json_codec, request_metrics, stations_body,
+                 stations_etag, update_tick)
+from delta_feed import parse_bbox
+from serialization import list_format
+from station_store import parse_since
+
+Headers = List[Tuple[bytes, bytes]]
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _cors_headers(scope) -> Headers:
+    """Same policy flask-cors applies to the WSGI routes: echo an allowed Origin back"""
+    headers = [(b'vary', b'Origin')]
+    origin = _header(scope, b'origin')
+    if origin and origin in flask_app.config['CORS_ORIGINS']:
+        headers.append((b'access-control-allow-origin', origin.encode('latin-1')))
+    return headers
+
+
+async def _send_json(send, scope, status: int, payload: Dict):
+    body = json_codec.dumps(payload)
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())
+    ] + _cors_headers(scope)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WsgiBridge:
+    """Run a WSGI app for ASGI requests: the view on a thread pool, the response body sent from the loop"""
+
+    def __init__(self, wsgi_app, executor: ThreadPoolExecutor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    @staticmethod
+    def environ(scope, body: bytes) -> Dict:
+        server = scope.get('server') or ('localhost', 80)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            # WSGI carries the decoded path as latin-1 characters of its UTF-8 bytes
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for key, value in scope['headers']:
+            name = key.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+            else:
+                name = f'HTTP_{name}'
+                environ[name] = f'{environ[name]},{value}' if name in environ else value
+        return environ
+
+    def _start(self, environ: Dict):
+        """Call the app up to its first body chunk, so generator responses have called start_response"""
+        started = {}
+
+        def write(data):
+            raise NotImplementedError('The legacy WSGI write() callable is not supported')
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return write
+
+        result = self.wsgi_app(environ, start_response)
+        chunks = iter(result)
+        first = next(chunks, None)
+        return started, result, chunks, first
+
+    async def __call__(self, scope, receive, send):
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        loop = asyncio.get_running_loop()
+        # Each step may land on a different pool thread; one Context keeps Flask's request context with the response
+        context = contextvars.copy_context()
+        started, result, chunks, chunk = await loop.run_in_executor(
+            self.executor, context.run, self._start, self.environ(scope, bytes(body))
+        )
+        try:
+            await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+            while chunk is not None:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                # Streamed bodies (the ML export) are produced chunk by chunk on the pool
+                chunk = await loop.run_in_executor(self.executor, context.run, next, chunks, None)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, context.run, result.close)
+
+
+class StationApi:
+    """The ASGI application: native async routes first, the Flask app for everything else"""
+
+    def __init__(self, wsgi_app, threads: int = Config.ASGI_THREADS):
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.bridge = WsgiBridge(wsgi_app, self.executor)
+        self.routes = {
+            ('GET', '/api/stations'): self.stations,
+            ('GET', '/api/stations/stream'): self.stream,
+        }
+        self._updater: Optional[asyncio.Task] = None
+
+    # --- background updates ----------------------------------------------
+
+    async def _update_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(Config.UPDATE_INTERVAL)
+            # The tick itself is synchronous (and takes the store's write lock), so it runs on the pool
+            await loop.run_in_executor(self.executor, update_tick)
+
+    def _start_updates(self):
+        if self._updater is None and Config.BACKGROUND_UPDATES == 'asyncio':
+            self._updater = asyncio.get_running_loop().create_task(self._update_loop())
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self._start_updates()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._updater is not None:
+                    self._updater.cancel()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- native routes ---------------------------------------------------
+
+    async def stations(self, scope, receive, send):
+        """GET /api/stations, same contract as the Flask view (ETag/304, ?since= and ?format=)"""
+        start = time.perf_counter()
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        lineage, since = None, None
+        if 'since' in query:
+            try:
+                lineage, since = parse_since(query['since'][0])
+            except ValueError as e:
+                return await _send_json(send, scope, 400, {'success': False, 'error': 'Invalid version', 'message': str(e)})
+        try:
+            fmt = list_format(query.get('format', [None])[0])
+        except ValueError as e:
+            return await _send_json(send, scope, 400, {'success': False, 'error': 'Invalid format', 'message': str(e)})
+        snapshot = charging_service.snapshot()
+        etag = stations_etag(snapshot, fmt)
+        headers = [(b'etag', f'"{etag}"'.encode('latin-1')), (b'cache-control', b'no-cache')] + _cors_headers(scope)
+        if parse_etags(_header(scope, b'if-none-match')).contains(etag):
+            status, body = 304, b''
+        else:
+            status = 200
+            # A cold full-list encode takes a large part of a second at 100k stations; off the loop, streams keep flowing
+            snapshot, body = await asyncio.get_running_loop().run_in_executor(
+                self.executor, stations_body, snapshot, since, fmt, lineage
+            )
+            headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        headers.append((b'x-station-version', str(snapshot.version).encode()))
+        # Recorded like the Flask routes, which the request hooks time
+        request_metrics.observe('GET', '/api/stations', status, time.perf_counter() - start, len(body))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def stream(self, scope, receive, send):
+        """GET /api/stations/stream: the SSE feed as an async generator"""
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        try:
+            bbox = parse_bbox(query.get('bbox', [None])[0])
+            last_event_id = _header(scope, b'last-event-id') or query.get('since', [None])[0]
+            lineage, last_version = parse_since(last_event_id) if last_event_id else (None, None)
+        except ValueError as e:
+            return await _send_json(send, scope, 400, {
+                'success': False, 'error': 'Invalid stream parameters', 'message': str(e)
+            })
+
+        async def pump():
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ] + _cors_headers(scope)})
+            async for frame in delta_feed.stream_async(last_version, bbox, Config.STREAM_HEARTBEAT,
+                                                       refresh=charging_service.snapshot, lineage=lineage):
+                await send({'type': 'http.response.body', 'body': frame.encode('utf-8'), 'more_body': True})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        # The stream never ends by itself; stop it when the client goes away
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception() is not None and not isinstance(task.exception(), OSError):
+                raise task.exception()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+        # Servers without lifespan support still get the updates, from the first request on
+        self._start_updates()
+        route = self.routes.get((scope['method'], scope['path']))
+        if route is not None:
+            return await route(scope, receive, send)
+        return await self.bridge(scope, receive, send)
+
+
+app = StationApi(flask_app)
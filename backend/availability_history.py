@@ -0,0 +1,258 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+RECORD_DTYPE = np.dtype([
+    ('ts', '<f8'),
+    ('station', '<i4'),
+    ('available_slots', '<i2'),
+    ('total_slots', '<i2'),
+])
+# Time constants of the incremental utilization averages, in seconds
+EWM_WINDOWS = {'1h': 3600.0, '24h': 86400.0}
+
+
+def _utilization(records: np.ndarray) -> np.ndarray:
+    return 1 - records['available_slots'] / np.maximum(records['total_slots'], 1)
+
+
+# Step-function metrics that can be downsampled: share of slots in use, and whether any slot is free
+METRICS = {
+    'utilization': _utilization,
+    'available': lambda records: (records['available_slots'] > 0).astype(np.float64),
+}
+
+
+class AvailabilityHistory:
+    """Append-only log of station availability changes.
+
+    Every StationStore publish appends one 16-byte record per changed station
+    to an in-memory ring buffer. With a directory configured, records are also
+    flushed in order to immutable binary segment files, so history outlives the
+    ring and the process. Alongside the log it keeps per-station lag and
+    time-decayed rolling features up to date on every append, so exporting
+    them costs a lookup rather than a scan.
+    """
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = 1_000_000, segment_size: int = 65536):
+        self.directory = directory
+        self.capacity = capacity
+        self.segment_size = min(segment_size, capacity)
+        self._buffer = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._appended = 0
+        self._flushed = 0
+        self._lock = threading.Lock()
+        self._codes: Dict[str, int] = {}
+        self._ids: List[str] = []
+        # (earliest ts, latest ts, path) per flushed segment; records in a segment need not be in time order
+        self._segments: List[Tuple[float, float, str]] = []
+        self._next_segment = 0
+        # Incremental per-station feature state, indexed by station code
+        self._state = np.zeros(0, dtype=[
+            ('utilization', '<f8'), ('previous', '<f8'), ('changed_at', '<f8'), ('seen_at', '<f8')
+        ] + [(f'ewm_{name}', '<f8') for name in EWM_WINDOWS])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_directory()
+
+    # --- persistence -----------------------------------------------------
+
+    def _codes_path(self) -> str:
+        return os.path.join(self.directory, 'stations.txt')
+
+    def _load_directory(self):
+        if os.path.exists(self._codes_path()):
+            with open(self._codes_path(), encoding='utf-8') as handle:
+                for line in handle:
+                    self._code(line.rstrip('\n'), persist=False)
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith('seg-') and name.endswith('.bin'):
+                path = os.path.join(self.directory, name)
+                parts = name[4:-4].split('-')
+                if len(parts) == 3:
+                    self._next_segment = max(self._next_segment, int(parts[0]) + 1)
+                    self._segments.append((int(parts[1]) / 1000, int(parts[2]) / 1000, path))
+                else:
+                    # Older segments are named after their first and last record, not their bounds
+                    ts = np.fromfile(path, dtype=RECORD_DTYPE)['ts']
+                    if len(ts):
+                        self._segments.append((float(ts.min()), float(ts.max()), path))
+
+    def _code(self, station_id: str, persist: bool = True) -> int:
+        code = self._codes.get(station_id)
+        if code is None:
+            code = self._codes[station_id] = len(self._ids)
+            self._ids.append(station_id)
+            if persist and self.directory:
+                with open(self._codes_path(), 'a', encoding='utf-8') as handle:
+                    handle.write(station_id + '\n')
+        return code
+
+    def _tail(self, count: int) -> np.ndarray:
+        """Copy of the last `count` records in append order"""
+        end = self._appended % self.capacity
+        start = (self._appended - count) % self.capacity
+        if count == 0:
+            return self._buffer[:0].copy()
+        if start < end:
+            return self._buffer[start:end].copy()
+        return np.concatenate([self._buffer[start:], self._buffer[:end]])
+
+    def _flush(self):
+        records = self._tail(self._appended - self._flushed)
+        if not len(records):
+            return
+        # Full replaces and replayed events append out of time order, so bounds are the true min and max;
+        # the sequence number keeps two segments with the same bounds apart
+        first_ms, last_ms = int(math.floor(records['ts'].min() * 1000)), int(math.ceil(records['ts'].max() * 1000))
+        path = os.path.join(self.directory, f'seg-{self._next_segment:08d}-{first_ms:013d}-{last_ms:013d}.bin')
+        self._next_segment += 1
+        tmp_path = path + '.tmp'
+        records.tofile(tmp_path)
+        os.replace(tmp_path, path)
+        self._segments.append((first_ms / 1000, last_ms / 1000, path))
+        self._flushed = self._appended
+
+    # --- writing ---------------------------------------------------------
+
+    def _grow_state(self, size: int):
+        if size > len(self._state):
+            grown = np.zeros(max(size, len(self._state) * 2), dtype=self._state.dtype)
+            grown['changed_at'] = np.nan
+            grown['seen_at'] = np.nan
+            grown[:len(self._state)] = self._state
+            self._state = grown
+
+    def append(self, stations: Sequence):
+        """Log the current availability of `stations` and update their rolling features"""
+        if not stations:
+            return
+        with self._lock:
+            codes = np.array([self._code(station.id) for station in stations], dtype=np.int32)
+            records = np.empty(len(stations), dtype=RECORD_DTYPE)
+            records['ts'] = [station.last_updated for station in stations]
+            records['station'] = codes
+            records['available_slots'] = [station.available_slots for station in stations]
+            records['total_slots'] = [station.total_slots for station in stations]
+            self._update_features(records)
+
+            for start in range(0, len(records), self.capacity):
+                part = records[start:start + self.capacity]
+                offset = self._appended % self.capacity
+                first = min(len(part), self.capacity - offset)
+                self._buffer[offset:offset + first] = part[:first]
+                self._buffer[:len(part) - first] = part[first:]
+                self._appended += len(part)
+                if self.directory and self._appended - self._flushed >= self.segment_size:
+                    self._flush()
+
+    def _update_features(self, records: np.ndarray):
+        # A station may appear at most once per publish, so these updates vectorize cleanly
+        self._grow_state(int(records['station'].max()) + 1)
+        codes = records['station']
+        state = self._state[codes]
+        utilization = _utilization(records)
+        ts = records['ts']
+        first = np.isnan(state['seen_at'])
+        elapsed = np.where(first, 0.0, np.maximum(ts - state['seen_at'], 0.0))
+        for name, window in EWM_WINDOWS.items():
+            column = f'ewm_{name}'
+            # The previous state held for `elapsed` seconds; decay the average toward it
+            decayed = state['utilization'] + (state[column] - state['utilization']) * np.exp(-elapsed / window)
+            state[column] = np.where(first, utilization, decayed)
+        changed = first | (utilization != state['utilization'])
+        state['previous'] = np.where(first, utilization, np.where(changed, state['utilization'], state['previous']))
+        state['changed_at'] = np.where(changed, ts, state['changed_at'])
+        state['utilization'] = utilization
+        state['seen_at'] = ts
+        self._state[codes] = state
+
+    def on_publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: a full replace logs every station, an update only the changed ones"""
+        if changed is None:
+            self.append(snapshot.stations)
+        else:
+            self.append([snapshot.get(station_id) for station_id in changed])
+
+    # --- queries ---------------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._appended
+
+    def range(self, start: float, end: float, station_ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Records with start <= ts < end (optionally for some stations), in time order"""
+        with self._lock:
+            segments = [path for first, last, path in self._segments if last >= start and first < end]
+            in_ring = min(self._appended, self.capacity)
+            unflushed = self._tail(in_ring if not self.directory else self._appended - self._flushed)
+            wanted = None
+            if station_ids is not None:
+                wanted = np.array([self._codes[i] for i in station_ids if i in self._codes], dtype=np.int32)
+        parts = [np.fromfile(path, dtype=RECORD_DTYPE) for path in segments] + [unflushed]
+        records = np.concatenate(parts) if parts else np.empty(0, dtype=RECORD_DTYPE)
+        keep = (records['ts'] >= start) & (records['ts'] < end)
+        if wanted is not None:
+            keep &= np.isin(records['station'], wanted)
+        records = records[keep]
+        return records[np.argsort(records['ts'], kind='stable')]
+
+    def downsample(self, start: float, end: float, bucket_seconds: float = 3600,
+                   station_ids: Optional[Sequence[str]] = None, lookback: float = 86400,
+                   metric: str = 'utilization') -> pd.DataFrame:
+        """Time-weighted mean of `metric` per station per bucket.
+
+        Availability is a step function between log records, so its running
+        integral is piecewise linear; interpolating that integral at bucket
+        edges gives exact bucket means without expanding the series. Records up
+        to `lookback` seconds before `start` seed each station's opening state.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {tuple(METRICS)}")
+        records = self.range(start - lookback, end, station_ids)
+        edges = np.arange(start, end + bucket_seconds, bucket_seconds, dtype=np.float64)
+        edges[-1] = min(edges[-1], end)
+        rows = []
+        if len(records):
+            order = np.lexsort((records['ts'], records['station']))
+            records = records[order]
+            splits = np.flatnonzero(np.diff(records['station'])) + 1
+            for group in np.split(records, splits):
+                ts = group['ts']
+                values = METRICS[metric](group)
+                # Integral of the metric up to each record, then extended to the range end
+                times = np.append(ts, max(end, ts[-1]))
+                integral = np.concatenate([[0.0], np.cumsum(values * np.diff(times))])
+                known_from = max(ts[0], start)
+                at_edges = np.interp(np.clip(edges, ts[0], times[-1]), times, integral)
+                covered = np.diff(np.clip(edges, known_from, end))
+                means = np.divide(np.diff(at_edges), covered, out=np.full(len(covered), np.nan), where=covered > 0)
+                station_id = self._ids[group['station'][0]]
+                for bucket_start, mean in zip(edges[:-1], means):
+                    if not np.isnan(mean):
+                        rows.append((station_id, bucket_start, mean))
+        return pd.DataFrame(rows, columns=['station_id', 'bucket_start', metric])
+
+    def features(self, station_ids: Sequence[str], now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Lag and rolling utilization features for the given stations as of `now`"""
+        now = time.time() if now is None else now
+        with self._lock:
+            codes = np.array([self._codes.get(station_id, -1) for station_id in station_ids], dtype=np.int64)
+            known = (codes >= 0) & (codes < len(self._state))
+            state = np.zeros(len(codes), dtype=self._state.dtype)
+            state[:] = np.nan
+            state[known] = self._state[codes[known]]
+        seen = ~np.isnan(state['seen_at'])
+        elapsed = np.where(seen, np.maximum(now - state['seen_at'], 0.0), 0.0)
+        features = {
+            'utilization_lag_1': state['previous'],
+            'seconds_since_change': np.where(seen, now - state['changed_at'], np.nan),
+        }
+        for name, window in EWM_WINDOWS.items():
+            # Carry each average forward to `now` with the current state still holding
+            column = state[f'ewm_{name}']
+            features[f'utilization_ewm_{name}'] = state['utilization'] + (column - state['utilization']) * np.exp(-elapsed / window)
+        return features
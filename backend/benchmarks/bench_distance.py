@@ -0,0 +1,57 @@
+"""Distance engine vs. the original per-station geodesic loop.
+
+Run from backend/: python -m benchmarks.bench_distance [sizes...]
+"""
+import sys
+import timeit
+from geopy.distance import geodesic
+from distance_engine import DistanceEngine, haversine_km
+from spatial_index import StationSpatialIndex
+from benchmarks.synthetic import synthetic_stations
+
+USER_LOCATION = (31.2755, 75.6733)
+RADIUS_KM = 15
+
+
+def geodesic_loop(stations):
+    """Nearby-station scan as LocationBasedChargingService did it before the engine"""
+    return sorted(
+        d for d in (geodesic(USER_LOCATION, (s.latitude, s.longitude)).kilometers for s in stations)
+        if d <= RADIUS_KM
+    )
+
+
+def haversine_loop(stations):
+    return sorted(
+        d for d in (haversine_km(*USER_LOCATION, s.latitude, s.longitude) for s in stations)
+        if d <= RADIUS_KM
+    )
+
+
+def best_of(func, repeat: int = 5) -> float:
+    number = 1
+    while timeit.timeit(func, number=number) < 0.05 and number < 10000:
+        number *= 10
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e3
+
+
+def main(sizes):
+    print(f"{'stations':>9} {'geodesic loop':>14} {'haversine loop':>15} {'numpy fast':>11} "
+          f"{'numpy exact':>12} {'grid exact':>11}   (ms per radius query)")
+    for count in sizes:
+        stations = synthetic_stations(count)
+        fast = DistanceEngine.from_stations(stations, 'haversine')
+        exact = DistanceEngine.from_stations(stations, 'exact')
+        index = StationSpatialIndex(exact)
+        timings = [
+            best_of(lambda: geodesic_loop(stations), repeat=3 if count >= 10000 else 5),
+            best_of(lambda: haversine_loop(stations)),
+            best_of(lambda: fast.within(*USER_LOCATION, RADIUS_KM)),
+            best_of(lambda: exact.within(*USER_LOCATION, RADIUS_KM)),
+            best_of(lambda: index.within(*USER_LOCATION, RADIUS_KM)),
+        ]
+        print(f"{count:>9} " + " ".join(f"{t:>{w}.3f}" for t, w in zip(timings, (14, 15, 11, 12, 11))))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 30, 100, 1000, 10000])
@@ -0,0 +1,105 @@
+"""Status event ingest: per-record store.update() vs. column updates, then sustained queue ingest under request load.
+
+Run from backend/: python -m benchmarks.bench_ingest [sizes...]
+"""
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+os.environ.setdefault('BACKGROUND_UPDATES', 'none')
+
+from app import app, charging_service
+from status_ingest import QueuedStatusEvents, SimulatedStatusEvents, StatusBatch, StatusIngest
+from benchmarks.synthetic import synthetic_stations
+
+CHANGE_SHARE = 0.3
+TARGET_RATE = 50_000  # events per second pushed by the producer in the sustained run
+TICK_SECONDS = 0.5
+RUN_SECONDS = 5
+NEARBY_URL = '/api/nearby-stations?lat=31.2755&lng=75.6733&radius=15'
+
+
+def per_record(store, batch: StatusBatch):
+    """What each tick did before: one dataclasses.replace per changed station"""
+    slots = batch.available_slots.tolist()
+    store.update({
+        station_id: {'available_slots': slots[i], 'is_available': slots[i] > 0, 'last_updated': batch.timestamps[i]}
+        for i, station_id in enumerate(batch.station_ids.tolist())
+    })
+
+
+def sustained(service, count: int):
+    """Producer pushes TARGET_RATE events/s, ticks drain the queue, a client measures request latency meanwhile"""
+    queue = QueuedStatusEvents()
+    ingest = StatusIngest(service.store, queue, batch_size=5000)
+    simulated = SimulatedStatusEvents(1.0, seed=3)
+    stop = threading.Event()
+
+    # Events are drawn up front (fresh slot counts each round) so the producer thread costs next to nothing
+    rounds = -(-TARGET_RATE * RUN_SECONDS // count)
+    pool = StatusBatch.concat(simulated.poll(service.store.snapshot(), time.time()) for _ in range(rounds))
+    pool = pool[np.random.default_rng(5).permutation(len(pool))]
+
+    def produce():
+        chunk, sent, started = TARGET_RATE // 20, 0, time.monotonic()
+        while not stop.is_set() and sent < len(pool):
+            queue.put(pool[sent:sent + chunk])
+            sent += chunk
+            stop.wait(max(0.0, sent / TARGET_RATE - (time.monotonic() - started)))
+
+    def consume():
+        while not stop.is_set():
+            started = time.monotonic()
+            ingest.tick()
+            stop.wait(max(0.0, TICK_SECONDS - (time.monotonic() - started)))
+
+    client = app.test_client()
+    idle = [_request_ms(client) for _ in range(200)]
+    threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+    for thread in threads:
+        thread.start()
+    latencies, started = [], time.monotonic()
+    while time.monotonic() - started < RUN_SECONDS:
+        latencies.append(_request_ms(client))
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    print(f"{count:>9} sustained: {ingest.received / elapsed:>9,.0f} events/s received, "
+          f"{ingest.applied / elapsed:>9,.0f} stations/s changed, {len(queue)} left in the queue; "
+          f"nearby p50/p99 idle {np.percentile(idle, 50):.1f}/{np.percentile(idle, 99):.1f} ms, "
+          f"during ingest {np.percentile(latencies, 50):.1f}/{np.percentile(latencies, 99):.1f} ms")
+
+
+def _request_ms(client) -> float:
+    started = time.perf_counter()
+    client.get(NEARBY_URL)
+    return (time.perf_counter() - started) * 1e3
+
+
+def main(sizes):
+    service = charging_service
+    print(f"{'stations':>9} {'events':>8} {'per record':>11} {'columns':>9} {'events/s':>10}   "
+          f"(ms per tick of {CHANGE_SHARE:.0%} of the stations, subscribers included)")
+    for count in sizes:
+        service.store.replace_all(synthetic_stations(count))
+        simulated = SimulatedStatusEvents(CHANGE_SHARE, seed=1)
+        ingest = StatusIngest(service.store, batch_size=5000)
+        timings = {'per record': [], 'columns': []}
+        events = 0
+        for _ in range(3):
+            for name, apply in (('per record', lambda b: per_record(service.store, b)), ('columns', ingest.apply)):
+                batch = simulated.poll(service.store.snapshot(), time.time())
+                started = time.perf_counter()
+                apply(batch)
+                timings[name].append(time.perf_counter() - started)
+                events = len(batch)
+        old, new = min(timings['per record']), min(timings['columns'])
+        print(f"{count:>9} {events:>8} {old * 1e3:>11.0f} {new * 1e3:>9.0f} {events / new:>10,.0f}")
+        sustained(service, count)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,81 @@
+"""Station inventory loading: bulk load from each source format, and incremental upserts vs. a full replace.
+
+Run from backend/: python -m benchmarks.bench_loading [sizes...]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from contextlib import closing
+import pandas as pd
+from app import ChargingStation
+from station_ranking import StationRanker
+from station_source import open_station_source, pq
+from station_store import StationStore
+from spatial_index import StationSpatialIndex
+from benchmarks.synthetic import synthetic_stations
+
+CHANGED_SHARE = 0.01
+
+
+def write_inventories(stations, directory: str):
+    """The same stations as CSV, GeoJSON, SQLite and (with pyarrow) Parquet; returns the paths"""
+    frame = pd.DataFrame.from_records([s.to_dict() for s in stations]).drop(columns=['timestamp', 'is_available'])
+    paths = [os.path.join(directory, 'stations.csv'), os.path.join(directory, 'stations.geojson'),
+             os.path.join(directory, 'stations.db')]
+    frame.to_csv(paths[0], index=False)
+    properties = frame.drop(columns=['latitude', 'longitude']).to_dict('records')
+    with open(paths[1], 'w', encoding='utf-8') as handle:
+        json.dump({'type': 'FeatureCollection', 'features': [
+            {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [s.longitude, s.latitude]},
+             'properties': props}
+            for s, props in zip(stations, properties)
+        ]}, handle)
+    with closing(sqlite3.connect(paths[2])) as connection:
+        frame.to_sql('stations', connection, index=False)
+        connection.execute('CREATE INDEX stations_last_updated ON stations (last_updated)')
+        connection.commit()
+    if pq is not None:
+        paths.append(os.path.join(directory, 'stations.parquet'))
+        frame.to_parquet(paths[-1], index=False)
+    return paths
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1e3
+
+
+def main(sizes):
+    print(f"{'stations':>9} {'format':>8} {'load':>9} {'publish':>9} {'total':>9}   (ms, publish = index + ranking columns)")
+    for count in sizes:
+        stations = synthetic_stations(count)
+        with tempfile.TemporaryDirectory() as directory:
+            for path in write_inventories(stations, directory):
+                store = StationStore(lambda s: StationSpatialIndex.from_stations(s, 'haversine'))
+                StationRanker(store, lambda snapshot, lat, lng, positions, km: km / 40 * 60)
+                source = open_station_source(path, ChargingStation)
+                loaded, load_ms = timed(source.load)
+                _, publish_ms = timed(lambda: store.replace_all(loaded))
+                assert len(loaded) == count and source.skipped == 0
+                print(f"{count:>9} {os.path.splitext(path)[1][1:]:>8} {load_ms:>9.1f} {publish_ms:>9.1f} "
+                      f"{load_ms + publish_ms:>9.1f}")
+
+        # One in a hundred stations changes status: upsert those records vs. replacing the whole set
+        snapshot = store.snapshot()
+        step = int(1 / CHANGED_SHARE)
+        changed = [replace(s, available_slots=(s.available_slots + 1) % (s.total_slots + 1),
+                           is_available=(s.available_slots + 1) % (s.total_slots + 1) > 0, last_updated=time.time())
+                   for s in snapshot.stations[::step]]
+        _, upsert_ms = timed(lambda: store.upsert(changed))
+        everything = list(store.snapshot().stations)
+        _, replace_ms = timed(lambda: store.replace_all(everything))
+        print(f"{count:>9} {'upsert':>8} {len(changed)} changed: upsert {upsert_ms:.1f} ms vs. replace_all {replace_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,77 @@
+"""Memory per station: the original ChargingStation layout vs. the compact one.
+
+Strings are re-created for every record, as they would be when loading an
+inventory from a file or the shared table, so interning actually matters.
+
+Run from backend/: python -m benchmarks.bench_memory [sizes...]
+"""
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from datetime import datetime
+from app import ChargingStation
+from benchmarks.synthetic import synthetic_stations
+
+
+@dataclass
+class LegacyChargingStation:
+    """ChargingStation as it was before the compact layout"""
+    id: str
+    name: str
+    latitude: float
+    longitude: float
+    is_available: bool
+    connector_type: str
+    power_kw: float
+    last_updated: float
+    address: str
+    price_per_kwh: float
+    operator: str
+    available_slots: int
+    total_slots: int
+    timestamp: str
+
+
+def _fresh(text: str) -> str:
+    # A new string object with the same value, like a decoder would produce
+    return text.encode('utf-8').decode('utf-8')
+
+
+def _loaded_fields(station):
+    return dict(
+        id=_fresh(station.id), name=_fresh(station.name),
+        latitude=station.latitude + 0.0, longitude=station.longitude + 0.0,
+        is_available=station.is_available, connector_type=_fresh(station.connector_type),
+        power_kw=float(station.power_kw), last_updated=station.last_updated + 0.0,
+        address=_fresh(station.address), price_per_kwh=station.price_per_kwh + 0.0,
+        operator=_fresh(station.operator), available_slots=station.available_slots,
+        total_slots=station.total_slots
+    )
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    records = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return current
+
+
+def main(sizes):
+    print(f"{'stations':>9} {'legacy MB':>10} {'compact MB':>11} {'legacy B/stn':>13} {'compact B/stn':>14} {'saved':>6}")
+    for count in sizes:
+        source = synthetic_stations(count)
+        legacy = measure(lambda: [
+            LegacyChargingStation(**_loaded_fields(s), timestamp=datetime.fromtimestamp(s.last_updated).isoformat())
+            for s in source
+        ])
+        compact = measure(lambda: tuple(ChargingStation(**_loaded_fields(s)) for s in source))
+        print(f"{count:>9} {legacy / 2**20:>10.2f} {compact / 2**20:>11.2f} {legacy / count:>13.0f} "
+              f"{compact / count:>14.0f} {1 - compact / legacy:>6.0%}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000])
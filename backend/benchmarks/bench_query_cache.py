@@ -0,0 +1,62 @@
+"""Nearby and find-nearest queries from clustered users: grid index alone vs. the per-cell query cache.
+
+Run from backend/: python -m benchmarks.bench_query_cache [sizes...]
+"""
+import os
+import sys
+import time
+import numpy as np
+
+os.environ.setdefault('BACKGROUND_UPDATES', 'none')
+
+from app import charging_service
+from benchmarks.synthetic import synthetic_stations
+
+HOTSPOTS = 50
+QUERIES = 2000
+JITTER_DEGREES = 0.003  # ~300 m around each hotspot
+RADIUS_KM = 10
+
+
+def clustered_users(count: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    hotspots = rng.uniform((31.15, 75.45), (31.40, 75.85), (HOTSPOTS, 2))
+    return (hotspots[rng.integers(HOTSPOTS, size=count)] + rng.normal(0, JITTER_DEGREES, (count, 2))).tolist()
+
+
+def per_query_ms(func, users) -> float:
+    start = time.perf_counter()
+    for lat, lng in users:
+        func(lat, lng)
+    return (time.perf_counter() - start) * 1e3 / len(users)
+
+
+def main(sizes):
+    service = charging_service
+    cache = service.query_cache
+    users = clustered_users(QUERIES)
+    print(f"{'stations':>9} {'query':>13} {'index':>8} {'cold':>8} {'warm':>8} {'hit rate':>9}   "
+          f"(ms per query, {HOTSPOTS} hotspots; cold = first pass, cells built as they are met)")
+    for count in sizes:
+        service.store.replace_all(synthetic_stations(count))
+        snapshot = service.snapshot()
+        queries = {
+            'nearby': (lambda lat, lng: snapshot.index.within(lat, lng, RADIUS_KM),
+                       lambda lat, lng: cache.within(snapshot, lat, lng, RADIUS_KM)),
+            'find-nearest': (lambda lat, lng: snapshot.index.nearest(lat, lng, 1, 20, snapshot.available),
+                             lambda lat, lng: cache.nearest(snapshot, lat, lng, 1, 20, snapshot.available)),
+        }
+        for name, (uncached, cached) in queries.items():
+            index_ms = per_query_ms(uncached, users)
+            hits, misses = cache.hits, cache.misses
+            cold_ms = per_query_ms(cached, users)
+            hit_rate = (cache.hits - hits) / max(cache.hits - hits + cache.misses - misses, 1)
+            warm_ms = per_query_ms(cached, users)
+            print(f"{count:>9} {name:>13} {index_ms:>8.3f} {cold_ms:>8.3f} {warm_ms:>8.3f} {hit_rate:>9.1%}")
+        # Whole service call, formatted records included
+        service_ms = per_query_ms(lambda lat, lng: service.get_nearby_stations(lat, lng, RADIUS_KM), users)
+        print(f"{count:>9} {'service':>13} {'':>8} {'':>8} {service_ms:>8.3f}   get_nearby_stations, {cache.stats()['records']} records cached")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
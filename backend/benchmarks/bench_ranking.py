@@ -0,0 +1,66 @@
+"""Multi-criteria ranking latency: Python scoring + full sort vs. the vectorized top-k ranker.
+
+Run from backend/: python -m benchmarks.bench_ranking [sizes...]
+"""
+import sys
+from distance_engine import haversine_km
+from station_ranking import RankingQuery, StationRanker
+from station_store import StationStore
+from spatial_index import StationSpatialIndex
+from benchmarks.bench_distance import USER_LOCATION, best_of
+from benchmarks.synthetic import synthetic_stations
+
+QUERY = RankingQuery(
+    weights=(('distance', 1.0), ('price', 2.0), ('power', 0.5), ('time_to_charge', 1.0)),
+    connector_types=('CCS', 'Type2')
+)
+TOP_K = 10
+
+
+def python_ranking(stations, radius_km):
+    """Score every station in a Python loop and sort the full list, as a straightforward service would"""
+    candidates = []
+    for station in stations:
+        if station.connector_type not in QUERY.connector_types:
+            continue
+        distance = haversine_km(*USER_LOCATION, station.latitude, station.longitude)
+        if distance <= radius_km:
+            total_minutes = distance / 40 * 60 + QUERY.energy_kwh / station.power_kw * 60
+            candidates.append((station, distance, total_minutes))
+    if not candidates:
+        return []
+
+    def spread(values):
+        low, high = min(values), max(values)
+        return [(v - low) / (high - low) if high > low else 0.0 for v in values]
+
+    distance = spread([c[1] for c in candidates])
+    price = spread([c[0].price_per_kwh for c in candidates])
+    power = spread([c[0].power_kw for c in candidates])
+    total = spread([c[2] for c in candidates])
+    scores = [d + 2 * p + 0.5 * (1 - w) + t for d, p, w, t in zip(distance, price, power, total)]
+    return sorted(zip(scores, (c[0].id for c in candidates)))[:TOP_K]
+
+
+def main(sizes):
+    print(f"{'stations':>9} {'radius':>7} {'candidates':>11} {'python sort':>12} "
+          f"{'ranker all':>11} {'ranker top-10':>14}   (ms per query)")
+    for count in sizes:
+        stations = synthetic_stations(count)
+        store = StationStore(lambda s: StationSpatialIndex.from_stations(s, 'haversine'))
+        ranker = StationRanker(store, lambda snapshot, lat, lng, positions, km: km / 40 * 60)
+        store.replace_all(stations)
+        snapshot = store.snapshot()
+        for radius_km in (15, 250):
+            found = ranker.rank(snapshot, *USER_LOCATION, radius_km, QUERY)[0]
+            timings = [
+                best_of(lambda: python_ranking(stations, radius_km), repeat=3),
+                best_of(lambda: ranker.rank(snapshot, *USER_LOCATION, radius_km, QUERY)),
+                best_of(lambda: ranker.rank(snapshot, *USER_LOCATION, radius_km, QUERY, k=TOP_K)),
+            ]
+            print(f"{count:>9} {radius_km:>7} {len(found):>11} "
+                  + " ".join(f"{t:>{w}.3f}" for t, w in zip(timings, (12, 11, 14))))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 30000, 100000])
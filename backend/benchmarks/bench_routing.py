@@ -0,0 +1,49 @@
+"""Road drive-time latency: cold one-to-many Dijkstra vs. cached answers, per find-nearest sized query.
+
+Run from backend/: python -m benchmarks.bench_routing [grid sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+from road_network import DriveTimeEngine, RoadGraph
+from station_store import StationStore
+from spatial_index import StationSpatialIndex
+from benchmarks.bench_distance import USER_LOCATION, best_of
+from benchmarks.synthetic import synthetic_stations, write_synthetic_osm
+
+STATIONS = 10000
+TARGETS = (8, 100)
+
+
+def main(sizes):
+    print(f"{'grid':>5} {'nodes':>7} {'edges':>8} {'targets':>8} {'cold':>9} {'warm':>9}   (ms per query)")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'roads.osm')
+            write_synthetic_osm(path, size)
+            graph = RoadGraph.load(path)
+        store = StationStore(lambda s: StationSpatialIndex.from_stations(s, 'haversine'))
+        snapshot = store.replace_all(synthetic_stations(STATIONS, spread_deg=size * 0.005 / 2))
+        rng = random.Random(7)
+        for count in TARGETS:
+            found, _ = snapshot.index.nearest(*USER_LOCATION, k=count)
+            engine = DriveTimeEngine(graph)
+            engine.minutes(snapshot, *USER_LOCATION, found)  # snap the stations once
+            cold = []
+            for _ in range(20):
+                # A fresh starting point each time, so nothing is cached for it
+                lat = USER_LOCATION[0] + rng.uniform(-0.05, 0.05)
+                lng = USER_LOCATION[1] + rng.uniform(-0.05, 0.05)
+                start = time.perf_counter()
+                engine.minutes(snapshot, lat, lng, found)
+                cold.append((time.perf_counter() - start) * 1e3)
+            warm = best_of(lambda: engine.minutes(snapshot, *USER_LOCATION, found))
+            print(f"{size:>5} {len(graph):>7} {len(graph.indices):>8} {count:>8} "
+                  f"{float(np.median(cold)):>9.3f} {warm:>9.3f}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 200, 300])
@@ -0,0 +1,70 @@
+"""JSON encoding of station lists: Flask's default provider on dicts vs. the codec on the records, records vs. columns.
+
+Run from backend/: python -m benchmarks.bench_serialization [sizes...]
+"""
+import os
+import sys
+import timeit
+
+os.environ.setdefault('BACKGROUND_UPDATES', 'none')
+
+from flask.json.provider import DefaultJSONProvider
+from app import STATION_COLUMNS, app, charging_service
+from serialization import JsonCodec, StationJsonCache, orjson, record_columns
+from benchmarks.synthetic import synthetic_stations
+
+NEARBY = (31.2755, 75.6733, 15)
+
+
+def best_of(func, repeat: int = 3) -> float:
+    number = 1
+    while timeit.timeit(func, number=number) < 0.05 and number < 1000:
+        number *= 10
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e3
+
+
+def cases(default: DefaultJSONProvider, codec: JsonCodec, stations, nearby):
+    """(payload, encode) pairs; encode returns the body"""
+    warm = StationJsonCache(codec)
+    warm.encode_list(stations)
+    return [
+        ('stations', lambda: StationJsonCache(codec).encode_list(stations)),
+        ('stations (cached)', lambda: warm.encode_list(stations)),
+        ('stations columns', lambda: codec.dumps({'count': len(stations),
+                                                  'columns': record_columns(stations, STATION_COLUMNS)})),
+        (f'nearby ({len(nearby)})', lambda: codec.dumps({'stations': nearby}, sort_keys=True)),
+    ]
+
+
+def main(sizes):
+    default = DefaultJSONProvider(app)
+    codecs = [JsonCodec('stdlib')] + ([JsonCodec('orjson')] if orjson is not None else [])
+    print(f"{'stations':>9} {'payload':>18} {'dicts+jsonify':>14} " + ' '.join(f"{codec.backend:>9}" for codec in codecs)
+          + '   (ms per body)')
+    with app.test_request_context():
+        for count in sizes:
+            charging_service.store.replace_all(synthetic_stations(count))
+            stations = charging_service.snapshot().stations
+            nearby = charging_service.get_nearby_stations(*NEARBY)
+            # What the routes did before: build a dict per station, then jsonify
+            baselines = {
+                'stations': lambda: default.response([station.to_dict() for station in stations]),
+                f'nearby ({len(nearby)})': lambda: default.response({'stations': nearby}),
+            }
+            timings = [cases(default, codec, stations, nearby) for codec in codecs]
+            for row, (name, _) in enumerate(timings[0]):
+                baseline = f"{best_of(baselines[name]):>14.2f}" if name in baselines else f"{'':>14}"
+                print(f"{count:>9} {name:>18} {baseline} " + ' '.join(f"{best_of(t[row][1]):>9.2f}" for t in timings))
+
+            client = app.test_client()
+            before = best_of(lambda: default.response(charging_service.get_stations_for_ml()))
+            print(f"{count:>9} {'ml (route)':>18} {before:>14.2f} {'':>9} "
+                  f"{best_of(lambda: client.get('/api/stations/ml')):>9.2f}   ({app.json.codec.backend}, "
+                  f"columns: {best_of(lambda: client.get('/api/stations/ml?format=columns')):.2f})")
+            records = len(client.get('/api/stations').data)
+            columns = len(client.get('/api/stations?format=columns').data)
+            print(f"{count:>9} {'body size':>18}   records {records / 1e6:.1f} MB, columns {columns / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000])
@@ -0,0 +1,139 @@
+"""Serving-mode load test: sync gunicorn vs. the gevent worker vs. the ASGI entry point.
+
+Each server is started on a local port, a number of SSE streams is held open
+(standing in for long-lived map downloads and live dashboards), and JSON
+requests are fired at a fixed concurrency. Reports p50/p99 latency, throughput
+and requests that failed or timed out.
+
+Run from backend/: python -m benchmarks.bench_serving [--streams 0 50] [--requests 2000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import List, Optional
+import numpy as np
+
+MODES = {
+    'gunicorn-sync': ['gunicorn', '--workers', '{workers}', '--bind', '127.0.0.1:{port}', 'app:app'],
+    'gunicorn-gevent': ['gunicorn', '--workers', '{workers}', '--worker-class', 'gevent',
+                        '--worker-connections', '2000', '--bind', '127.0.0.1:{port}', 'app:app'],
+    'asgi': [sys.executable, '-m', 'uvicorn', '--workers', '{workers}', '--port', '{port}',
+             '--log-level', 'warning', 'asgi:app'],
+}
+PATHS = ['/api/stations', '/api/nearby-stations?lat=31.3&lng=75.6&radius=15']
+
+
+async def fetch(port: int, path: str, timeout: float) -> Optional[float]:
+    """Seconds for one GET (Connection: close), or None if it failed or timed out"""
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        data = await asyncio.wait_for(reader.read(), timeout - (time.perf_counter() - start))
+        writer.close()
+        return time.perf_counter() - start if data.startswith(b'HTTP/1.1 200') else None
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+
+async def hold_stream(port: int, ready: asyncio.Event, opened: List[int]):
+    """Open an SSE stream, note once its first event arrived, then keep reading until cancelled"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /api/stations/stream HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        if b'event: snapshot' in await reader.readuntil(b'event: snapshot'):
+            opened.append(1)
+        ready.set()
+        while await reader.read(65536):
+            pass
+    except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        ready.set()
+
+
+async def load(port: int, streams: int, requests: int, concurrency: int, timeout: float):
+    opened: List[int] = []
+    holders = []
+    for _ in range(streams):
+        ready = asyncio.Event()
+        holders.append((asyncio.ensure_future(hold_stream(port, ready, opened)), ready))
+    # Give every stream a moment to be accepted (a blocked server never answers them)
+    if holders:
+        waits = [asyncio.ensure_future(ready.wait()) for _, ready in holders]
+        _, pending = await asyncio.wait(waits, timeout=3)
+        for wait in pending:
+            wait.cancel()
+
+    latencies: List[Optional[float]] = []
+    queue = iter(range(requests))
+
+    async def client():
+        for i in queue:
+            latencies.append(await fetch(port, PATHS[i % len(PATHS)], timeout))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    for task, _ in holders:
+        task.cancel()
+    await asyncio.gather(*(task for task, _ in holders), return_exceptions=True)
+    ok = np.array([latency for latency in latencies if latency is not None]) * 1e3
+    return {
+        'streams_open': len(opened),
+        'ok': len(ok),
+        'failed': len(latencies) - len(ok),
+        'p50_ms': float(np.percentile(ok, 50)) if len(ok) else float('nan'),
+        'p99_ms': float(np.percentile(ok, 99)) if len(ok) else float('nan'),
+        'rps': len(ok) / elapsed,
+    }
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    command = [part.format(port=port, workers=workers) for part in MODES[mode]]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if asyncio.run(fetch(port, '/', 1.0)) is not None:
+            return server
+        time.sleep(0.2)
+    stop_server(server)
+    raise RuntimeError(f'{mode} did not start on port {port}')
+
+
+def stop_server(server: subprocess.Popen):
+    os.killpg(server.pid, signal.SIGTERM)
+    try:
+        server.wait(10)
+    except subprocess.TimeoutExpired:
+        os.killpg(server.pid, signal.SIGKILL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    parser.add_argument('--streams', nargs='+', type=int, default=[0, 50])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--port', type=int, default=8790)
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':>16} {'streams':>8} {'open':>5} {'ok':>6} {'failed':>7} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for offset, mode in enumerate(args.modes):
+        port = args.port + offset
+        server = start_server(mode, port, args.workers)
+        try:
+            for streams in args.streams:
+                result = asyncio.run(load(port, streams, args.requests, args.concurrency, args.timeout))
+                print(f"{mode:>16} {streams:>8} {result['streams_open']:>5} {result['ok']:>6} {result['failed']:>7} "
+                      f"{result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['rps']:>8.0f}")
+        finally:
+            stop_server(server)
+
+
+if __name__ == '__main__':
+    main()
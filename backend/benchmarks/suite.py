@@ -0,0 +1,305 @@
+"""Backend benchmark suite: service micro-benchmarks and a concurrent request mix, at several station counts.
+
+For every station count the live service is reloaded with synthetic stations,
+then each service method is timed on its own, then the Flask app is driven
+through its test client by a pool of threads firing a weighted mix of
+requests. Results (throughput, p50/p95/p99 latency, peak RSS) are printed as a
+table and can be written as JSON, so two runs can be diffed with --compare.
+
+Peak RSS is the process high-water mark, so station counts run in ascending
+order and each figure covers that count and the smaller ones before it.
+
+Run from backend/: python -m benchmarks.suite [--stations 1000 10000] [--output run.json] [--compare base.json]
+"""
+import os
+
+# The suite drives the store itself; a background updater would make runs differ
+os.environ.setdefault('BACKGROUND_UPDATES', 'none')
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app import Config, app, charging_service, map_generator, ml_exporter, update_tick
+from benchmarks.synthetic import synthetic_stations
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+CENTER = (
+    (Config.JALANDHAR_COORDINATES[0] + Config.PHAGWARA_COORDINATES[0]) / 2,
+    (Config.JALANDHAR_COORDINATES[1] + Config.PHAGWARA_COORDINATES[1]) / 2,
+)
+MICRO_BENCHMARKS = ('find_nearest_station', 'get_nearby_stations', 'create_comprehensive_map', 'download_ml_data')
+# Default request mix for the load test (name=weight on the command line)
+REQUEST_MIX = {'nearby': 40, 'find-nearest': 30, 'stations': 20, 'comprehensive-map': 5, 'ml-data': 5}
+# Compared by --compare; a higher value is better only for throughput
+COMPARED = ('rps', 'p50_ms', 'p99_ms')
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def summarize(latencies: Sequence[float], errors: int, elapsed: float) -> Dict:
+    ms = np.asarray(latencies) * 1e3
+    summary = {'count': len(ms), 'errors': errors, 'rps': len(ms) / elapsed if elapsed else 0.0}
+    for name, q in (('p50_ms', 50), ('p95_ms', 95), ('p99_ms', 99)):
+        summary[name] = float(np.percentile(ms, q)) if len(ms) else None
+    summary['mean_ms'] = float(ms.mean()) if len(ms) else None
+    return summary
+
+
+def random_point(rng: random.Random, spread_deg: float) -> Tuple[float, float]:
+    return CENTER[0] + rng.uniform(-spread_deg, spread_deg), CENTER[1] + rng.uniform(-spread_deg, spread_deg)
+
+
+# --- micro-benchmarks ------------------------------------------------------
+
+def micro_calls(rng: random.Random, spread_deg: float) -> Dict[str, Callable[[], object]]:
+    """One zero-argument call per service method; points are drawn fresh on every call"""
+    def nearest():
+        return charging_service.find_nearest_station(*random_point(rng, spread_deg))
+
+    def nearby():
+        return charging_service.get_nearby_stations(*random_point(rng, spread_deg), 15)
+
+    def comprehensive_map():
+        return map_generator.create_comprehensive_map(charging_service.get_all_stations()).get_root().render()
+
+    def ml_data():
+        # The body /api/ml/data streams, drained here so the whole export is timed
+        return sum(len(chunk) for chunk in ml_exporter.stream('csv', charging_service.get_all_stations(), datetime.now()))
+
+    return {
+        'find_nearest_station': nearest,
+        'get_nearby_stations': nearby,
+        'create_comprehensive_map': comprehensive_map,
+        'download_ml_data': ml_data,
+    }
+
+
+def run_micro(call: Callable[[], object], seconds: float, min_iterations: int, max_iterations: int) -> Dict:
+    """Time single calls until the time budget is spent (but at least min_iterations of them)"""
+    call()  # warm-up: imports, lazily built columns, first-touch allocations
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    while len(latencies) + errors < max_iterations:
+        start = time.perf_counter()
+        try:
+            call()
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            errors += 1
+        if len(latencies) + errors >= min_iterations and time.perf_counter() - started >= seconds:
+            break
+    return summarize(latencies, errors, sum(latencies))
+
+
+# --- concurrent load through the test client -------------------------------
+
+def request_factories(spread_deg: float) -> Dict[str, Callable]:
+    """name -> function(client, rng) issuing one request and returning its status code"""
+    def nearby(client, rng):
+        lat, lng = random_point(rng, spread_deg)
+        return client.get(f'/api/nearby-stations?lat={lat:.5f}&lng={lng:.5f}&radius=15').status_code
+
+    def find_nearest(client, rng):
+        lat, lng = random_point(rng, spread_deg)
+        return client.post('/api/find-nearest', json={'latitude': lat, 'longitude': lng}).status_code
+
+    def stations(client, rng):
+        return client.get('/api/stations').status_code
+
+    def comprehensive_map(client, rng):
+        return client.get('/api/map/comprehensive').status_code
+
+    def ml_data(client, rng):
+        response = client.get('/api/ml/data')
+        response.get_data()  # drain the streamed body
+        return response.status_code
+
+    return {
+        'nearby': nearby,
+        'find-nearest': find_nearest,
+        'stations': stations,
+        'comprehensive-map': comprehensive_map,
+        'ml-data': ml_data,
+    }
+
+
+def run_load(mix: Dict[str, float], requests: int, concurrency: int, spread_deg: float, seed: int,
+             update_interval: Optional[float]) -> Dict[str, Dict]:
+    """Fire `requests` requests drawn from the weighted mix, `concurrency` at a time; per-route and overall results"""
+    factories = request_factories(spread_deg)
+    names = list(mix)
+    plan = random.Random(seed).choices(names, weights=[mix[name] for name in names], k=requests)
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    lock = threading.Lock()
+    jobs = iter(enumerate(plan))
+
+    def worker(worker_id: int):
+        client = app.test_client()
+        rng = random.Random(seed * 1000 + worker_id)
+        for _, name in jobs:  # the shared iterator hands each request to exactly one thread
+            start = time.perf_counter()
+            try:
+                ok = factories[name](client, rng) < 400
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    stop = threading.Event()
+
+    def updater():
+        # Optional store churn during the run, as the background updates would cause in production
+        while not stop.wait(update_interval):
+            update_tick()
+
+    churn = threading.Thread(target=updater, daemon=True) if update_interval else None
+    if churn is not None:
+        churn.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker, i) for i in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    results = {name: summarize(latencies[name], errors[name], elapsed) for name in names}
+    results['all'] = summarize([x for name in names for x in latencies[name]], sum(errors.values()), elapsed)
+    return results
+
+
+# --- reporting -------------------------------------------------------------
+
+def _row_key(row: Dict) -> Tuple:
+    return row['stations'], row['kind'], row['name']
+
+
+def print_rows(rows: List[Dict]):
+    print(f"{'stations':>9} {'kind':>5} {'benchmark':>25} {'count':>7} {'errors':>6} {'rps':>9} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak MB':>8}")
+    for row in rows:
+        cells = [f"{row[key]:>9.3f}" if row[key] is not None else f"{'-':>9}" for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        rss = f"{row['peak_rss_mb']:>8.0f}" if row['peak_rss_mb'] is not None else f"{'-':>8}"
+        print(f"{row['stations']:>9} {row['kind']:>5} {row['name']:>25} {row['count']:>7} {row['errors']:>6} "
+              f"{row['rps']:>9.1f} {' '.join(cells)} {rss}")
+
+
+def compare(rows: List[Dict], baseline: Dict):
+    """Print the relative change of each compared metric against a previous run's JSON"""
+    before = {_row_key(row): row for row in baseline['results']}
+    print(f"\nvs. {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta']['started']})")
+    print(f"{'stations':>9} {'kind':>5} {'benchmark':>25} " + ' '.join(f'{metric:>10}' for metric in COMPARED))
+    for row in rows:
+        old = before.get(_row_key(row))
+        if old is None:
+            continue
+        cells = []
+        for metric in COMPARED:
+            if not old[metric] or row[metric] is None:
+                cells.append(f"{'-':>10}")
+            else:
+                cells.append(f"{(row[metric] - old[metric]) / old[metric]:>+10.1%}")
+        print(f"{row['stations']:>9} {row['kind']:>5} {row['name']:>25} " + ' '.join(cells))
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_mix(items: Sequence[str]) -> Dict[str, float]:
+    mix = {}
+    for item in items:
+        if item == 'none':
+            continue
+        name, _, weight = item.partition('=')
+        if name not in REQUEST_MIX:
+            raise argparse.ArgumentTypeError(f"unknown request '{name}' (choose from {', '.join(REQUEST_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None) -> List[Dict]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stations', nargs='+', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--spread', type=float, default=1.5, help='half-width in degrees of the synthetic area')
+    parser.add_argument('--benchmarks', nargs='*', default=list(MICRO_BENCHMARKS), choices=MICRO_BENCHMARKS)
+    parser.add_argument('--seconds', type=float, default=2.0, help='time budget per micro-benchmark')
+    parser.add_argument('--min-iterations', type=int, default=3)
+    parser.add_argument('--max-iterations', type=int, default=2000)
+    parser.add_argument('--mix', nargs='*', default=[f'{k}={v}' for k, v in REQUEST_MIX.items()],
+                        help='weighted request mix for the load test, e.g. nearby=3 stations=1 (none to skip it)')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--update-interval', type=float, default=None,
+                        help='run the station updates every N seconds during the load test')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--compare', help='JSON from an earlier run to diff against')
+    args = parser.parse_args(argv)
+    try:
+        mix = _parse_mix(args.mix)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    meta = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'distance_precision': Config.DISTANCE_PRECISION,
+        'args': vars(args),
+    }
+    rows = []
+    for count in sorted(args.stations):
+        charging_service.stations = synthetic_stations(count, spread_deg=args.spread, seed=args.seed)
+        rng = random.Random(args.seed)
+        calls = micro_calls(rng, args.spread)
+        for name in args.benchmarks:
+            result = run_micro(calls[name], args.seconds, args.min_iterations, args.max_iterations)
+            rows.append({'stations': count, 'kind': 'micro', 'name': name, **result, 'peak_rss_mb': peak_rss_mb()})
+        if mix:
+            load = run_load(mix, args.requests, args.concurrency, args.spread, args.seed, args.update_interval)
+            rss = peak_rss_mb()
+            rows.extend({'stations': count, 'kind': 'load', 'name': name, **result, 'peak_rss_mb': rss}
+                        for name, result in load.items())
+    print_rows(rows)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump({'meta': meta, 'results': rows}, handle, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as handle:
+            compare(rows, json.load(handle))
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import random
+import time
+from typing import List
+from app import ChargingStation, Config
+
+CONNECTOR_TYPES = ['Type2', 'CCS', 'CHAdeMO', 'Bharat DC-001']
+OPERATORS = ['Tata Power', 'BSES', 'Fortum', 'Magenta', 'EVRE']
+
+
+def synthetic_stations(count: int, spread_deg: float = 1.5, seed: int = 42) -> List[ChargingStation]:
+    """Generate `count` random stations scattered around the Jalandhar-Phagwara corridor"""
+    rng = random.Random(seed)
+    center_lat = (Config.JALANDHAR_COORDINATES[0] + Config.PHAGWARA_COORDINATES[0]) / 2
+    center_lng = (Config.JALANDHAR_COORDINATES[1] + Config.PHAGWARA_COORDINATES[1]) / 2
+    stations = []
+    for i in range(1, count + 1):
+        available_slots = rng.randint(0, 4)
+        stations.append(ChargingStation(
+            id=f"SY{i:06d}",
+            name=f"Synthetic Station {i}",
+            latitude=center_lat + rng.uniform(-spread_deg, spread_deg),
+            longitude=center_lng + rng.uniform(-spread_deg, spread_deg),
+            is_available=available_slots > 0,
+            connector_type=rng.choice(CONNECTOR_TYPES),
+            power_kw=rng.choice([7.4, 15, 30, 50, 120]),
+            last_updated=time.time(),
+            address=f"Synthetic Address {i}",
+            price_per_kwh=round(rng.uniform(12.5, 18.5), 2),
+            operator=rng.choice(OPERATORS),
+            available_slots=available_slots,
+            total_slots=4
+        ))
+    return stations
+
+
+def write_synthetic_osm(path: str, size: int = 100, spacing_deg: float = 0.005):
+    """Write an OSM XML extract: a size x size grid of residential streets centred on the corridor,
+    plus a trunk road (standing in for NH-44) along the Jalandhar-Phagwara line"""
+    center_lat = (Config.JALANDHAR_COORDINATES[0] + Config.PHAGWARA_COORDINATES[0]) / 2
+    center_lng = (Config.JALANDHAR_COORDINATES[1] + Config.PHAGWARA_COORDINATES[1]) / 2
+    origin_lat = center_lat - size / 2 * spacing_deg
+    origin_lng = center_lng - size / 2 * spacing_deg
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for row in range(size):
+            for col in range(size):
+                handle.write(f'<node id="{row * size + col + 1}" lat="{origin_lat + row * spacing_deg:.7f}" '
+                             f'lon="{origin_lng + col * spacing_deg:.7f}"/>\n')
+        trunk_start = size * size + 1
+        steps = 200
+        (lat0, lng0), (lat1, lng1) = Config.JALANDHAR_COORDINATES, Config.PHAGWARA_COORDINATES
+        for step in range(steps + 1):
+            handle.write(f'<node id="{trunk_start + step}" lat="{lat0 + (lat1 - lat0) * step / steps:.7f}" '
+                         f'lon="{lng0 + (lng1 - lng0) * step / steps:.7f}"/>\n')
+
+        way_id = 1
+        for row in range(size):
+            refs = ''.join(f'<nd ref="{row * size + col + 1}"/>' for col in range(size))
+            handle.write(f'<way id="{way_id}">{refs}<tag k="highway" v="residential"/></way>\n')
+            way_id += 1
+        for col in range(size):
+            refs = ''.join(f'<nd ref="{row * size + col + 1}"/>' for row in range(size))
+            handle.write(f'<way id="{way_id}">{refs}<tag k="highway" v="residential"/></way>\n')
+            way_id += 1
+        refs = ''.join(f'<nd ref="{trunk_start + step}"/>' for step in range(steps + 1))
+        handle.write(f'<way id="{way_id}">{refs}<tag k="highway" v="trunk"/><tag k="ref" v="NH-44"/></way>\n')
+        way_id += 1
+        # Join the trunk to the grid wherever they cross
+        for step in range(0, steps + 1, 10):
+            lat = lat0 + (lat1 - lat0) * step / steps
+            lng = lng0 + (lng1 - lng0) * step / steps
+            row = round((lat - origin_lat) / spacing_deg)
+            col = round((lng - origin_lng) / spacing_deg)
+            if 0 <= row < size and 0 <= col < size:
+                handle.write(f'<way id="{way_id}"><nd ref="{trunk_start + step}"/><nd ref="{row * size + col + 1}"/>'
+                             f'<tag k="highway" v="trunk_link"/></way>\n')
+                way_id += 1
+        handle.write('</osm>\n')
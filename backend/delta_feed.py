@@ -0,0 +1,189 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import AsyncIterator, Callable, Iterator, List, Optional, Tuple
+
+# (latitude, longitude, pre-serialized station JSON)
+Item = Tuple[float, float, str]
+
+
+def parse_bbox(value: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """Parse a GeoJSON-order 'min_lng,min_lat,max_lng,max_lat' bounding box"""
+    if not value:
+        return None
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4:
+        raise ValueError('bbox must be min_lng,min_lat,max_lng,max_lat')
+    min_lng, min_lat, max_lng, max_lat = parts
+    if min_lat > max_lat:
+        raise ValueError('bbox min_lat must not exceed max_lat')
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def in_bbox(bbox, lat: float, lng: float) -> bool:
+    if bbox is None:
+        return True
+    min_lng, min_lat, max_lng, max_lat = bbox
+    if not min_lat <= lat <= max_lat:
+        return False
+    # A box may cross the antimeridian, in which case min_lng > max_lng
+    return min_lng <= lng <= max_lng if min_lng <= max_lng else (lng >= min_lng or lng <= max_lng)
+
+
+class _Tick:
+    """The stations one version changed; serialized the first time a stream needs them, then shared"""
+    __slots__ = ('stations', 'items')
+
+    def __init__(self, stations: List):
+        self.stations = stations
+        self.items: Optional[List[Item]] = None
+
+
+class DeltaFeed:
+    """Fan-out of station changes to Server-Sent Events subscribers.
+
+    Subscribes to the StationStore and keeps a short history of ticks, each
+    holding only the stations that changed, serialized once when the first
+    stream reads the tick (outside the store's write lock, and never when
+    nobody is listening). Event ids are '<lineage>-<version>', so a client can
+    resume with Last-Event-ID (even against another worker when the shared
+    table is on), and one resuming against another lineage (a restart, another
+    process) or from a version ahead of the feed gets a fresh snapshot. Subscribers don't need a thread
+    each: they park on one shared Condition, which is a cheap greenlet wait
+    under the gevent worker, or on an asyncio.Event under the ASGI server.
+    """
+
+    def __init__(self, store, history: int = 256, encoder: Optional[Callable[[object], bytes]] = None,
+                 lineage: Optional[Callable[[], str]] = None):
+        self._store = store
+        self.lineage = lineage or (lambda: store.lineage)
+        self._encode = encoder or (lambda station: json.dumps(station.to_dict(), separators=(',', ':')).encode('utf-8'))
+        self._events = deque(maxlen=history)  # (previous_version, version, _Tick)
+        self._condition = threading.Condition()
+        self._async_waiters = set()  # (loop, asyncio.Event) of parked async streams
+        self.version = store.version
+        store.subscribe(self.publish)
+
+    def _items(self, stations) -> List[Item]:
+        return [(station.latitude, station.longitude, self._encode(station).decode('utf-8')) for station in stations]
+
+    def _tick_items(self, tick: _Tick) -> List[Item]:
+        # Two streams may race to encode the same tick; both get the same items
+        if tick.items is None:
+            tick.items = self._items(tick.stations)
+        return tick.items
+
+    def publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: record one tick and wake every waiting stream"""
+        with self._condition:
+            if changed is None:
+                # A full replace can't be expressed as a delta; clients get a fresh snapshot instead
+                self._events.clear()
+            else:
+                self._events.append((self.version, snapshot.version, _Tick(list(map(snapshot.get, changed)))))
+            self.version = snapshot.version
+            self._condition.notify_all()
+            waiters = list(self._async_waiters)
+        # Publishing runs on a worker thread; events must be set from their own loop
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def wait(self, version: int, timeout: float) -> bool:
+        """Block until something newer than `version` is published; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.version > version, timeout)
+
+    async def wait_async(self, version: int, timeout: float) -> bool:
+        """wait() for coroutines: parks on an asyncio.Event instead of blocking the event loop"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._condition:
+            if self.version > version:
+                return True
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._condition:
+                self._async_waiters.discard(waiter)
+        return self.version > version
+
+    def events_since(self, version: int) -> Optional[List[Tuple[int, List[Item]]]]:
+        """(version, items) for each tick after `version`, or None if the history doesn't reach back (or it is ahead)"""
+        with self._condition:
+            if version > self.version:
+                return None
+            if version == self.version:
+                return []
+            if not self._events or self._events[0][0] > version:
+                return None
+            ticks = [(event_version, tick) for _, event_version, tick in self._events if event_version > version]
+        return [(event_version, self._tick_items(tick)) for event_version, tick in ticks]
+
+    @staticmethod
+    def format_event(event: str, version: int, items: List[Item], bbox=None, lineage: Optional[str] = None) -> Optional[str]:
+        """SSE frame with the items inside bbox, or None if a delta has nothing for this subscriber"""
+        selected = [data for lat, lng, data in items if in_bbox(bbox, lat, lng)]
+        if event == 'delta' and not selected:
+            return None
+        payload = '{"version":%d,"stations":[%s]}' % (version, ','.join(selected))
+        event_id = f'{lineage}-{version}' if lineage else version
+        return f'id: {event_id}\nevent: {event}\ndata: {payload}\n\n'
+
+    def pending(self, last_version: Optional[int], bbox=None) -> Tuple[List[str], int]:
+        """Frames a subscriber at last_version is missing (a snapshot if it can't catch up), and its new version"""
+        events = None if last_version is None else self.events_since(last_version)
+        lineage = self.lineage()
+        if events is None:
+            snapshot = self._store.snapshot()
+            frame = self.format_event('snapshot', snapshot.version, self._items(snapshot.stations), bbox, lineage)
+            return [frame], snapshot.version
+        frames = []
+        for version, items in events:
+            frame = self.format_event('delta', version, items, bbox, lineage)
+            if frame is not None:
+                frames.append(frame)
+            last_version = version
+        return frames, last_version
+
+    def _resume_from(self, last_version: Optional[int], lineage: Optional[str], refresh) -> Optional[int]:
+        """Where a new stream starts: last_version if it belongs to this feed's lineage, else None (a snapshot)"""
+        if refresh is not None:
+            # A reader worker may be behind the version the client already saw
+            refresh()
+        if lineage is not None and lineage != self.lineage():
+            return None
+        return last_version
+
+    def stream(self, last_version: Optional[int], bbox=None, heartbeat: float = 15.0,
+               refresh=None, lineage: Optional[str] = None) -> Iterator[str]:
+        """Generate SSE frames forever, starting after last_version of `lineage` (or with a full snapshot).
+
+        refresh is called on every heartbeat so a reader worker can pull newer
+        state from the shared table even when no request comes in.
+        """
+        yield 'retry: 3000\n\n'
+        last_version = self._resume_from(last_version, lineage, refresh)
+        while True:
+            frames, last_version = self.pending(last_version, bbox)
+            yield from frames
+            if not self.wait(last_version, heartbeat):
+                if refresh is not None:
+                    refresh()
+                yield ': keep-alive\n\n'
+
+    async def stream_async(self, last_version: Optional[int], bbox=None, heartbeat: float = 15.0,
+                           refresh=None, lineage: Optional[str] = None) -> AsyncIterator[str]:
+        """stream() for the event loop: same frames, but idle subscribers cost a parked coroutine"""
+        yield 'retry: 3000\n\n'
+        last_version = self._resume_from(last_version, lineage, refresh)
+        while True:
+            frames, last_version = self.pending(last_version, bbox)
+            for frame in frames:
+                yield frame
+            if not await self.wait_async(last_version, heartbeat):
+                if refresh is not None:
+                    refresh()
+                yield ': keep-alive\n\n'
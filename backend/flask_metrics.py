@@ -0,0 +1,82 @@
+import time
+from typing import Iterable, Iterator, Optional
+from flask import g, request
+from metrics import SIZE_BUCKETS, MetricsRegistry, SamplingProfiler
+
+
+class RequestMetrics:
+    """Flask hooks recording latency, response size, in-flight requests and exceptions per route.
+
+    Routes are labelled by their URL rule (/api/stations/<station_id>/prediction),
+    not the raw path, so the number of series stays bounded. Latency runs up
+    to the response headers; for streamed bodies the size is recorded once
+    the stream is drained.
+    """
+
+    def __init__(self, metrics: MetricsRegistry, profiler: Optional[SamplingProfiler] = None):
+        self.profiler = profiler
+        self.duration = metrics.histogram(
+            'http_request_duration_seconds', 'Request latency up to the response headers',
+            ('method', 'route', 'status')
+        )
+        self.size = metrics.histogram(
+            'http_response_size_bytes', 'Response body size', ('route',), buckets=SIZE_BUCKETS
+        )
+        self.in_flight = metrics.gauge('http_requests_in_flight', 'Requests being handled')
+        self.exceptions = metrics.counter(
+            'http_request_exceptions_total', 'Requests that ended in an unhandled exception', ('route', 'exception')
+        )
+
+    def init_app(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: Optional[int]):
+        """Record one request (also used by routes served outside Flask, see asgi.py)"""
+        self.duration.observe(seconds, method=method, route=route, status=status)
+        if size is not None:
+            self.size.observe(size, route=route)
+
+    @staticmethod
+    def _route() -> str:
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    def _before(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_profile = self.profiler.start() if self.profiler is not None else None
+        self.in_flight.inc()
+
+    def _after(self, response):
+        seconds = time.perf_counter() - g.metrics_start
+        route = self._route()
+        if response.is_streamed:
+            response.response = self._counted(response.response, route)
+            self.observe(request.method, route, response.status_code, seconds, None)
+        else:
+            self.observe(request.method, route, response.status_code, seconds, response.calculate_content_length())
+        if self.profiler is not None:
+            self.profiler.finish(g.pop('metrics_profile', None), seconds, method=request.method,
+                                 route=route, path=request.full_path.rstrip('?'), status=response.status_code)
+        return response
+
+    def _teardown(self, exc):
+        if 'metrics_start' not in g:
+            return
+        self.in_flight.dec()
+        if exc is not None:
+            self.exceptions.inc(route=self._route(), exception=type(exc).__name__)
+            if self.profiler is not None:
+                self.profiler.finish(g.pop('metrics_profile', None), time.perf_counter() - g.metrics_start)
+
+    def _counted(self, chunks: Iterable, route: str) -> Iterator:
+        total = 0
+        try:
+            for chunk in chunks:
+                # Text chunks (the SSE stream) go out UTF-8 encoded; count their bytes, not characters
+                total += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+                yield chunk
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self.size.observe(total, route=route)
@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class CachedMap:
+    """One rendered map document with its pre-compressed variants"""
+
+    def __init__(self, html: str):
+        self.body = html.encode('utf-8')
+        digest = hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.variants: Dict[str, bytes] = {'identity': self.body, 'gzip': gzip.compress(self.body, compresslevel=6)}
+        if brotli is not None:
+            self.variants['br'] = brotli.compress(self.body, quality=5)
+        # Each encoding is a different byte stream, so it gets its own strong ETag
+        self.etags: Dict[str, str] = {
+            encoding: f'"{digest}"' if encoding == 'identity' else f'"{digest}-{encoding}"'
+            for encoding in self.variants
+        }
+        self.size = sum(len(data) for data in self.variants.values())
+
+    def matches(self, if_none_match) -> bool:
+        """Whether any variant satisfies the client's If-None-Match header"""
+        if not if_none_match:
+            return False
+        return any(if_none_match.contains_weak(etag.strip('"')) for etag in self.etags.values())
+
+    def negotiate(self, accept_encodings) -> str:
+        """Pick the smallest encoding the client accepts"""
+        for encoding in ('br', 'gzip'):
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+
+class RenderedMapCache:
+    """LRU cache of rendered map HTML, bounded by entry count and total bytes.
+
+    Keys must include the station-state version so any availability change
+    produces a new key; stale versions simply age out of the LRU. Misses are
+    rendered once: concurrent requests for the same key wait for that render
+    instead of starting their own.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, CachedMap]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._rendering: Dict[Hashable, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[CachedMap]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: CachedMap) -> CachedMap:
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key).size
+            if entry.size > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+            return entry
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> CachedMap:
+        """Return the cached document for key, rendering and storing it on a miss"""
+        entry = self.get(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            rendering = self._rendering.setdefault(key, threading.Lock())
+        with rendering:
+            # Rendered by the request this one waited for
+            entry = self.get(key)
+            if entry is not None:
+                return entry
+            with self._lock:
+                self.misses += 1
+            try:
+                return self.put(key, CachedMap(render()))
+            finally:
+                with self._lock:
+                    self._rendering.pop(key, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
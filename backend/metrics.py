@@ -0,0 +1,272 @@
+import logging
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as StackCounter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bounds in seconds; fine at the low end, where most API calls land
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """One metric family: a name, its help text and a value per label combination"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 source: Optional[Callable[[], object]] = None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        # Read at scrape time instead of the recorded values: a number, or a dict of label tuple -> number
+        self.source = source
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        """(suffix, label text, value) for every exported line"""
+        if self.source is not None:
+            value = self.source()
+            values = list(value.items()) if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            yield '', _labels(self.labelnames, key), value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{self.name}{suffix}{labels} {_number(value)}' for suffix, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; each label combination holds [bucket counts..., sum, count]"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            state[slot] += 1  # slot len(buckets) is the +Inf overflow
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        for key, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                yield '_bucket', _labels(self.labelnames, key, f'le="{_number(bound)}"'), cumulative
+            yield '_sum', _labels(self.labelnames, key), state[-2]
+            yield '_count', _labels(self.labelnames, key), state[-1]
+
+
+class MetricsRegistry:
+    """The metric families of this process, rendered in the Prometheus text format.
+
+    Every worker process keeps its own registry, so under gunicorn each scrape
+    sees the worker that answered it; scrape workers individually (or run one
+    worker per port) to aggregate them.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = (), source=None) -> Counter:
+        return self.register(Counter(name, help_text, labelnames, source))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = (), source=None) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames, source))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+STAGE_SECONDS = registry.histogram(
+    'stage_duration_seconds', 'Time spent in instrumented processing stages', ('stage',)
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time the enclosed block as one observation of stage_duration_seconds{stage=name}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+
+def timed_chunks(name: str, chunks: Iterable) -> Iterator:
+    """Yield from chunks, timing the production of each one as a stage (for streamed bodies)"""
+    iterator = iter(chunks)
+    while True:
+        start = time.perf_counter()
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+        yield chunk
+
+
+def _greenlet_threads() -> bool:
+    """Whether gevent has patched threading, making get_ident() a greenlet id rather than an OS thread's"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+class SamplingProfiler:
+    """Opt-in stack sampler for single requests.
+
+    A sampled request gets a helper thread that reads the request thread's
+    current frame every `interval` seconds. If the request turns out slower
+    than `slow_seconds`, its stacks are kept in collapsed form (one
+    'outer;inner;leaf count' line per distinct stack, the input flame graph
+    tools take); faster requests are dropped. Only `keep` profiles are kept.
+
+    Works with sync and threaded workers only. Under gevent's monkey-patching
+    (the gevent gunicorn worker) requests are greenlets sharing one OS thread,
+    whose frames the sampler can't tell apart, so the profiler switches itself
+    off on the first sampled request and logs why.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, slow_seconds: float = 0.5, interval: float = 0.005,
+                 keep: int = 20, max_depth: int = 64):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self.interval = interval
+        self.max_depth = max_depth
+        self.profiles: 'deque[Dict]' = deque(maxlen=keep)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start(self) -> Optional[Tuple[threading.Event, StackCounter, threading.Thread]]:
+        """Start sampling the calling thread, for a sample_rate fraction of calls; returns the handle for finish()"""
+        if not self.enabled or random.random() >= self.sample_rate:
+            return None
+        if _greenlet_threads():
+            logger.warning('Request profiling disabled: gevent has monkey-patched threading, so requests are greenlets '
+                           'the stack sampler cannot see; run a sync or gthread worker to profile')
+            self.sample_rate = 0.0
+            return None
+        target = threading.get_ident()
+        stop = threading.Event()
+        stacks: StackCounter = StackCounter()
+
+        def sample():
+            while not stop.wait(self.interval):
+                frame = sys._current_frames().get(target)
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                if names:
+                    stacks[';'.join(reversed(names))] += 1
+
+        thread = threading.Thread(target=sample, name='profiler', daemon=True)
+        thread.start()
+        return stop, stacks, thread
+
+    def finish(self, handle, seconds: float, **details) -> Optional[Dict]:
+        """Stop sampling; keep and return the profile if the request was slow"""
+        if handle is None:
+            return None
+        stop, stacks, thread = handle
+        stop.set()
+        thread.join()
+        if seconds < self.slow_seconds:
+            return None
+        profile = {
+            **details,
+            'duration_ms': round(seconds * 1e3, 3),
+            'finished': time.time(),
+            'samples': sum(stacks.values()),
+            'stacks': '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common()),
+        }
+        self.profiles.append(profile)
+        return profile
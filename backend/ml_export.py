@@ -0,0 +1,125 @@
+import io
+from datetime import datetime
+from operator import attrgetter
+from typing import Callable, Iterator, List, Optional, Sequence
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV export works without it
+    pa = None
+    pq = None
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+
+
+def is_peak_hour(hour):
+    """Peak-hour flag (7-10 and 17-20); works on a single hour or a NumPy array of hours"""
+    return ((7 <= hour) & (hour <= 10)) | ((17 <= hour) & (hour <= 20))
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class MLDatasetExporter:
+    """Streams the ML dataset in fixed-size batches so memory stays flat.
+
+    Each batch becomes one DataFrame whose derived features are computed with
+    column operations; extra feature providers (callables taking the batch
+    frame and returning a dict of columns) can append more features per batch.
+    """
+
+    def __init__(self, field_names: Sequence[str], batch_size: int = 5000):
+        self.field_names = list(field_names)
+        self.batch_size = batch_size
+        self._row = attrgetter(*self.field_names)
+        self.feature_providers: List[Callable[[pd.DataFrame, datetime], dict]] = []
+
+    def batches(self, stations: Sequence, now: Optional[datetime] = None) -> Iterator[pd.DataFrame]:
+        now = now or datetime.now()
+        for start in range(0, len(stations), self.batch_size):
+            chunk = stations[start:start + self.batch_size]
+            frame = pd.DataFrame.from_records([self._row(station) for station in chunk], columns=self.field_names)
+            frame['timestamp'] = [datetime.fromtimestamp(ts).isoformat() for ts in frame['last_updated'].tolist()]
+            # Add derived features for ML
+            frame['utilization_rate'] = 1 - frame['available_slots'].to_numpy() / frame['total_slots'].to_numpy()
+            frame['is_peak_hours'] = bool(is_peak_hour(now.hour))
+            frame['day_of_week'] = now.weekday()
+            frame['hour_of_day'] = now.hour
+            for provider in self.feature_providers:
+                for name, column in provider(frame, now).items():
+                    frame[name] = column
+            yield frame
+
+    def stream_csv(self, stations: Sequence, now: Optional[datetime] = None) -> Iterator[bytes]:
+        header = True
+        for frame in self.batches(stations, now):
+            yield frame.to_csv(index=False, header=header).encode('utf-8')
+            header = False
+        if header:
+            # No stations at all: still send the column names
+            yield (','.join(self.field_names + ['timestamp', 'utilization_rate', 'is_peak_hours',
+                                                 'day_of_week', 'hour_of_day']) + '\n').encode('utf-8')
+
+    def stream_arrow(self, stations: Sequence, now: Optional[datetime] = None) -> Iterator[bytes]:
+        sink = _ChunkSink()
+        writer = None
+        for frame in self.batches(stations, now):
+            batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            yield sink.drain()
+        if writer is not None:
+            writer.close()
+        yield sink.drain()
+
+    def stream_parquet(self, stations: Sequence, now: Optional[datetime] = None) -> Iterator[bytes]:
+        sink = _ChunkSink()
+        writer = None
+        for frame in self.batches(stations, now):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            # One row group per batch, flushed to the client as soon as it is encoded
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is not None:
+            writer.close()
+        yield sink.drain()
+
+    def stream(self, export_format: str, stations: Sequence, now: Optional[datetime] = None) -> Iterator[bytes]:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format '{export_format}', expected one of {tuple(EXPORT_FORMATS)}")
+        if export_format != 'csv' and pa is None:
+            raise RuntimeError(f"The {export_format} export needs pyarrow, which is not installed")
+        return getattr(self, f'stream_{export_format}')(stations, now)
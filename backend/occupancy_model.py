@@ -0,0 +1,151 @@
+import argparse
+import math
+import time
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+import numpy as np
+
+WEEKDAYS = 7
+HOURS = 24
+
+
+def _local_hour_start(ts: float) -> float:
+    """Start of the local clock hour containing ts (handles half-hour UTC offsets such as IST)"""
+    moment = datetime.fromtimestamp(ts)
+    return moment.replace(minute=0, second=0, microsecond=0).timestamp()
+
+
+class OccupancyModel:
+    """Per-station hour-of-week profiles of how likely a station is to have a free slot.
+
+    Training folds hourly, time-weighted "any slot free" shares from the
+    availability history into a (station, weekday, hour) table with an
+    exponential moving average, so the same code trains offline over weeks of
+    segments or incrementally one finished hour at a time. Prediction is two
+    table lookups blended with the station's current state, which dominates for
+    short drives and fades out over `persistence_minutes`.
+    """
+
+    def __init__(self, persistence_minutes: float = 20.0, smoothing: float = 0.2):
+        self.persistence_minutes = persistence_minutes
+        self.smoothing = smoothing
+        self.free = np.full((0, WEEKDAYS, HOURS), np.nan, dtype=np.float32)
+        # Mean over all stations, for stations (or hours) the model has not seen yet
+        self.fallback = np.full((WEEKDAYS, HOURS), np.nan, dtype=np.float32)
+        self.trained_until: Optional[float] = None
+        self._rows: Dict[str, int] = {}
+
+    def _row(self, station_id: str) -> int:
+        row = self._rows.get(station_id)
+        if row is None:
+            row = len(self._rows)
+            if row >= len(self.free):
+                grown = np.full((max(16, 2 * len(self.free)), WEEKDAYS, HOURS), np.nan, dtype=np.float32)
+                grown[:len(self.free)] = self.free
+                self.free = grown
+            # Published only once the arrays hold the row, so a concurrent predict() never indexes past them
+            self._rows[station_id] = row
+        return row
+
+    # --- training --------------------------------------------------------
+
+    def fit(self, history, start: float, end: float):
+        """Fold each local hour from the one containing `start` up to, not including, the one containing `end`"""
+        start, end = _local_hour_start(start), _local_hour_start(end)
+        if end > start:
+            frame = history.downsample(start, end, 3600, metric='available')
+            # One hour at a time, so repeated weekday/hour cells average in time order
+            for bucket_start, hour in frame.groupby('bucket_start', sort=True):
+                moment = datetime.fromtimestamp(bucket_start)
+                rows = np.array([self._row(station_id) for station_id in hour['station_id']], dtype=np.intp)
+                observed = hour['available'].to_numpy(dtype=np.float32)
+                cells = self.free[rows, moment.weekday(), moment.hour]
+                self.free[rows, moment.weekday(), moment.hour] = np.where(
+                    np.isnan(cells), observed, cells + self.smoothing * (observed - cells)
+                )
+            with np.errstate(invalid='ignore'):
+                seen = ~np.isnan(self.free[:len(self._rows)])
+                totals = np.where(seen, self.free[:len(self._rows)], 0).sum(axis=0)
+                counts = seen.sum(axis=0)
+                self.fallback = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan).astype(np.float32)
+        self.trained_until = max(end, self.trained_until or end)
+
+    def update(self, history, now: Optional[float] = None) -> bool:
+        """Fold the hours finished since the last training; a no-op within the same hour"""
+        now = time.time() if now is None else now
+        current_hour = _local_hour_start(now)
+        if self.trained_until is None:
+            # Nothing to learn from before this process started recording
+            self.trained_until = current_hour
+            return False
+        if current_hour <= self.trained_until:
+            return False
+        self.fit(history, self.trained_until, current_hour)
+        return True
+
+    # --- prediction ------------------------------------------------------
+
+    def profile_probability(self, station_id: str, arrival: float) -> float:
+        """Learned chance of a free slot in the local hour of `arrival`, or NaN if unknown"""
+        moment = datetime.fromtimestamp(arrival)
+        row = self._rows.get(station_id)
+        value = self.free[row, moment.weekday(), moment.hour] if row is not None else np.nan
+        if np.isnan(value):
+            value = self.fallback[moment.weekday(), moment.hour]
+        return float(value)
+
+    def predict(self, station, eta_minutes: float, now: Optional[float] = None) -> float:
+        """Probability that `station` has a free slot `eta_minutes` from now"""
+        now = time.time() if now is None else now
+        current = 1.0 if station.available_slots > 0 else 0.0
+        learned = self.profile_probability(station.id, now + eta_minutes * 60)
+        if math.isnan(learned):
+            return current
+        weight = math.exp(-max(eta_minutes, 0.0) / self.persistence_minutes)
+        return weight * current + (1 - weight) * learned
+
+    def profile(self, station_id: str) -> Optional[np.ndarray]:
+        """The station's weekday x hour table (NaN where nothing was learned), or None if unknown"""
+        row = self._rows.get(station_id)
+        return None if row is None else self.free[row].copy()
+
+    # --- persistence -----------------------------------------------------
+
+    def save(self, path: str):
+        ids = np.array(sorted(self._rows, key=self._rows.get), dtype=str)
+        with open(path, 'wb') as handle:
+            np.savez_compressed(handle, ids=ids, free=self.free[:len(ids)], fallback=self.fallback,
+                                trained_until=np.float64(self.trained_until or np.nan))
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'OccupancyModel':
+        model = cls(**kwargs)
+        with np.load(path) as data:
+            model._rows = {station_id: row for row, station_id in enumerate(data['ids'].tolist())}
+            model.free = data['free'].astype(np.float32)
+            model.fallback = data['fallback'].astype(np.float32)
+            trained_until = float(data['trained_until'])
+            model.trained_until = None if math.isnan(trained_until) else trained_until
+        return model
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Train a model offline from a HISTORY_DIR and write it for OCCUPANCY_MODEL_PATH"""
+    from availability_history import AvailabilityHistory
+
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('history_dir')
+    parser.add_argument('output')
+    parser.add_argument('--days', type=float, default=28, help='how much history to train on')
+    args = parser.parse_args(argv)
+
+    history = AvailabilityHistory(args.history_dir, capacity=1)
+    end = time.time()
+    model = OccupancyModel()
+    model.fit(history, end - args.days * 86400, end)
+    model.save(args.output)
+    print(f'Trained {len(model._rows)} stations up to {datetime.fromtimestamp(model.trained_until).isoformat()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import math
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple
+import numpy as np
+from distance_engine import SPHERE_ERROR, haversine_km
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash_cell(lat: float, lng: float, precision: int) -> Tuple[int, int]:
+    """(row, column) of the geohash cell of that length holding (lat, lng).
+
+    A geohash interleaves the bits of these two indices; keeping them apart
+    names the same cells without the bit shuffling. Raises ValueError for
+    coordinates off the globe (NaN and infinities included).
+    """
+    if not (-90 <= lat <= 90) or not (-180 <= lng <= 180):
+        raise ValueError(f'Coordinates out of range: ({lat}, {lng})')
+    bits = 5 * precision
+    lat_cells, lng_cells = 1 << (bits // 2), 1 << ((bits + 1) // 2)
+    return (min(int((lat + 90) / 180 * lat_cells), lat_cells - 1),
+            min(int((lng + 180) / 360 * lng_cells), lng_cells - 1))
+
+
+def geohash(cell: Tuple[int, int], precision: int) -> str:
+    """The geohash string of a geohash_cell"""
+    bits = 5 * precision
+    lat_bits, lng_bits = bits // 2, (bits + 1) // 2
+    row, col = cell
+    code = 0
+    # Bits alternate longitude, latitude, longitude, ... from the most significant one
+    for i in range(bits):
+        if i % 2 == 0:
+            code = (code << 1) | ((col >> (lng_bits - 1 - i // 2)) & 1)
+        else:
+            code = (code << 1) | ((row >> (lat_bits - 1 - i // 2)) & 1)
+    return ''.join(GEOHASH_ALPHABET[(code >> shift) & 31] for shift in range(bits - 5, -1, -5))
+
+
+def cell_geometry(cell: Tuple[int, int], precision: int) -> Tuple[Tuple[float, float], float]:
+    """Center of a geohash_cell and the farthest any point in it can be from the center, in km"""
+    bits = 5 * precision
+    lat_size, lng_size = 180 / (1 << (bits // 2)), 360 / (1 << ((bits + 1) // 2))
+    south, west = cell[0] * lat_size - 90, cell[1] * lng_size - 180
+    center = (south + lat_size / 2, west + lng_size / 2)
+    corners = [haversine_km(*center, corner_lat, corner_lng)
+               for corner_lat in (south, south + lat_size) for corner_lng in (west, west + lng_size)]
+    # The sphere can underestimate the geodesic; pad for it and for rounding
+    return center, max(corners) * (1 + SPHERE_ERROR) * 1.01
+
+
+class NearbyQueryCache:
+    """Per-cell candidate sets for distance queries, plus formatted station records.
+
+    Users in the same neighbourhood snap to the same geohash cell. The first
+    query from a cell gathers, around the cell center, every station any
+    point in the cell could need; later queries from the cell skip the grid
+    walk and only refine distances over that set. Candidate sets are pure
+    geometry: availability is applied per query from the snapshot, so status
+    updates keep them valid and only a layout change (stations added, removed
+    or moved) drops them. Formatted records are cached per station and
+    replaced precisely when that station's record changes.
+
+    Entries are bounded by count and by the total number of positions held;
+    the least recently used ones go first.
+    """
+
+    def __init__(self, store, precision: int = 6, max_entries: int = 4096, max_positions: int = 2_000_000,
+                 nearest_candidates: int = 64):
+        self.precision = precision
+        self.max_entries = max_entries
+        self.max_positions = max_positions
+        # Stations kept around a cell center for nearest-station queries, before availability
+        self.nearest_candidates = nearest_candidates
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[np.ndarray, float]]' = OrderedDict()
+        self._positions = 0
+        self._layout_version = store.snapshot().layout_version
+        self._records: Dict[str, Tuple[object, Dict]] = {}
+        self.hits = 0
+        self.misses = 0
+        # Cached nearest-station sets that could not prove their answer (e.g. nothing free nearby)
+        self.fallbacks = 0
+        store.subscribe(self.on_publish)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def on_publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: a new layout drops every cell, a status change only the changed records"""
+        if changed is None or snapshot.layout_version != self._layout_version:
+            with self._lock:
+                self._layout_version = max(self._layout_version, snapshot.layout_version)
+                self._entries.clear()
+                self._positions = 0
+            self._records = {
+                station_id: entry for station_id, entry in self._records.items() if station_id in snapshot.positions
+            }
+            return
+        records = self._records
+        for station_id in changed:
+            records.pop(station_id, None)
+
+    def _get(self, key: Hashable) -> Optional[Tuple[np.ndarray, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry
+
+    def _put(self, snapshot, key: Hashable, entry: Tuple[np.ndarray, float]):
+        with self._lock:
+            # Built from a snapshot an update has since replaced; its key can never be asked for again
+            if snapshot.layout_version != self._layout_version or len(entry[0]) > self.max_positions:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._positions -= len(previous[0])
+            self._entries[key] = entry
+            self._positions += len(entry[0])
+            while len(self._entries) > self.max_entries or self._positions > self.max_positions:
+                _, evicted = self._entries.popitem(last=False)
+                self._positions -= len(evicted[0])
+
+    @staticmethod
+    def _around(snapshot, lat: float, lng: float, reach_km: float) -> np.ndarray:
+        """Sorted positions of every station within reach_km of (lat, lng)"""
+        index = snapshot.index
+        if not math.isfinite(reach_km):
+            return np.arange(len(snapshot.stations), dtype=np.intp)
+        positions = index.candidates(lat, lng, reach_km)
+        if len(positions):
+            positions = positions[index.engine.approximate(lat, lng, positions) <= reach_km * (1 + index.engine.error_bound)]
+        return np.sort(positions)
+
+    def within(self, snapshot, lat: float, lng: float, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as snapshot.index.within(lat, lng, radius_km), from the cell's candidate set"""
+        key = ('within', snapshot.layout_version, geohash_cell(lat, lng, self.precision), radius_km)
+        entry = self._get(key)
+        if entry is None:
+            center, half_diagonal_km = cell_geometry(key[2], self.precision)
+            entry = (self._around(snapshot, *center, radius_km + half_diagonal_km), radius_km)
+            self._put(snapshot, key, entry)
+        return snapshot.index.engine.within(lat, lng, radius_km, positions=entry[0])
+
+    def nearest(self, snapshot, lat: float, lng: float, k: int = 1, max_distance_km: float = float('inf'),
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Same as snapshot.index.nearest(...), from the cell's candidate set when it provably holds the answer.
+
+        The set covers every station within `safe_km` of any point in the
+        cell. Once the k-th station found is within safe_km (or the search
+        radius itself is) no station outside the set can beat it; otherwise
+        the query goes to the full index.
+        """
+        key = ('nearest', snapshot.layout_version, geohash_cell(lat, lng, self.precision), max_distance_km, k)
+        entry = self._get(key)
+        if entry is None:
+            # Any point in the cell is within half_diagonal_km of the center, so a station within d of
+            # the point is within d + half_diagonal_km of the center
+            center, half_diagonal_km = cell_geometry(key[2], self.precision)
+            safe_km = max_distance_km
+            # At least nearest_candidates stations lie within d + half_diagonal_km of any point in the cell
+            _, distances = snapshot.index.nearest(*center, k=max(self.nearest_candidates, k))
+            if len(distances) == max(self.nearest_candidates, k):
+                safe_km = min(safe_km, float(distances[-1]) + half_diagonal_km)
+            entry = (self._around(snapshot, *center, safe_km + half_diagonal_km), safe_km)
+            self._put(snapshot, key, entry)
+        positions, safe_km = entry
+        if mask is not None:
+            positions = positions[mask[positions]]
+        found, distances = snapshot.index.engine.nearest(lat, lng, k, max_distance_km, positions=positions)
+        if max_distance_km <= safe_km or (len(found) == k and distances[-1] <= safe_km):
+            return found, distances
+        with self._lock:
+            self.fallbacks += 1
+        return snapshot.index.nearest(lat, lng, k, max_distance_km, mask)
+
+    def record(self, station, build: Callable[[object], Dict]) -> Dict:
+        """The formatted record for station (built once per station version); callers get their own copy"""
+        entry = self._records.get(station.id)
+        if entry is None or entry[0] is not station:
+            entry = (station, build(station))
+            self._records[station.id] = entry
+        return dict(entry[1])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'positions': self._positions,
+                'records': len(self._records),
+                'hits': self.hits,
+                'misses': self.misses,
+                'fallbacks': self.fallbacks,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
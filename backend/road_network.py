@@ -0,0 +1,294 @@
+import argparse
+import heapq
+import math
+import threading
+import xml.etree.ElementTree as ElementTree
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from distance_engine import DistanceEngine, haversine_km
+from metrics import stage
+from spatial_index import StationSpatialIndex
+
+# Free-flow speeds by OSM highway class, used when a way has no usable maxspeed tag
+HIGHWAY_SPEEDS_KMH = {
+    'motorway': 100, 'motorway_link': 60,
+    'trunk': 80, 'trunk_link': 50,
+    'primary': 60, 'primary_link': 45,
+    'secondary': 50, 'secondary_link': 40,
+    'tertiary': 40, 'tertiary_link': 35,
+    'unclassified': 30, 'road': 30,
+    'residential': 25, 'service': 15, 'living_street': 10,
+}
+# Between a point and the graph node it snaps to (car parks, lanes too small to be mapped)
+ACCESS_SPEED_KMH = 20
+# Beyond this the point is not really on the network and the straight-line estimate is used instead
+MAX_SNAP_KM = 5.0
+# A route slower on average than this over the straight-line distance counts as unreachable; bounds every search
+MIN_ROUTE_SPEED_KMH = 10
+
+
+def _speed(tags: Dict[str, str]) -> float:
+    """Speed in km/h: the way's maxspeed, or the highway class default when it is missing or unusable"""
+    speed = HIGHWAY_SPEEDS_KMH[tags['highway']]
+    maxspeed = tags.get('maxspeed', '').strip()
+    try:
+        if maxspeed.endswith('mph'):
+            value = float(maxspeed[:-3]) * 1.609
+        else:
+            value = float(maxspeed) if maxspeed else speed
+    except ValueError:
+        return speed
+    # "0", negative or NaN limits would make travel times infinite or negative
+    return value if 0 < value < float('inf') else speed
+
+
+class RoadGraph:
+    """Directed road graph in compressed sparse row form.
+
+    The edges leaving node i are indices[indptr[i]:indptr[i + 1]], with their
+    travel times in seconds at the same offsets of `seconds`. Node coordinates
+    sit in a grid index so points snap to the network without a scan, and
+    every node carries the label of its (weakly) connected component, so
+    targets on another island are known unreachable without a search.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, seconds: np.ndarray):
+        self.latitudes = np.ascontiguousarray(latitudes, dtype=np.float64)
+        self.longitudes = np.ascontiguousarray(longitudes, dtype=np.float64)
+        self.indptr = np.ascontiguousarray(indptr, dtype=np.int64)
+        self.indices = np.ascontiguousarray(indices, dtype=np.int32)
+        self.seconds = np.ascontiguousarray(seconds, dtype=np.float32)
+        self.nodes = StationSpatialIndex(DistanceEngine(self.latitudes, self.longitudes, 'haversine'), cell_km=0.5)
+        # Plain lists are several times faster than NumPy scalars inside the Dijkstra loop
+        self._indptr = self.indptr.tolist()
+        self._indices = self.indices.tolist()
+        self._seconds = self.seconds.tolist()
+        self.components = self._components()
+
+    def _components(self) -> np.ndarray:
+        """Component label per node, ignoring edge direction (breadth-first over both directions)"""
+        count = len(self.latitudes)
+        sources = np.repeat(np.arange(count, dtype=np.int64), np.diff(self.indptr))
+        ends = np.concatenate([sources, self.indices])
+        starts = np.concatenate([self.indices, sources])
+        order = np.argsort(starts, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(starts, minlength=count))]).tolist()
+        neighbours = ends[order].tolist()
+        labels = [-1] * count
+        for root in range(count):
+            if labels[root] >= 0:
+                continue
+            labels[root] = root
+            queue = [root]
+            for node in queue:
+                for neighbour in neighbours[indptr[node]:indptr[node + 1]]:
+                    if labels[neighbour] < 0:
+                        labels[neighbour] = root
+                        queue.append(neighbour)
+        return np.array(labels, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    @classmethod
+    def from_edges(cls, latitudes: Sequence[float], longitudes: Sequence[float], sources: Sequence[int],
+                   targets: Sequence[int], seconds: Sequence[float]) -> 'RoadGraph':
+        sources = np.asarray(sources, dtype=np.int64)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(latitudes))
+        indptr = np.concatenate([[0], np.cumsum(counts)])
+        return cls(latitudes, longitudes, indptr, np.asarray(targets)[order], np.asarray(seconds)[order])
+
+    @classmethod
+    def from_osm(cls, path: str) -> 'RoadGraph':
+        """Build the drivable graph from an OSM XML extract (.osm)"""
+        coordinates: Dict[str, Tuple[float, float]] = {}
+        ways: List[Tuple[List[str], float, str]] = []
+        for _, element in ElementTree.iterparse(path, events=('end',)):
+            if element.tag == 'node':
+                coordinates[element.get('id')] = (float(element.get('lat')), float(element.get('lon')))
+                element.clear()
+            elif element.tag == 'way':
+                tags = {tag.get('k'): tag.get('v') for tag in element.iter('tag')}
+                if tags.get('highway') in HIGHWAY_SPEEDS_KMH and tags.get('access') not in ('no', 'private'):
+                    refs = [nd.get('ref') for nd in element.iter('nd')]
+                    oneway = tags.get('oneway', 'no')
+                    if tags['highway'] in ('motorway', 'motorway_link') and oneway == 'no':
+                        oneway = 'yes'
+                    ways.append((refs, _speed(tags), oneway))
+                element.clear()
+
+        # Only nodes that lie on a routable way become graph nodes
+        node_ids: Dict[str, int] = {}
+        sources, targets, seconds = [], [], []
+        for refs, speed_kmh, oneway in ways:
+            refs = [ref for ref in refs if ref in coordinates]
+            if oneway == '-1':
+                refs.reverse()
+            for a, b in zip(refs, refs[1:]):
+                u = node_ids.setdefault(a, len(node_ids))
+                v = node_ids.setdefault(b, len(node_ids))
+                travel = haversine_km(*coordinates[a], *coordinates[b]) / speed_kmh * 3600
+                sources.append(u)
+                targets.append(v)
+                seconds.append(travel)
+                if oneway not in ('yes', 'true', '1', '-1'):
+                    sources.append(v)
+                    targets.append(u)
+                    seconds.append(travel)
+        latitudes = np.empty(len(node_ids))
+        longitudes = np.empty(len(node_ids))
+        for ref, node in node_ids.items():
+            latitudes[node], longitudes[node] = coordinates[ref]
+        return cls.from_edges(latitudes, longitudes, sources, targets, seconds)
+
+    @classmethod
+    def load(cls, path: str) -> 'RoadGraph':
+        """Load a graph saved with save(), or parse an OSM XML extract"""
+        if not path.endswith('.npz'):
+            return cls.from_osm(path)
+        with np.load(path) as data:
+            return cls(data['latitudes'], data['longitudes'], data['indptr'], data['indices'], data['seconds'])
+
+    def save(self, path: str):
+        with open(path, 'wb') as handle:
+            np.savez_compressed(handle, latitudes=self.latitudes, longitudes=self.longitudes,
+                                indptr=self.indptr, indices=self.indices, seconds=self.seconds)
+
+    def snap(self, lat: float, lng: float) -> Tuple[int, float]:
+        """(node, km to it) for the closest graph node, or (-1, inf) if none is within MAX_SNAP_KM"""
+        found, distances = self.nodes.nearest(lat, lng, k=1, max_distance_km=MAX_SNAP_KM)
+        if not len(found):
+            return -1, math.inf
+        return int(found[0]), float(distances[0])
+
+    def shortest_seconds(self, source: int, targets: Sequence[int]) -> Dict[int, float]:
+        """Travel seconds from source to each reachable target.
+
+        Targets on another component are dropped up front. The search stops
+        once every target is settled, or once it has gone further than the
+        farthest target could take at MIN_ROUTE_SPEED_KMH, so one target the
+        roads don't really lead to can't make it walk the whole graph.
+        """
+        indptr, indices, seconds = self._indptr, self._indices, self._seconds
+        targets = np.fromiter(set(targets), dtype=np.int64)
+        targets = targets[self.components[targets] == self.components[source]]
+        remaining = set(targets.tolist())
+        found: Dict[int, float] = {}
+        if not remaining:
+            return found
+        straight_km = self.nodes.engine.approximate(self.latitudes[source], self.longitudes[source], targets)
+        cutoff = float(straight_km.max()) / MIN_ROUTE_SPEED_KMH * 3600
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        while heap and remaining:
+            time_s, node = heapq.heappop(heap)
+            if time_s > cutoff:
+                break
+            if time_s > best[node]:
+                continue
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = time_s
+            for edge in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[edge]
+                candidate = time_s + seconds[edge]
+                if candidate < best.get(neighbour, math.inf):
+                    best[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        return found
+
+
+class DriveTimeEngine:
+    """Road drive times from a user location to stations, with cached one-to-many results.
+
+    Station nodes are snapped lazily once per station layout. Users snap to
+    their nearest road node, and the per-node results are kept in an LRU, so
+    every user starting from the same junction (and every repeat query) reuses
+    one multi-target Dijkstra run; new targets only extend that entry.
+    """
+
+    def __init__(self, graph: RoadGraph, cache_entries: int = 4096):
+        self.graph = graph
+        self.cache_entries = cache_entries
+        self._lock = threading.Lock()
+        self._cache: 'OrderedDict[int, Dict[int, float]]' = OrderedDict()
+        self._layout_version = None
+        self._station_nodes = np.empty(0, dtype=np.int64)
+        self._station_access_km = np.empty(0)
+        self.hits = 0
+        self.misses = 0
+
+    def _stations(self, snapshot, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if self._layout_version != snapshot.layout_version:
+                self._layout_version = snapshot.layout_version
+                self._station_nodes = np.full(len(snapshot.stations), -2, dtype=np.int64)  # -2: not snapped yet
+                self._station_access_km = np.full(len(snapshot.stations), math.inf)
+            nodes, access_km = self._station_nodes, self._station_access_km
+        for pos in positions[nodes[positions] == -2].tolist():
+            station = snapshot.stations[pos]
+            nodes[pos], access_km[pos] = self.graph.snap(station.latitude, station.longitude)
+        return nodes[positions], access_km[positions]
+
+    def _seconds_from(self, source: int, targets: Sequence[int]) -> Dict[int, float]:
+        with self._lock:
+            known = self._cache.get(source)
+            if known is not None:
+                self._cache.move_to_end(source)
+                missing = [target for target in targets if target not in known]
+                if not missing:
+                    self.hits += 1
+                    return known
+            else:
+                missing = list(targets)
+            self.misses += 1
+        with stage('road_routing'):
+            found = self.graph.shortest_seconds(source, missing)
+        # Unreachable targets are remembered too, so they don't trigger another search
+        found.update((target, math.inf) for target in missing if target not in found)
+        with self._lock:
+            entry = self._cache.setdefault(source, {})
+            entry.update(found)
+            self._cache.move_to_end(source)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+            return entry
+
+    def minutes(self, snapshot, lat: float, lng: float, positions: np.ndarray) -> np.ndarray:
+        """Drive minutes to the stations at positions; NaN where the road network can't answer"""
+        positions = np.asarray(positions, dtype=np.intp)
+        result = np.full(len(positions), np.nan)
+        source, source_km = self.graph.snap(lat, lng)
+        if source < 0 or not len(positions):
+            return result
+        nodes, access_km = self._stations(snapshot, positions)
+        on_network = nodes >= 0
+        seconds = self._seconds_from(source, set(nodes[on_network].tolist()))
+        road_seconds = np.array([seconds.get(node, math.inf) for node in nodes[on_network].tolist()])
+        access_minutes = (source_km + access_km[on_network]) / ACCESS_SPEED_KMH * 60
+        minutes = road_seconds / 60 + access_minutes
+        result[on_network] = np.where(np.isfinite(minutes), minutes, np.nan)
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Convert an OSM XML extract into the compact graph file ROAD_GRAPH_PATH loads quickly"""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('extract', help='OSM XML extract (.osm)')
+    parser.add_argument('output', help='graph file to write (.npz)')
+    args = parser.parse_args(argv)
+
+    graph = RoadGraph.from_osm(args.extract)
+    graph.save(args.output)
+    print(f'{len(graph)} nodes, {len(graph.indices)} directed edges -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
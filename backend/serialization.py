@@ -0,0 +1,145 @@
+import json
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is the fallback
+    orjson = None
+
+JSON_BACKENDS = ('auto', 'orjson', 'stdlib')
+# Layouts a station list can be sent in: one object per station, or one array per field
+LIST_FORMATS = ('records', 'columns')
+
+
+def list_format(value: Optional[str]) -> str:
+    """Validate a ?format= value for station lists (records by default)"""
+    if value is None or value == '':
+        return 'records'
+    if value not in LIST_FORMATS:
+        raise ValueError(f"Unknown list format '{value}', expected one of {LIST_FORMATS}")
+    return value
+
+
+def record_columns(records: Sequence, names: Sequence[str]) -> Dict[str, List]:
+    """One list per attribute of `records` (objects with those attributes), for an array-of-columns payload"""
+    return {name: list(map(attrgetter(name), records)) for name in names}
+
+
+def dict_columns(records: Sequence[Dict]) -> Dict[str, List]:
+    """One list per key of `records` (dicts sharing their keys); keys missing from a record come out as null"""
+    names = dict.fromkeys(name for record in records for name in record)
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+class JsonCodec:
+    """Compact JSON bytes from orjson when it is installed (or forced), else from the json module.
+
+    orjson writes the same documents several times faster and reads
+    dataclass slots directly, so a station record is encoded without first
+    becoming a dict. The two differ only in spelling numbers and in NaN,
+    which orjson writes as null.
+    """
+
+    def __init__(self, backend: str = 'auto'):
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON backend '{backend}', expected one of {JSON_BACKENDS}")
+        if backend == 'orjson' and orjson is None:
+            raise RuntimeError('JSON_BACKEND=orjson needs orjson, which is not installed')
+        self.orjson = orjson if backend != 'stdlib' else None
+
+    @property
+    def backend(self) -> str:
+        return 'orjson' if self.orjson is not None else 'stdlib'
+
+    def dumps(self, obj, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+        if self.orjson is not None:
+            option = self.orjson.OPT_NON_STR_KEYS | self.orjson.OPT_SERIALIZE_NUMPY
+            if sort_keys:
+                option |= self.orjson.OPT_SORT_KEYS
+            return self.orjson.dumps(obj, default=default, option=option)
+        return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, default=default).encode('utf-8')
+
+    def loads(self, data):
+        return self.orjson.loads(data) if self.orjson is not None else json.loads(data)
+
+    def station(self, station) -> bytes:
+        """A station as station.to_dict() would encode: its fields, then the derived timestamp"""
+        if self.orjson is None:
+            return self.dumps(station.to_dict())
+        # The record itself carries every field; only the derived timestamp is appended
+        return b'%s,"timestamp":"%s"}' % (self.orjson.dumps(station)[:-1], station.timestamp.encode('ascii'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes jsonify() responses and parses request bodies with a JsonCodec.
+
+    Output matches the default provider (sorted keys, compact unless
+    debugging, dates and dataclasses converted the same way); with the
+    standard-library codec it simply is the default provider.
+    """
+
+    def __init__(self, app, codec: JsonCodec):
+        super().__init__(app)
+        self.codec = codec
+
+    def loads(self, s, **kwargs):
+        if self.codec.orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return self.codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        codec = self.codec
+        if codec.orjson is None or (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # Left to self.default, like the default provider: http-date datetimes, dataclasses via asdict()
+        option = (codec.orjson.OPT_NON_STR_KEYS | codec.orjson.OPT_SERIALIZE_NUMPY | codec.orjson.OPT_APPEND_NEWLINE
+                  | codec.orjson.OPT_PASSTHROUGH_DATETIME | codec.orjson.OPT_PASSTHROUGH_DATACLASS)
+        if self.sort_keys:
+            option |= codec.orjson.OPT_SORT_KEYS
+        return self._app.response_class(codec.orjson.dumps(obj, default=self.default, option=option),
+                                        mimetype=self.mimetype)
+
+
+class StationJsonCache:
+    """Pre-serialized JSON bytes per station.
+
+    Stations are immutable, so a cached entry stays valid for as long as the
+    snapshot still holds the very same object; any change replaces the object
+    and the next lookup re-encodes just that one station.
+    """
+
+    def __init__(self, codec: Optional[JsonCodec] = None):
+        self.codec = codec or JsonCodec()
+        self._entries: Dict[str, Tuple[object, bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, station) -> bytes:
+        entry = self._entries.get(station.id)
+        if entry is not None and entry[0] is station:
+            return entry[1]
+        data = self.codec.station(station)
+        self._entries[station.id] = (station, data)
+        return data
+
+    def encode_list(self, stations: Iterable, extra: Optional[Callable[[object], bytes]] = None) -> bytes:
+        """JSON array of stations, assembled from the cached bytes.
+
+        extra(station) may return more members (',"key":value...') to splice
+        into each object, so derived fields never force a station back into
+        a dict.
+        """
+        if extra is None:
+            return b'[' + b','.join(self.get(station) for station in stations) + b']'
+        return b'[' + b','.join(self.get(station)[:-1] + extra(station) + b'}' for station in stations) + b']'
+
+    def on_publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: forget stations that were removed by a full replace"""
+        if changed is None:
+            self._entries = {
+                station_id: entry for station_id, entry in self._entries.items() if station_id in snapshot.positions
+            }
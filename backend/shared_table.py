@@ -0,0 +1,261 @@
+import dataclasses
+import os
+import secrets
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Optional, Sequence, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; shared mode is POSIX-only
+    fcntl = None
+
+MAGIC = b'EVSTATN1'
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S8'),
+    ('format', '<u4'),
+    ('retired', '<u4'),
+    ('seq', '<u8'),
+    ('version', '<u8'),
+    ('layout_version', '<u8'),
+    ('count', '<u8'),
+    ('capacity', '<u8'),
+    ('epoch', '<u8'),
+])
+DEFAULT_STRING_WIDTH = 64
+STRING_WIDTHS = {'id': 16, 'name': 96, 'address': 96, 'connector_type': 16, 'operator': 32}
+FIELD_TYPES = {bool: '?', int: '<i8', float: '<f8'}
+# Changing any of these is a layout change and goes through a full reload
+KEY_FIELDS = ('id', 'latitude', 'longitude')
+
+
+def record_dtype(station_type, string_widths: Optional[Dict[str, int]] = None) -> np.dtype:
+    """Fixed-width record layout for a station dataclass; strings are stored as UTF-8 bytes"""
+    widths = dict(STRING_WIDTHS, **(string_widths or {}))
+    columns = []
+    for field in dataclasses.fields(station_type):
+        if field.type is str:
+            columns.append((field.name, f'S{widths.get(field.name, DEFAULT_STRING_WIDTH)}'))
+        else:
+            kind = FIELD_TYPES.get(field.type)
+            if kind is None:
+                raise TypeError(f"Field '{field.name}' of type {field.type} cannot be stored in the shared table")
+            columns.append((field.name, kind))
+    return np.dtype(columns)
+
+
+class SharedStationTable:
+    """Station table shared by every worker process through a memory-mapped file.
+
+    Exactly one process (whoever holds an flock on `<path>.lock`) is the writer:
+    it mirrors every StationStore publish into fixed-width records. Other workers
+    map the same file read-only, check the header version on each read and only
+    copy the records out when it moved. A seqlock counter in the header makes
+    readers retry instead of seeing a half-written update. If the writer dies its
+    lock is released and the next worker to call try_acquire_writer takes over.
+    """
+
+    def __init__(self, path: str, station_type, string_widths: Optional[Dict[str, int]] = None):
+        if fcntl is None:
+            raise RuntimeError('Shared station state needs fcntl (POSIX)')
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.station_type = station_type
+        self.dtype = record_dtype(station_type, string_widths)
+        self.format = zlib.crc32(str(self.dtype.descr).encode())
+        self.is_writer = False
+        self._lock_file = None
+        self._map = None
+        self._header = None
+        self._records = None
+        self._layout_version = 0
+        self._synced = (None, None)
+        self._last_records = None
+        self._sync_lock = threading.Lock()
+
+    # --- file management -------------------------------------------------
+
+    def _try_lock(self) -> bool:
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _open(self, writable: bool) -> bool:
+        """Map the table file, returning False if it is missing or not in our format"""
+        try:
+            mapped = np.memmap(self.path, dtype=np.uint8, mode='r+' if writable else 'r')
+        except (FileNotFoundError, ValueError):
+            return False
+        if len(mapped) < HEADER_SIZE:
+            return False
+        header = mapped[:HEADER_SIZE].view(HEADER_DTYPE)
+        capacity = int(header['capacity'][0])
+        if header['magic'][0] != MAGIC or header['format'][0] != self.format:
+            return False
+        if len(mapped) < HEADER_SIZE + capacity * self.dtype.itemsize:
+            return False
+        self._map = mapped
+        self._header = header
+        self._records = mapped[HEADER_SIZE:HEADER_SIZE + capacity * self.dtype.itemsize].view(self.dtype)
+        return True
+
+    def _create(self, capacity: int, version: int, layout_version: int):
+        """Write a fresh, empty table next to the old one and atomically swap it in"""
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        size = HEADER_SIZE + capacity * self.dtype.itemsize
+        mapped = np.memmap(tmp_path, dtype=np.uint8, mode='w+', shape=(size,))
+        header = mapped[:HEADER_SIZE].view(HEADER_DTYPE)
+        header['magic'] = MAGIC
+        header['format'] = self.format
+        header['capacity'] = capacity
+        header['version'] = version
+        header['layout_version'] = layout_version
+        header['epoch'] = secrets.randbits(63)
+        mapped.flush()
+        del header, mapped
+        os.replace(tmp_path, self.path)
+        if self._header is not None:
+            # Tell readers still mapping the old file to reopen
+            self._header['retired'] = 1
+        self._open(writable=True)
+
+    @property
+    def lineage(self) -> Optional[str]:
+        """Random id of the current table file, shared by every worker mapping it"""
+        return None if self._header is None else f"{int(self._header['epoch'][0]):016x}"
+
+    # --- writer side -----------------------------------------------------
+
+    def _encode(self, station) -> Tuple:
+        row = []
+        for name in self.dtype.names:
+            value = getattr(station, name)
+            if isinstance(value, str):
+                value = value.encode('utf-8')
+                if len(value) > self.dtype[name].itemsize:
+                    raise ValueError(f"Station {station.id}: '{name}' is longer than {self.dtype[name].itemsize} bytes")
+            row.append(value)
+        return tuple(row)
+
+    def _on_publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: mirror one publish into the shared file"""
+        count = len(snapshot.stations)
+        if changed is None:
+            self._layout_version += 1
+            if self._header is None or count > int(self._header['capacity'][0]):
+                self._create(max(64, count * 2), snapshot.version, self._layout_version)
+            positions = range(count)
+        else:
+            positions = [snapshot.positions[station_id] for station_id in changed]
+        rows = [self._encode(snapshot.stations[pos]) for pos in positions]
+
+        header = self._header
+        header['seq'] += 1  # odd: write in progress
+        if changed is None:
+            if rows:
+                self._records[:count] = np.array(rows, dtype=self.dtype)
+            header['count'] = count
+            header['layout_version'] = self._layout_version
+        elif rows:
+            self._records[np.array(positions, dtype=np.intp)] = np.array(rows, dtype=self.dtype)
+        header['version'] = snapshot.version
+        header['seq'] += 1  # even: consistent again
+        self._synced = (int(header['layout_version'][0]), snapshot.version)
+
+    def try_acquire_writer(self, store) -> bool:
+        """Return True if this process is (or just became) the writer for the table"""
+        if self.is_writer:
+            return True
+        if not self._try_lock():
+            return False
+        # Adopt whatever the previous writer published before taking over
+        self._map = self._header = self._records = None
+        if self._open(writable=True):
+            self._synced = (None, None)
+            self.sync(store)
+            self._layout_version = int(self._header['layout_version'][0])
+        self.is_writer = True
+        store.subscribe(self._on_publish)
+        if (self._header is None or self._header['count'][0] == 0) and len(store.snapshot().stations):
+            store.replace_all(store.snapshot().stations)
+        return True
+
+    # --- reader side -----------------------------------------------------
+
+    def _decode(self, row) -> object:
+        values = {}
+        for name, value in zip(self.dtype.names, row.item()):
+            values[name] = value.decode('utf-8') if isinstance(value, bytes) else value
+        return self.station_type(**values)
+
+    def _read(self) -> Optional[Tuple[int, int, np.ndarray]]:
+        """Consistent (layout_version, version, records copy) or None if the writer is mid-update"""
+        header = self._header
+        for _ in range(100):
+            seq = int(header['seq'][0])
+            if seq % 2 == 0:
+                layout_version = int(header['layout_version'][0])
+                version = int(header['version'][0])
+                count = int(header['count'][0])
+                records = np.array(self._records[:count])
+                if int(header['seq'][0]) == seq:
+                    return layout_version, version, records
+            time.sleep(0)
+        return None
+
+    def sync(self, store) -> bool:
+        """Bring the local store up to the shared table's version; cheap when nothing changed"""
+        if self.is_writer:
+            return False
+        if self._header is None or self._header['retired'][0]:
+            if not self._open(writable=False):
+                return False
+        header = self._header
+        if (int(header['layout_version'][0]), int(header['version'][0])) == self._synced or header['count'][0] == 0:
+            return False
+        if not self._sync_lock.acquire(blocking=False):
+            return False  # another thread is already syncing
+        try:
+            state = self._read()
+            if state is None:
+                return False
+            layout_version, version, records = state
+            previous = self._last_records
+            if layout_version != self._synced[0] or previous is None or len(previous) != len(records):
+                store.replace_all([self._decode(row) for row in records], version=version)
+            else:
+                changed = np.flatnonzero(records != previous)
+                changes = {}
+                for pos in changed:
+                    station = self._decode(records[pos])
+                    changes[station.id] = {
+                        field: getattr(station, field) for field in self.dtype.names if field not in KEY_FIELDS
+                    }
+                store.update(changes, version=version)
+            self._last_records = records
+            self._synced = (layout_version, version)
+            return True
+        finally:
+            self._sync_lock.release()
+
+    def attach(self, store, generate: Callable[[], Sequence], timeout: float = 10.0):
+        """Join the shared table: the first process in generates the stations, the rest load them"""
+        if self.try_acquire_writer(store):
+            if not len(store.snapshot().stations):
+                store.replace_all(generate())
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.sync(store):
+                return
+            time.sleep(0.05)
+        # Writer never showed up; serve locally generated stations until it does
+        store.replace_all(generate())
@@ -0,0 +1,204 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from distance_engine import DistanceEngine
+
+# Shortest length of one degree of latitude on the ellipsoid (at the equator)
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG = 111.320
+EMPTY = (np.empty(0, dtype=np.intp), np.empty(0))
+
+
+class StationSpatialIndex:
+    """Uniform lat/lng grid over station positions.
+
+    Queries only visit the cells around the user and hand those candidates to
+    the DistanceEngine, which ranks them in one vectorized pass and, in exact
+    mode, runs the geodesic solve on the few that can still make the cut.
+    Columns wrap around the globe, so cells either side of the antimeridian
+    are neighbours.
+    """
+
+    def __init__(self, engine: DistanceEngine, cell_km: float = 2.0):
+        self.engine = engine
+        self.cell_km = cell_km
+        max_abs_lat = float(np.abs(engine.latitudes).max()) if len(engine) else 0.0
+        # Size longitude cells at the station nearest the pole so no cell is narrower than cell_km,
+        # then widen them slightly so a whole number of columns goes round the globe
+        self.lat_step = cell_km / KM_PER_DEGREE_LAT
+        lng_step = cell_km / (KM_PER_DEGREE_LNG * max(math.cos(math.radians(min(max_abs_lat, 89.0))), 0.01))
+        self.columns = max(1, int(360 // lng_step))
+        self.lng_step = 360 / self.columns
+        self.cells: Dict[Tuple[int, int], np.ndarray] = {}
+        # (min_row, max_row) and the arc of occupied columns as (first column, number of columns)
+        self.row_bounds = None
+        self.column_arc = None
+        if not len(engine):
+            return
+        # Same cells as _cell, assigned in one pass: sort positions by (row, col) and split at each new cell
+        rows = np.floor(engine.latitudes / self.lat_step).astype(np.int64)
+        cols = np.floor(engine.longitudes / self.lng_step).astype(np.int64) % self.columns
+        order = np.lexsort((cols, rows)).astype(np.intp)  # stable, so each cell lists its positions in order
+        rows, cols = rows[order], cols[order]
+        starts = np.flatnonzero(np.concatenate([[True], (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1])]))
+        self.cells = dict(zip(zip(rows[starts].tolist(), cols[starts].tolist()), np.split(order, starts[1:])))
+        self.row_bounds = (int(rows[0]), int(rows[-1]))
+        # The occupied columns span everything but the widest empty gap between them (wrapping included)
+        occupied = np.unique(cols)
+        gaps = np.diff(np.append(occupied, occupied[0] + self.columns))
+        widest = int(np.argmax(gaps))
+        first = int(occupied[(widest + 1) % len(occupied)])
+        self.column_arc = (first, self.columns - int(gaps[widest]) + 1)
+
+    @classmethod
+    def from_stations(cls, stations: Sequence, precision: str = 'exact', cell_km: float = 2.0) -> 'StationSpatialIndex':
+        return cls(DistanceEngine.from_stations(stations, precision), cell_km)
+
+    def __len__(self) -> int:
+        return len(self.engine)
+
+    @staticmethod
+    def _check(lat: float, lng: float):
+        if not (math.isfinite(lat) and math.isfinite(lng)):
+            raise ValueError(f'Coordinates must be finite numbers, got ({lat}, {lng})')
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        self._check(lat, lng)
+        return (math.floor(lat / self.lat_step), math.floor(lng / self.lng_step) % self.columns)
+
+    def _window(self, col_lo: int, col_hi: int) -> List[int]:
+        """Occupied-arc columns in the unwrapped column range col_lo..col_hi, each once"""
+        first, span = self.column_arc
+        if col_hi - col_lo + 1 >= self.columns:
+            return [(first + i) % self.columns for i in range(span)]
+        window = []
+        # The range is shorter than the globe, so it meets at most two copies of the arc
+        for copy in range(math.floor((col_lo - first - span + 1) / self.columns), math.floor((col_hi - first) / self.columns) + 1):
+            lo = max(col_lo, first + copy * self.columns)
+            hi = min(col_hi, first + copy * self.columns + span - 1)
+            window.extend(col % self.columns for col in range(lo, hi + 1))
+        return window
+
+    def _ring(self, center: Tuple[int, int], radius: int):
+        """Yield occupied cells at Chebyshev distance `radius` from center (columns measured round the globe)"""
+        row0, col0 = center
+        min_row, max_row = self.row_bounds
+        if radius == 0:
+            cell = self.cells.get(center)
+            if cell is not None:
+                yield cell
+            return
+        cols = self._window(col0 - radius, col0 + radius)
+        for row in (row0 - radius, row0 + radius):
+            if min_row <= row <= max_row:
+                for col in cols:
+                    cell = self.cells.get((row, col))
+                    if cell is not None:
+                        yield cell
+        # Past half way round, columns `radius` away were all reached by a smaller ring from the other side
+        if 2 * radius > self.columns:
+            return
+        first, span = self.column_arc
+        row_lo, row_hi = max(row0 - radius + 1, min_row), min(row0 + radius - 1, max_row)
+        for col in {(col0 - radius) % self.columns, (col0 + radius) % self.columns}:
+            if (col - first) % self.columns < span:
+                for row in range(row_lo, row_hi + 1):
+                    cell = self.cells.get((row, col))
+                    if cell is not None:
+                        yield cell
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        row0, col0 = center
+        min_row, max_row = self.row_bounds
+        first, span = self.column_arc
+        # Column offsets of the arc's ends from col0; the farthest column is half way round if the arc passes it
+        start = (first - col0) % self.columns
+        end = start + span - 1
+        half = self.columns // 2
+        if start <= half <= end or start <= half + self.columns <= end:
+            col_reach = half
+        else:
+            col_reach = max(min(offset % self.columns, -offset % self.columns) for offset in (start, end))
+        return max(abs(row0 - min_row), abs(row0 - max_row), col_reach)
+
+    @staticmethod
+    def _filter(positions: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+        return positions if mask is None else positions[mask[positions]]
+
+    def candidates(self, lat: float, lng: float, radius_km: float,
+                   mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Positions of stations in the grid cells covering radius_km, unsorted and not distance-checked.
+
+        mask is an optional boolean array over station positions; False entries are skipped.
+        """
+        self._check(lat, lng)
+        if math.isnan(radius_km):
+            raise ValueError('Radius must be a number')
+        if not self.cells:
+            return EMPTY[0]
+        search_km = radius_km * (1 + self.engine.error_bound)
+        # Past half way round the globe a window covers everything; capping keeps huge radii finite
+        lat_span = min(search_km / KM_PER_DEGREE_LAT, 180.0)
+        edge_lat = min(abs(lat) + lat_span, 89.0)
+        lng_span = min(search_km / (KM_PER_DEGREE_LNG * max(math.cos(math.radians(edge_lat)), 0.01)), 360.0)
+        min_row, max_row = self.row_bounds
+        row_lo = max(math.floor((lat - lat_span) / self.lat_step), min_row)
+        row_hi = min(math.floor((lat + lat_span) / self.lat_step), max_row)
+        cols = self._window(math.floor((lng - lng_span) / self.lng_step), math.floor((lng + lng_span) / self.lng_step))
+
+        if row_lo == min_row and row_hi == max_row and len(cols) == self.column_arc[1]:
+            # The search window covers the whole grid
+            positions = np.arange(len(self.engine), dtype=np.intp)
+            return positions if mask is None else np.flatnonzero(mask)
+        if (row_hi - row_lo + 1) * len(cols) > len(self.cells):
+            in_window = set(cols)
+            cells = [cell for key, cell in self.cells.items()
+                     if row_lo <= key[0] <= row_hi and key[1] in in_window]
+        else:
+            cells = [self.cells[(row, col)]
+                     for row in range(row_lo, row_hi + 1)
+                     for col in cols
+                     if (row, col) in self.cells]
+        if not cells:
+            return EMPTY[0]
+        return self._filter(np.concatenate(cells), mask)
+
+    def within(self, lat: float, lng: float, radius_km: float,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, distances_km) of stations within radius_km, sorted by distance"""
+        candidates = self.candidates(lat, lng, radius_km, mask)
+        if not len(candidates):
+            return EMPTY
+        return self.engine.within(lat, lng, radius_km, positions=candidates)
+
+    def nearest(self, lat: float, lng: float, k: int = 1, max_distance_km: float = float('inf'),
+                mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, distances_km) of up to k closest stations within max_distance_km, sorted by distance"""
+        if not self.cells or k <= 0:
+            return EMPTY
+        center = self._cell(lat, lng)
+        slack = self.engine.error_bound
+        # Distance covered by each completed ring, kept conservative for longitude convergence
+        ring_km = self.cell_km * 0.95
+        gathered: List[np.ndarray] = []
+        approx: List[np.ndarray] = []
+        count = 0
+        for radius in range(self._max_ring(center) + 1):
+            ring = list(self._ring(center, radius))
+            if ring:
+                positions = self._filter(np.concatenate(ring), mask)
+                if len(positions):
+                    gathered.append(positions)
+                    approx.append(self.engine.approximate(lat, lng, positions))
+                    count += len(positions)
+            # Anything not yet visited is at least this far away
+            unvisited_km = radius * ring_km
+            if unvisited_km > max_distance_km * (1 + slack):
+                break
+            if count >= k:
+                kth = np.partition(np.concatenate(approx), k - 1)[k - 1]
+                if kth * (1 + 2 * slack) <= unvisited_km:
+                    break
+        if not gathered:
+            return EMPTY
+        return self.engine.nearest(lat, lng, k, max_distance_km, positions=np.concatenate(gathered))
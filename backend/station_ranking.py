@@ -0,0 +1,229 @@
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Callable, Dict, Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+# Every criterion is scored so that lower is better
+CRITERIA = ('distance', 'price', 'power', 'availability', 'time_to_charge')
+DEFAULT_ENERGY_KWH = 30.0
+
+
+def _as_tuple(value, name: str) -> Tuple[str, ...]:
+    """Accept a list of strings, or one comma-separated string as query parameters carry it"""
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return tuple(part.strip() for part in value.split(',') if part.strip())
+    if isinstance(value, (list, tuple)) and all(isinstance(item, str) for item in value):
+        return tuple(value)
+    raise ValueError(f'{name} must be a string or a list of strings')
+
+
+def _parse_weights(value) -> Tuple[Tuple[str, float], ...]:
+    """Weights from a {criterion: weight} object or a 'criterion:weight,...' string"""
+    if isinstance(value, str):
+        pairs = []
+        for part in value.split(','):
+            name, _, weight = part.partition(':')
+            pairs.append((name.strip(), weight or 1))
+        value = dict(pairs)
+    if not isinstance(value, Mapping) or not value:
+        raise ValueError('weights must map criteria to numbers')
+    weights = []
+    for name, weight in value.items():
+        if name not in CRITERIA:
+            raise ValueError(f"Unknown ranking criterion '{name}', expected one of {CRITERIA}")
+        weight = float(weight)
+        if not weight >= 0:
+            raise ValueError('weights must be non-negative numbers')
+        weights.append((name, weight))
+    return tuple(weights)
+
+
+@dataclass(frozen=True)
+class RankingQuery:
+    """How to score stations, and which stations qualify at all"""
+    weights: Tuple[Tuple[str, float], ...] = (('distance', 1.0),)
+    connector_types: Tuple[str, ...] = ()
+    operators: Tuple[str, ...] = ()
+    min_power_kw: float = 0.0
+    only_available: bool = False
+    energy_kwh: float = DEFAULT_ENERGY_KWH
+
+    # Request keys that turn on ranking; anything else is left to the caller
+    PARAMETERS = ('weights', 'connector_type', 'connector_types', 'operator', 'operators', 'min_power_kw', 'energy_kwh')
+
+    @classmethod
+    def from_params(cls, params: Mapping, only_available: bool = False) -> Optional['RankingQuery']:
+        """Build a query from a JSON body or query string; None when no ranking parameter is present"""
+        if not any(key in params for key in cls.PARAMETERS):
+            return None
+        weights = _parse_weights(params['weights']) if 'weights' in params else cls.weights
+        min_power_kw = float(params.get('min_power_kw', 0))
+        energy_kwh = float(params.get('energy_kwh', DEFAULT_ENERGY_KWH))
+        if not energy_kwh > 0:
+            raise ValueError('energy_kwh must be a positive number')
+        return cls(
+            weights=weights,
+            connector_types=_as_tuple(params.get('connector_types', params.get('connector_type')), 'connector_type'),
+            operators=_as_tuple(params.get('operators', params.get('operator')), 'operator'),
+            min_power_kw=min_power_kw,
+            only_available=only_available,
+            energy_kwh=energy_kwh
+        )
+
+
+class StationColumns:
+    """The ranking attributes of one station set as NumPy columns.
+
+    Connector types and operators are stored as small integer codes so a filter
+    is one vectorized comparison instead of a string test per station.
+    """
+
+    def __init__(self, stations: Sequence, layout_version: int, vocabulary: Optional[Dict[str, int]] = None):
+        self.layout_version = layout_version
+        self.vocabulary = vocabulary if vocabulary is not None else {}
+        count = len(stations)
+        self.price = np.fromiter((s.price_per_kwh for s in stations), dtype=np.float64, count=count)
+        self.power = np.fromiter((s.power_kw for s in stations), dtype=np.float64, count=count)
+        self.available_slots = np.fromiter((s.available_slots for s in stations), dtype=np.float64, count=count)
+        self.total_slots = np.fromiter((s.total_slots for s in stations), dtype=np.float64, count=count)
+        self.connector = np.fromiter((self._code(s.connector_type) for s in stations), dtype=np.int32, count=count)
+        self.operator = np.fromiter((self._code(s.operator) for s in stations), dtype=np.int32, count=count)
+
+    def _code(self, value: str) -> int:
+        code = self.vocabulary.get(value)
+        if code is None:
+            code = self.vocabulary[value] = len(self.vocabulary)
+        return code
+
+    def patched(self, stations: Sequence, positions: Sequence[int]) -> 'StationColumns':
+        """Copy with the rows at positions re-read from stations; readers of this one are unaffected"""
+        columns = object.__new__(StationColumns)
+        columns.layout_version = self.layout_version
+        columns.vocabulary = self.vocabulary
+        for name in ('price', 'power', 'available_slots', 'total_slots', 'connector', 'operator'):
+            setattr(columns, name, getattr(self, name).copy())
+        positions = np.asarray(positions, dtype=np.intp)
+        rows = list(map(stations.__getitem__, positions.tolist()))
+        columns.price[positions] = list(map(attrgetter('price_per_kwh'), rows))
+        columns.power[positions] = list(map(attrgetter('power_kw'), rows))
+        columns.available_slots[positions] = list(map(attrgetter('available_slots'), rows))
+        columns.total_slots[positions] = list(map(attrgetter('total_slots'), rows))
+        columns.connector[positions] = [columns._code(station.connector_type) for station in rows]
+        columns.operator[positions] = [columns._code(station.operator) for station in rows]
+        return columns
+
+    def codes(self, values: Sequence[str]) -> np.ndarray:
+        # Values never seen can't match anything
+        return np.array([self.vocabulary.get(value, -1) for value in values], dtype=np.int32)
+
+    def mask(self, query: RankingQuery, available: np.ndarray) -> Optional[np.ndarray]:
+        """Boolean filter over station positions, or None if the query filters nothing"""
+        mask = None
+        if query.only_available:
+            mask = available.copy()
+        if query.connector_types:
+            mask = _and(mask, np.isin(self.connector, self.codes(query.connector_types)))
+        if query.operators:
+            mask = _and(mask, np.isin(self.operator, self.codes(query.operators)))
+        if query.min_power_kw > 0:
+            mask = _and(mask, self.power >= query.min_power_kw)
+        return mask
+
+
+def _and(mask: Optional[np.ndarray], condition: np.ndarray) -> np.ndarray:
+    return condition if mask is None else mask & condition
+
+
+def _spread(values: np.ndarray) -> np.ndarray:
+    """Min-max scale to [0, 1] across the candidates, so weights compare like with like"""
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+class StationRanker:
+    """Weighted multi-criteria ranking of stations around a location.
+
+    Candidates come from the spatial grid, already narrowed by the query's
+    filters; each criterion is scaled across them and combined with the query
+    weights in one vectorized pass. Only the k best are then selected with a
+    partial partition and ordered, so the cost of ordering stays O(k log k)
+    however many stations are in range. Scores use the cheap distances; the
+    geodesic is solved for the k results only.
+    """
+
+    def __init__(self, store, drive_minutes: Callable[..., np.ndarray]):
+        # drive_minutes(snapshot, lat, lng, positions, distances_km) -> minutes per position
+        self.drive_minutes = drive_minutes
+        self._columns = StationColumns(store.snapshot().stations, store.snapshot().layout_version)
+        store.subscribe(self.on_publish)
+
+    def on_publish(self, snapshot, changed: Optional[Tuple[str, ...]]):
+        """StationStore subscriber: rebuild on a full replace, otherwise patch the changed rows"""
+        columns = self._columns
+        if changed is None or columns.layout_version != snapshot.layout_version:
+            self._columns = StationColumns(snapshot.stations, snapshot.layout_version, dict(columns.vocabulary))
+        else:
+            self._columns = columns.patched(snapshot.stations, [snapshot.positions[i] for i in changed])
+
+    def columns(self, snapshot) -> StationColumns:
+        columns = self._columns
+        if columns.layout_version != snapshot.layout_version:
+            # The snapshot is from a different station set than the columns (a replace is in flight)
+            columns = StationColumns(snapshot.stations, snapshot.layout_version, dict(columns.vocabulary))
+        return columns
+
+    def score(self, snapshot, lat: float, lng: float, columns: StationColumns, positions: np.ndarray,
+              distances: np.ndarray, query: RankingQuery) -> np.ndarray:
+        scores = np.zeros(len(positions))
+        for name, weight in query.weights:
+            if not weight:
+                continue
+            if name == 'distance':
+                component = _spread(distances)
+            elif name == 'price':
+                component = _spread(columns.price[positions])
+            elif name == 'power':
+                component = 1 - _spread(columns.power[positions])
+            elif name == 'availability':
+                component = 1 - columns.available_slots[positions] / np.maximum(columns.total_slots[positions], 1)
+            else:
+                # Minutes on the road plus minutes on the charger for the requested energy
+                charge_minutes = query.energy_kwh / np.maximum(columns.power[positions], 0.1) * 60
+                component = _spread(self.drive_minutes(snapshot, lat, lng, positions, distances) + charge_minutes)
+            scores += weight * component
+        return scores
+
+    def rank(self, snapshot, lat: float, lng: float, radius_km: float, query: RankingQuery,
+             k: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(positions, distances_km, scores) of the k best-scoring stations within radius_km, best first"""
+        columns = self.columns(snapshot)
+        index = snapshot.index
+        engine = index.engine
+        positions = index.candidates(lat, lng, radius_km, columns.mask(query, snapshot.available))
+        distances = engine.approximate(lat, lng, positions)
+        keep = distances <= radius_km * (1 + engine.error_bound)
+        positions, distances = positions[keep], distances[keep]
+        if engine.precision == 'exact':
+            # Settle the slack band before scoring, so the top k (and the scaling) only see stations in range
+            band = np.flatnonzero(distances * (1 + engine.error_bound) > radius_km)
+            if len(band):
+                keep = np.ones(len(positions), dtype=bool)
+                keep[band] = engine.exact(lat, lng, positions[band]) <= radius_km
+                positions, distances = positions[keep], distances[keep]
+        if not len(positions):
+            return positions, distances, distances
+        scores = self.score(snapshot, lat, lng, columns, positions, distances, query)
+
+        if k is not None and k < len(positions):
+            best = np.argpartition(scores, k - 1)[:k]
+            positions, distances, scores = positions[best], distances[best], scores[best]
+        # Ties go to the closer station
+        order = np.lexsort((distances, scores))
+        positions, distances, scores = positions[order], distances[order], scores[order]
+        if engine.precision == 'exact':
+            distances = engine.exact(lat, lng, positions)
+        return positions, distances, scores
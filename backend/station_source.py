@@ -0,0 +1,293 @@
+import gc
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing, contextmanager
+from dataclasses import fields
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; CSV, GeoJSON and SQLite inventories work without it
+    pq = None
+
+REQUIRED_COLUMNS = ('id', 'latitude', 'longitude')
+# Common spellings in inventory exports -> station field
+COLUMN_ALIASES = {
+    'station_id': 'id', 'lat': 'latitude', 'lng': 'longitude', 'lon': 'longitude', 'long': 'longitude',
+    'title': 'name', 'connector': 'connector_type', 'power': 'power_kw', 'price': 'price_per_kwh',
+    'network': 'operator', 'slots': 'total_slots', 'available': 'is_available', 'updated_at': 'last_updated',
+}
+# Used when a column is missing or empty; missing names fall back to the station id
+DEFAULTS = {'address': '', 'connector_type': 'Type2', 'operator': '', 'power_kw': 7.4, 'price_per_kwh': 0.0,
+            'total_slots': 1}
+TRUE_STRINGS = ('1', 'true', 't', 'yes', 'y')
+FILE_SUFFIXES = {
+    '.csv': 'csv', '.gz': 'csv', '.geojson': 'geojson', '.json': 'geojson', '.parquet': 'parquet', '.pq': 'parquet',
+    '.db': 'sqlite', '.sqlite': 'sqlite', '.sqlite3': 'sqlite',
+}
+
+
+def _numbers(frame: pd.DataFrame, column: str) -> pd.Series:
+    if column not in frame:
+        return pd.Series(np.nan, index=frame.index)
+    return pd.to_numeric(frame[column], errors='coerce')
+
+
+def _strings(frame: pd.DataFrame, column: str, default) -> pd.Series:
+    if column not in frame:
+        return default if isinstance(default, pd.Series) else pd.Series(default, index=frame.index)
+    values = frame[column]
+    if values.hasnans:
+        values = values.astype(object).where(values.notna(), None).fillna(default)
+    # Text columns already hold str objects; only numeric codes need converting
+    return values if values.dtype == object and pd.api.types.infer_dtype(values, skipna=False) == 'string' else values.astype(str)
+
+
+def _flags(values: pd.Series) -> pd.Series:
+    if values.dtype == bool:
+        return values
+    return values.astype(str).str.strip().str.lower().isin(TRUE_STRINGS)
+
+
+def epoch_seconds(values: pd.Series) -> pd.Series:
+    """Epoch seconds from numeric or ISO-8601 (naive means UTC) values; unparseable ones become NaN"""
+    seconds = pd.to_numeric(values, errors='coerce')
+    unparsed = seconds.isna() & values.notna()
+    if unparsed.any():
+        parsed = pd.to_datetime(values[unparsed], errors='coerce', utc=True)
+        seconds[unparsed] = (parsed - pd.Timestamp(0, tz='UTC')).dt.total_seconds()
+    return seconds
+
+
+def _timestamps(frame: pd.DataFrame, now: float) -> pd.Series:
+    """Epoch seconds from numeric or ISO-8601 last_updated values; missing ones become now"""
+    if 'last_updated' not in frame:
+        return pd.Series(now, index=frame.index)
+    return epoch_seconds(frame['last_updated']).fillna(now)
+
+
+@contextmanager
+def _bulk_allocation():
+    """Hold off the cyclic GC while a load allocates hundreds of thousands of objects that all survive.
+
+    Left on, every few hundred new records trigger a collection that walks the
+    ever-growing young generations for nothing.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def stations_from_frame(frame: pd.DataFrame, station_type, now: Optional[float] = None) -> Tuple[List, int]:
+    """Build station records from an inventory table, column by column; returns (stations, rows skipped).
+
+    Rows without an id or with out-of-range coordinates are skipped, and a
+    repeated id keeps its last row. Missing optional columns take DEFAULTS;
+    missing power and price values take the median of the rest of the column,
+    so they neither win nor lose a ranking. Slot counts win over an
+    is_available flag, and is_available is always derived from them.
+    """
+    now = time.time() if now is None else now
+    frame = frame.rename(columns=lambda column: COLUMN_ALIASES.get(str(column).strip().lower(), str(column).strip().lower()))
+    missing = [column for column in REQUIRED_COLUMNS if column not in frame]
+    if missing:
+        raise ValueError(f"Station inventory has no {', '.join(missing)} column")
+
+    ids = _strings(frame, 'id', '')
+    latitudes, longitudes = _numbers(frame, 'latitude'), _numbers(frame, 'longitude')
+    valid = (ids != '') & latitudes.between(-90, 90) & longitudes.between(-180, 180)
+    valid &= ~ids.duplicated(keep='last')
+    rows = int(len(frame))
+    frame, ids, latitudes, longitudes = frame[valid], ids[valid], latitudes[valid], longitudes[valid]
+
+    total_slots = _numbers(frame, 'total_slots').fillna(DEFAULTS['total_slots']).clip(lower=1).astype(np.int64)
+    if 'available_slots' in frame:
+        available_slots = _numbers(frame, 'available_slots').fillna(total_slots)
+    elif 'is_available' in frame:
+        available_slots = total_slots.where(_flags(frame['is_available']), 0)
+    else:
+        available_slots = total_slots
+    available_slots = available_slots.clip(0, total_slots).astype(np.int64)
+
+    columns: Dict[str, pd.Series] = {
+        'id': ids,
+        'name': _strings(frame, 'name', ids),
+        'latitude': latitudes.astype(np.float64),
+        'longitude': longitudes.astype(np.float64),
+        'is_available': available_slots > 0,
+        'last_updated': _timestamps(frame, now),
+        'available_slots': available_slots,
+        'total_slots': total_slots,
+    }
+    for name in ('address', 'connector_type', 'operator'):
+        columns[name] = _strings(frame, name, DEFAULTS[name])
+    for name in ('power_kw', 'price_per_kwh'):
+        values = _numbers(frame, name)
+        fill = values.median() if values.notna().any() else DEFAULTS[name]
+        columns[name] = values.fillna(fill).astype(np.float64)
+
+    lists = {field.name: columns[field.name].tolist() for field in fields(station_type)}
+    if hasattr(station_type, 'from_columns'):
+        stations = station_type.from_columns(lists)
+    else:
+        stations = list(map(station_type, *lists.values()))
+    return stations, rows - int(valid.sum())
+
+
+class StationSource:
+    """Where the station inventory comes from.
+
+    load() returns every station. poll() is cheap and returns
+    (stations, complete) when the source changed since the last load or poll,
+    otherwise None; complete means the stations are the whole inventory, so
+    any station missing from them was removed.
+    """
+
+    def __init__(self, station_type):
+        self.station_type = station_type
+        self.skipped = 0
+
+    def load(self) -> List:
+        raise NotImplementedError
+
+    def poll(self) -> Optional[Tuple[List, bool]]:
+        return None
+
+    def _stations(self, frame: pd.DataFrame) -> List:
+        stations, self.skipped = stations_from_frame(frame, self.station_type)
+        return stations
+
+
+class FileStationSource(StationSource):
+    """An inventory file, re-read in full whenever its size or modification time changes"""
+
+    def __init__(self, path: str, station_type):
+        super().__init__(station_type)
+        self.path = path
+        self._signature = None
+
+    def _stat(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_frame(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def load(self) -> List:
+        signature = self._stat()
+        with _bulk_allocation():
+            stations = self._stations(self.read_frame())
+        self._signature = signature
+        return stations
+
+    def poll(self) -> Optional[Tuple[List, bool]]:
+        try:
+            if self._stat() == self._signature:
+                return None
+        except OSError:
+            return None  # being replaced; try again on the next poll
+        return self.load(), True
+
+
+class CsvStationSource(FileStationSource):
+    def read_frame(self) -> pd.DataFrame:
+        # Ids stay text (leading zeros, mixed codes); everything else is parsed by the C reader
+        id_columns = {column: str for column, field in COLUMN_ALIASES.items() if field == 'id'}
+        return pd.read_csv(self.path, dtype={'id': str, **id_columns}, skipinitialspace=True)
+
+
+class GeoJsonStationSource(FileStationSource):
+    """A FeatureCollection of Points; station fields are read from the feature properties"""
+
+    def read_frame(self) -> pd.DataFrame:
+        with open(self.path, encoding='utf-8') as handle:
+            features = json.load(handle).get('features', [])
+        frame = pd.DataFrame.from_records([feature.get('properties') or {} for feature in features])
+        coordinates = [
+            (feature.get('geometry') or {}).get('coordinates') if (feature.get('geometry') or {}).get('type') == 'Point'
+            else None
+            for feature in features
+        ]
+        frame['longitude'] = [point[0] if point else np.nan for point in coordinates]
+        frame['latitude'] = [point[1] if point else np.nan for point in coordinates]
+        if 'id' not in frame and 'station_id' not in frame:
+            frame['id'] = [feature.get('id') for feature in features]
+        return frame
+
+
+class ParquetStationSource(FileStationSource):
+    def read_frame(self) -> pd.DataFrame:
+        if pq is None:
+            raise RuntimeError('Parquet station inventories need pyarrow, which is not installed')
+        return pq.read_table(self.path).to_pandas()
+
+
+class SqliteStationSource(StationSource):
+    """A table in a local SQLite database, polled incrementally.
+
+    Each poll fetches the rows whose last_updated (epoch seconds) is at or
+    after the newest one seen so far (index that column for large tables); rows that did not really
+    change are skipped by the store. A change in row count means stations were
+    deleted or added without a newer timestamp, and triggers a full reload.
+    """
+
+    def __init__(self, path: str, station_type, table: str = 'stations'):
+        super().__init__(station_type)
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table):
+            raise ValueError(f"Invalid table name '{table}'")
+        self.path = path
+        self.table = table
+        self._watermark = None
+        self._count = None
+
+    def _query(self, sql: str, params: Tuple = ()) -> pd.DataFrame:
+        with closing(sqlite3.connect(f'file:{self.path}?mode=ro', uri=True)) as connection:
+            return pd.read_sql_query(sql, connection, params=params)
+
+    def _remember(self, stations: List, count: int):
+        self._count = count
+        if stations:
+            newest = max(station.last_updated for station in stations)
+            self._watermark = newest if self._watermark is None else max(self._watermark, newest)
+
+    def load(self) -> List:
+        with _bulk_allocation():
+            frame = self._query(f'SELECT * FROM "{self.table}"')
+            stations = self._stations(frame)
+        self._watermark = None
+        self._remember(stations, len(frame))
+        return stations
+
+    def poll(self) -> Optional[Tuple[List, bool]]:
+        count = int(self._query(f'SELECT COUNT(*) AS n FROM "{self.table}"')['n'][0])
+        if count != self._count or self._watermark is None:
+            return self.load(), True
+        frame = self._query(f'SELECT * FROM "{self.table}" WHERE last_updated >= ?', (self._watermark,))
+        if frame.empty:
+            return None
+        stations = self._stations(frame)
+        self._remember(stations, count)
+        return stations, False
+
+
+def open_station_source(path: str, station_type, table: str = 'stations') -> StationSource:
+    """Pick the source for an inventory path by its extension"""
+    kind = FILE_SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if kind == 'csv':
+        return CsvStationSource(path, station_type)
+    if kind == 'geojson':
+        return GeoJsonStationSource(path, station_type)
+    if kind == 'parquet':
+        return ParquetStationSource(path, station_type)
+    if kind == 'sqlite':
+        return SqliteStationSource(path, station_type, table)
+    raise ValueError(f"Unknown station inventory type for '{path}' (expected one of {', '.join(sorted(FILE_SUFFIXES))})")
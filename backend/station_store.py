@@ -0,0 +1,249 @@
+import re
+import secrets
+import threading
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from operator import attrgetter
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+
+def parse_since(value: str) -> Tuple[Optional[str], int]:
+    """(lineage or None, version) from a client's '<version>' or '<lineage>-<version>' (an ETag or event id)"""
+    match = re.fullmatch(r'(?:([0-9a-f]+)-)?(\d+)(?:-[a-z]+)?', value.strip().strip('"'))
+    if match is None:
+        raise ValueError('since must be a version or <lineage>-<version>')
+    return match.group(1), int(match.group(2))
+
+
+@dataclass(frozen=True)
+class StationSnapshot:
+    """Immutable, internally consistent view of every station at one version"""
+    version: int
+    stations: Tuple
+    positions: Mapping[str, int]
+    available: np.ndarray
+    index: object
+    # Only changes when stations are added, removed or moved, so derived geometry can be reused
+    layout_version: int
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def get(self, station_id: str):
+        pos = self.positions.get(station_id)
+        return None if pos is None else self.stations[pos]
+
+
+def _rebuild(records: List, columns: Mapping[str, List]) -> List:
+    """Copies of records with some fields replaced; one column at a time when the type has from_columns()"""
+    station_type = type(records[0])
+    if hasattr(station_type, 'from_columns'):
+        return station_type.from_columns({
+            field.name: columns[field.name] if field.name in columns else list(map(attrgetter(field.name), records))
+            for field in fields(station_type)
+        })
+    return [replace(record, **{name: values[i] for name, values in columns.items()}) for i, record in enumerate(records)]
+
+
+class StationStore:
+    """Copy-on-write station store.
+
+    Writers serialize on a lock, copy the station tuple, swap in replaced
+    records and publish a new snapshot with a higher version. Readers grab the
+    current snapshot with a single attribute read and never block or see a
+    half-applied update.
+    """
+
+    def __init__(self, index_factory: Callable[[Sequence], object], history: int = 1024):
+        self._index_factory = index_factory
+        # Identifies this line of versions; the shared table overrides it so all workers agree
+        self.lineage = secrets.token_hex(8)
+        self._lock = threading.Lock()
+        self._changes = deque(maxlen=history)
+        self._subscribers: List[Callable[[StationSnapshot, Optional[Tuple[str, ...]]], None]] = []
+        self._snapshot = self._build(0, (), 0)
+
+    def _build(self, version: int, stations: Tuple, layout_version: int, index=None) -> StationSnapshot:
+        return StationSnapshot(
+            version=version,
+            stations=stations,
+            positions={station.id: pos for pos, station in enumerate(stations)},
+            available=np.fromiter((s.is_available for s in stations), dtype=bool, count=len(stations)),
+            index=index if index is not None else self._index_factory(stations),
+            layout_version=layout_version
+        )
+
+    def snapshot(self) -> StationSnapshot:
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def subscribe(self, callback: Callable[[StationSnapshot, Optional[Tuple[str, ...]]], None]):
+        """Call callback(snapshot, changed_ids) after every publish; changed_ids is None for a full replace.
+
+        Callbacks run under the write lock, in publish order, so keep them short.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def _publish(self, snapshot: StationSnapshot, changed: Optional[Tuple[str, ...]]):
+        self._snapshot = snapshot
+        for callback in self._subscribers:
+            callback(snapshot, changed)
+
+    def _next_version(self, version: Optional[int]) -> int:
+        # An explicit version (e.g. mirrored from another process) may jump ahead but never go back
+        current = self._snapshot.version
+        return current + 1 if version is None or version <= current else version
+
+    def replace_all(self, stations: Sequence, version: Optional[int] = None) -> StationSnapshot:
+        """Publish a whole new station set; change history restarts from here"""
+        with self._lock:
+            current = self._snapshot
+            stations = tuple(stations)
+            snapshot = self._build(self._next_version(version), stations, current.layout_version + 1)
+            self._changes.clear()
+            self._publish(snapshot, None)
+            return snapshot
+
+    def update(self, changes: Mapping[str, Dict], version: Optional[int] = None) -> StationSnapshot:
+        """Apply field changes keyed by station id, publishing one new version if anything changed"""
+        with self._lock:
+            current = self._snapshot
+            stations = list(current.stations)
+            available = current.available.copy()
+            changed = []
+            for station_id, fields in changes.items():
+                pos = current.positions.get(station_id)
+                if pos is None or not fields:
+                    continue
+                if 'latitude' in fields or 'longitude' in fields:
+                    raise ValueError('Moving a station requires replace_all so the spatial index is rebuilt')
+                stations[pos] = replace(stations[pos], **fields)
+                available[pos] = stations[pos].is_available
+                changed.append(station_id)
+            if not changed:
+                return current
+            return self._publish_changes(current, stations, available, changed, version)
+
+    def update_columns(self, positions: Sequence[int], columns: Mapping[str, Sequence], layout_version: int,
+                       changes_only: Sequence[str] = (), version: Optional[int] = None) -> Optional[StationSnapshot]:
+        """Vectorized update(): set fields of the stations at positions from aligned value columns.
+
+        Positions (each at most once) index the station order of
+        layout_version; if the layout has moved on since, nothing is applied
+        and None is returned. Rows whose `changes_only` fields already hold
+        the given values are skipped. Publishes one new version if anything
+        changed, rebuilding the records a column at a time.
+        """
+        if 'latitude' in columns or 'longitude' in columns:
+            raise ValueError('Moving a station requires replace_all so the spatial index is rebuilt')
+        positions = np.asarray(positions, dtype=np.intp)
+        with self._lock:
+            current = self._snapshot
+            if current.layout_version != layout_version:
+                return None
+            old = list(map(current.stations.__getitem__, positions.tolist()))
+            # Plain Python values, not NumPy scalars, go into the records
+            values = {name: np.asarray(column) for name, column in columns.items()}
+            if changes_only and old:
+                differs = np.zeros(len(old), dtype=bool)
+                for name in changes_only:
+                    differs |= np.asarray(list(map(attrgetter(name), old))) != values[name]
+                if not differs.all():
+                    keep = np.flatnonzero(differs)
+                    positions, old = positions[keep], [old[i] for i in keep.tolist()]
+                    values = {name: column[keep] for name, column in values.items()}
+            if not old:
+                return current
+            records = _rebuild(old, {name: column.tolist() for name, column in values.items()})
+            stations = list(current.stations)
+            for pos, record in zip(positions.tolist(), records):
+                stations[pos] = record
+            available = current.available.copy()
+            available[positions] = [record.is_available for record in records]
+            return self._publish_changes(current, stations, available, [record.id for record in records], version)
+
+    def upsert(self, stations: Iterable, version: Optional[int] = None, remove_missing: bool = False) -> StationSnapshot:
+        """Insert or replace whole station records by id, publishing one new version if anything changed.
+
+        Records equal to the current ones are skipped. When every other record
+        replaces an existing station at its old coordinates this publishes like
+        update(), reusing the spatial index; new, moved or (with remove_missing,
+        for a full inventory) dropped stations change the layout, which
+        publishes like replace_all().
+        """
+        with self._lock:
+            current = self._snapshot
+            records, available = None, None
+            changed, added, seen = {}, {}, set()
+            moved = False
+            for station in stations:
+                seen.add(station.id)
+                pos = current.positions.get(station.id)
+                if pos is None:
+                    added[station.id] = station
+                    continue
+                old = current.stations[pos] if records is None else records[pos]
+                if old == station:
+                    continue
+                if records is None:
+                    records, available = list(current.stations), current.available.copy()
+                moved |= old.latitude != station.latitude or old.longitude != station.longitude
+                records[pos] = station
+                available[pos] = station.is_available
+                changed[station.id] = None
+            removed = remove_missing and len(seen) - len(added) < len(current.stations)
+            if added or moved or removed:
+                merged = current.stations if records is None else records
+                if removed:
+                    merged = [station for station in merged if station.id in seen]
+                snapshot = self._build(self._next_version(version), tuple(merged) + tuple(added.values()),
+                                       current.layout_version + 1)
+                self._changes.clear()
+                self._publish(snapshot, None)
+                return snapshot
+            if not changed:
+                return current
+            return self._publish_changes(current, records, available, list(changed), version)
+
+    def _publish_changes(self, current: StationSnapshot, stations: List, available: np.ndarray, changed: List[str],
+                         version: Optional[int]) -> StationSnapshot:
+        """Publish records changed in place: same positions, same layout, same spatial index"""
+        version = self._next_version(version)
+        snapshot = StationSnapshot(
+            version=version,
+            stations=tuple(stations),
+            positions=current.positions,
+            available=available,
+            index=current.index,
+            layout_version=current.layout_version
+        )
+        changed = tuple(changed)
+        self._changes.append((current.version, version, changed))
+        self._publish(snapshot, changed)
+        return snapshot
+
+    def changed_since(self, version: int) -> Optional[List[str]]:
+        """Ids of stations changed after `version`, or None if the history doesn't reach back that far.
+
+        A version ahead of the store's is from another line of versions (a
+        restart, another process) and gets None as well.
+        """
+        with self._lock:
+            current = self._snapshot.version
+            if version > current:
+                return None
+            if version == current:
+                return []
+            # Each entry covers (previous_version, version]; versions may skip when mirrored
+            if not self._changes or self._changes[0][0] > version:
+                return None
+            changed = {}
+            for _, change_version, ids in self._changes:
+                if change_version > version:
+                    changed.update(dict.fromkeys(ids))
+            return list(changed)
@@ -0,0 +1,264 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from station_source import epoch_seconds
+
+# Common spellings in status event exports -> event column
+EVENT_ALIASES = {
+    'id': 'station_id', 'available': 'available_slots', 'slots': 'available_slots', 'free_slots': 'available_slots',
+    'ts': 'timestamp', 'time': 'timestamp', 'last_updated': 'timestamp', 'updated_at': 'timestamp',
+}
+
+
+@dataclass(frozen=True)
+class StatusBatch:
+    """Station status events as aligned columns: which station, how many slots are free, and when (epoch seconds)"""
+    station_ids: np.ndarray
+    available_slots: np.ndarray
+    timestamps: np.ndarray
+
+    @classmethod
+    def of(cls, station_ids: Iterable[str], available_slots: Iterable[int], timestamps) -> 'StatusBatch':
+        station_ids = np.asarray(list(station_ids), dtype=object)
+        available_slots = np.asarray(list(available_slots), dtype=np.int64)
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), station_ids.shape).copy()
+        return cls(station_ids, available_slots, timestamps)
+
+    @classmethod
+    def concat(cls, batches: Iterable['StatusBatch']) -> 'StatusBatch':
+        """One batch of the events of (at least one) batches, in order"""
+        batches = list(batches)
+        if len(batches) == 1:
+            return batches[0]
+        return cls(np.concatenate([batch.station_ids for batch in batches]),
+                   np.concatenate([batch.available_slots for batch in batches]),
+                   np.concatenate([batch.timestamps for batch in batches]))
+
+    def __len__(self) -> int:
+        return len(self.station_ids)
+
+    def __getitem__(self, index: slice) -> 'StatusBatch':
+        return StatusBatch(self.station_ids[index], self.available_slots[index], self.timestamps[index])
+
+
+class StatusEvents:
+    """Where status events come from. poll() returns the events due by `now` (oldest first), or None"""
+
+    def poll(self, snapshot, now: float) -> Optional[StatusBatch]:
+        raise NotImplementedError
+
+
+class SimulatedStatusEvents(StatusEvents):
+    """Demo traffic: each poll, a random share of the stations reports a random number of free slots"""
+
+    def __init__(self, change_share: float = 0.3, seed: Optional[int] = None):
+        self.change_share = change_share
+        self._rng = np.random.default_rng(seed)
+        self._layout = None
+
+    def _columns(self, snapshot):
+        # Ids and capacities only change with the layout
+        if self._layout is None or self._layout[0] != snapshot.layout_version:
+            stations = snapshot.stations
+            self._layout = (snapshot.layout_version,
+                            np.array([station.id for station in stations], dtype=object),
+                            np.array([station.total_slots for station in stations], dtype=np.int64))
+        return self._layout[1], self._layout[2]
+
+    def poll(self, snapshot, now: float) -> Optional[StatusBatch]:
+        if not len(snapshot.stations):
+            return None
+        ids, total_slots = self._columns(snapshot)
+        picked = np.flatnonzero(self._rng.random(len(ids)) < self.change_share)
+        slots = self._rng.integers(0, total_slots[picked] + 1)
+        return StatusBatch(ids[picked], slots, np.full(len(picked), now))
+
+
+class ReplayStatusEvents(StatusEvents):
+    """Events recorded in a CSV or JSON Lines file, replayed in timestamp order.
+
+    Needs station_id and available_slots columns; a timestamp column
+    (epoch seconds or ISO-8601) spaces the events out, otherwise they all
+    arrive on the first poll. The recording starts on the first poll and runs
+    `speed` times faster than it was recorded; replayed events are stamped
+    with the time they are replayed at.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, loop: bool = False):
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+        self._events = self._read(path)
+        self._cursor = 0
+        self._started: Optional[float] = None
+
+    @staticmethod
+    def _read(path: str) -> StatusBatch:
+        if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson'):
+            frame = pd.read_json(path, lines=True, dtype={'station_id': str, 'id': str})
+        else:
+            frame = pd.read_csv(path, dtype={'station_id': str, 'id': str}, skipinitialspace=True)
+        frame = frame.rename(columns=lambda column: EVENT_ALIASES.get(str(column).strip().lower(), str(column).strip().lower()))
+        missing = [column for column in ('station_id', 'available_slots') if column not in frame]
+        if missing:
+            raise ValueError(f"Status events in '{path}' have no {', '.join(missing)} column")
+        slots = pd.to_numeric(frame['available_slots'], errors='coerce')
+        timestamps = epoch_seconds(frame['timestamp']) if 'timestamp' in frame else pd.Series(0.0, index=frame.index)
+        valid = frame['station_id'].notna() & slots.notna() & timestamps.notna()
+        order = np.argsort(timestamps[valid].to_numpy(dtype=np.float64), kind='stable')
+        return StatusBatch(frame['station_id'][valid].astype(str).to_numpy(dtype=object)[order],
+                           slots[valid].to_numpy(dtype=np.int64)[order],
+                           timestamps[valid].to_numpy(dtype=np.float64)[order])
+
+    def poll(self, snapshot, now: float) -> Optional[StatusBatch]:
+        events = self._events
+        if not len(events):
+            return None
+        if self._started is None:
+            self._started = now
+        if self._cursor == len(events):
+            if not self.loop:
+                return None
+            self._cursor, self._started = 0, now
+        # Recording time reached so far
+        reached = events.timestamps[0] + (now - self._started) * self.speed
+        end = int(np.searchsorted(events.timestamps, reached, side='right'))
+        if end <= self._cursor:
+            return None
+        due = events[self._cursor:end]
+        self._cursor = end
+        return StatusBatch(due.station_ids, due.available_slots,
+                           self._started + (due.timestamps - events.timestamps[0]) / self.speed)
+
+
+class QueuedStatusEvents(StatusEvents):
+    """In-process queue that producers put() batches on; each poll drains it.
+
+    Stands in for a message-queue consumer. Past max_events waiting, the
+    oldest batches are dropped (and counted) so a stalled consumer can't grow
+    memory without bound.
+    """
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.max_events = max_events
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._batches: Deque[StatusBatch] = deque()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def put(self, batch: StatusBatch):
+        with self._lock:
+            self._batches.append(batch)
+            self._size += len(batch)
+            while self._size > self.max_events and len(self._batches) > 1:
+                dropped = self._batches.popleft()
+                self._size -= len(dropped)
+                self.dropped += len(dropped)
+
+    def poll(self, snapshot, now: float) -> Optional[StatusBatch]:
+        with self._lock:
+            if not self._batches:
+                return None
+            batches, self._batches, self._size = self._batches, deque(), 0
+        return StatusBatch.concat(batches)
+
+
+class StatusIngest:
+    """Applies status events to the store as vectorized column updates.
+
+    Events for unknown stations are dropped, several events for one station
+    collapse into the latest, slot counts are clipped to the station's
+    capacity and events that leave a station's free slots as they are
+    change nothing. Large batches go to the store in chunks of batch_size,
+    each published on its own, so readers and the subscribers' incremental
+    updates never wait on one huge swap.
+
+    Every received event ends up in exactly one counter: applied, unchanged,
+    unknown (no such station), superseded (a later event for the station in
+    the same chunk won) or dropped (the chunk kept losing races with layout
+    swaps and was given up).
+    """
+
+    def __init__(self, store, events: Optional[StatusEvents] = None, batch_size: int = 5000):
+        self.store = store
+        self.events = events
+        self.batch_size = batch_size
+        self.received = 0
+        self.applied = 0
+        self.unchanged = 0
+        self.unknown = 0
+        self.superseded = 0
+        self.dropped = 0
+        self.last_tick_seconds = 0.0
+
+    def tick(self, now: Optional[float] = None) -> int:
+        """Poll the event source once and apply what it returned; returns the stations changed"""
+        if self.events is None:
+            return 0
+        started = time.perf_counter()
+        applied = self.apply(self.events.poll(self.store.snapshot(), time.time() if now is None else now))
+        self.last_tick_seconds = time.perf_counter() - started
+        return applied
+
+    def apply(self, batch: Optional[StatusBatch]) -> int:
+        """Apply a batch of events (oldest first); returns the stations changed"""
+        if batch is None:
+            return 0
+        self.received += len(batch)
+        applied = 0
+        for start in range(0, len(batch), self.batch_size):
+            applied += self._apply_chunk(batch[start:start + self.batch_size])
+            # Let request threads (or greenlets) in between chunks
+            time.sleep(0)
+        self.applied += applied
+        return applied
+
+    def _apply_chunk(self, chunk: StatusBatch) -> int:
+        # A layout swap between resolving positions and publishing sends the chunk round again
+        for _ in range(3):
+            snapshot = self.store.snapshot()
+            get = snapshot.positions.get
+            positions = np.fromiter((get(station_id, -1) for station_id in chunk.station_ids.tolist()),
+                                    dtype=np.intp, count=len(chunk))
+            known = np.flatnonzero(positions >= 0)
+            # The last event per station wins: unique over the reversed order finds each one's last
+            reversed_positions = positions[known][::-1]
+            _, first = np.unique(reversed_positions, return_index=True)
+            rows = known[len(known) - 1 - first]
+            positions = positions[rows]
+            stations = snapshot.stations
+            total_slots = np.fromiter((stations[pos].total_slots for pos in positions.tolist()),
+                                      dtype=np.int64, count=len(positions))
+            slots = np.clip(chunk.available_slots[rows], 0, total_slots)
+            published = self.store.update_columns(
+                positions,
+                {'available_slots': slots, 'is_available': slots > 0, 'last_updated': chunk.timestamps[rows]},
+                snapshot.layout_version, changes_only=('available_slots',))
+            if published is not None:
+                # Records the update replaced are new objects; skipped ones are the very same
+                changed = sum(published.stations[pos] is not stations[pos] for pos in positions.tolist())
+                self.unknown += len(chunk) - len(known)
+                self.superseded += len(known) - len(rows)
+                self.unchanged += len(rows) - changed
+                return changed
+        self.dropped += len(chunk)
+        return 0
+
+    def stats(self) -> Dict:
+        return {
+            'received': self.received,
+            'applied': self.applied,
+            'unchanged': self.unchanged,
+            'unknown': self.unknown,
+            'superseded': self.superseded,
+            'dropped': self.dropped,
+            'last_tick_seconds': round(self.last_tick_seconds, 4),
+        }
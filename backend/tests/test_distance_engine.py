@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+from distance_engine import VECTORIZE_FROM, geodesic_km, vincenty_km
+
+# Well under a millimetre, in km
+TOLERANCE_KM = 1e-7
+
+
+def _geopy_km(lat, lng, latitudes, longitudes):
+    return np.array([geodesic((lat, lng), (other_lat, other_lng)).kilometers
+                     for other_lat, other_lng in zip(latitudes.tolist(), longitudes.tolist())])
+
+
+@pytest.mark.parametrize('count', [VECTORIZE_FROM // 2, VECTORIZE_FROM * 50])
+def test_matches_geopy_around_the_globe(count):
+    # Both the per-point path (few points) and the array path (many)
+    rng = np.random.default_rng(count)
+    for lat, lng in [(31.3, 75.6), (-33.9, 151.2), (0.0, 179.99), (89.9, -20.0)]:
+        latitudes, longitudes = rng.uniform(-90, 90, count), rng.uniform(-180, 180, count)
+        np.testing.assert_allclose(geodesic_km(lat, lng, latitudes, longitudes),
+                                   _geopy_km(lat, lng, latitudes, longitudes), rtol=0, atol=TOLERANCE_KM)
+
+
+def test_matches_geopy_on_short_and_special_lines():
+    lat, lng = 0.0, 0.0
+    points = [
+        (0.0, 0.0),                      # coincident
+        (1e-7, 1e-7), (0.001, 0.0005),   # metres apart
+        (0.0, 90.0), (0.0, -179.0),      # along the equator
+        (90.0, 0.0), (-90.0, 123.0),     # to the poles, along meridians
+        (45.0, 180.0),
+    ]
+    latitudes, longitudes = np.array(points).T
+    expected = _geopy_km(lat, lng, latitudes, longitudes)
+    np.testing.assert_allclose(geodesic_km(lat, lng, latitudes, longitudes), expected, rtol=0, atol=TOLERANCE_KM)
+    many = np.tile(latitudes, VECTORIZE_FROM), np.tile(longitudes, VECTORIZE_FROM)
+    np.testing.assert_allclose(geodesic_km(lat, lng, *many), np.tile(expected, VECTORIZE_FROM), rtol=0, atol=TOLERANCE_KM)
+
+
+def test_nearly_antipodal_pairs_match_geopy():
+    # Vincenty converges slowly or not at all here; those pairs must still come out as geopy's
+    rng = np.random.default_rng(3)
+    lat, lng = 10.0, 20.0
+    latitudes = -lat + rng.uniform(-0.5, 0.5, VECTORIZE_FROM * 10)
+    longitudes = (lng + 180 + rng.uniform(-0.5, 0.5, VECTORIZE_FROM * 10) + 180) % 360 - 180
+    latitudes[:4], longitudes[:4] = -lat, (lng + 180 + 180) % 360 - 180
+    expected = _geopy_km(lat, lng, latitudes, longitudes)
+    np.testing.assert_allclose(geodesic_km(lat, lng, latitudes, longitudes), expected, rtol=0, atol=TOLERANCE_KM)
+    for i in range(8):
+        assert vincenty_km(lat, lng, latitudes[i], longitudes[i]) == pytest.approx(expected[i], abs=TOLERANCE_KM)
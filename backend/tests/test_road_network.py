@@ -0,0 +1,31 @@
+import math
+import pytest
+from road_network import HIGHWAY_SPEEDS_KMH, RoadGraph, _speed
+
+OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="31.30" lon="75.50"/>
+  <node id="2" lat="31.31" lon="75.50"/>
+  <node id="3" lat="31.32" lon="75.50"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><tag k="highway" v="primary"/><tag k="maxspeed" v="{first}"/></way>
+  <way id="11"><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/><tag k="maxspeed" v="{second}"/></way>
+</osm>
+"""
+
+
+@pytest.mark.parametrize('maxspeed', ['0', '-30', '0 mph', 'nan', 'inf', 'none', ''])
+def test_unusable_maxspeed_falls_back_to_the_highway_default(maxspeed):
+    assert _speed({'highway': 'primary', 'maxspeed': maxspeed}) == HIGHWAY_SPEEDS_KMH['primary']
+
+
+def test_maxspeed_is_used_when_valid():
+    assert _speed({'highway': 'primary', 'maxspeed': '80'}) == 80
+    assert _speed({'highway': 'primary', 'maxspeed': '30 mph'}) == pytest.approx(48.27)
+
+
+def test_zero_maxspeed_builds_finite_travel_times(tmp_path):
+    path = tmp_path / 'roads.osm'
+    path.write_text(OSM.format(first='0', second='-5'))
+    graph = RoadGraph.from_osm(str(path))
+    assert len(graph.seconds) == 4
+    assert all(0 < seconds < math.inf for seconds in graph.seconds.tolist())
@@ -0,0 +1,61 @@
+"""Several worker processes against one SHARED_STATE_PATH, the way gunicorn runs them.
+
+The worker that wins the table lock publishes updates as fast as it can; the
+others keep reading. Each reports a digest of the stations it saw per version.
+"""
+import hashlib
+import multiprocessing
+import os
+import time
+
+WORKERS = 4
+SECONDS = 3.0
+
+
+def _digest(stations) -> str:
+    text = '|'.join(f'{s.id},{s.available_slots},{s.is_available},{s.last_updated}' for s in stations)
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def _worker(path: str, seconds: float, results):
+    os.environ['SHARED_STATE_PATH'] = path
+    os.environ['BACKGROUND_UPDATES'] = 'none'
+    from app import charging_service
+    seen, torn = {}, 0
+    writer = charging_service.owns_updates()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if writer:
+            charging_service.simulate_real_time_updates()
+        snapshot = charging_service.snapshot()
+        # A record read mid-update would disagree with itself
+        torn += sum(1 for s in snapshot.stations if s.is_available != (s.available_slots > 0))
+        seen[snapshot.version] = _digest(snapshot.stations)
+    results.put((writer, seen, torn))
+
+
+def test_workers_agree_on_every_version(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    path = str(tmp_path / 'stations.tbl')
+    processes = [context.Process(target=_worker, args=(path, SECONDS, results)) for _ in range(WORKERS)]
+    for process in processes:
+        process.start()
+    try:
+        reports = [results.get(timeout=SECONDS + 60) for _ in processes]
+    finally:
+        for process in processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.kill()
+
+    assert sum(writer for writer, _, _ in reports) == 1
+    assert [torn for _, _, torn in reports] == [0] * WORKERS
+    by_version = {}
+    for _, seen, _ in reports:
+        for version, digest in seen.items():
+            by_version.setdefault(version, set()).add(digest)
+    assert {version: digests for version, digests in by_version.items() if len(digests) > 1} == {}
+    # The readers really followed the writer rather than each serving data of their own
+    shared = [version for version in by_version if sum(version in seen for _, seen, _ in reports) > 1]
+    assert len(shared) > 1
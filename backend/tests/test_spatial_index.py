@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from distance_engine import DistanceEngine
+from spatial_index import StationSpatialIndex
+
+
+@pytest.mark.parametrize('precision', ['haversine', 'exact'])
+def test_queries_cross_the_antimeridian(precision):
+    # 2.2 km away across the antimeridian, and 110 km away on the user's side
+    index = StationSpatialIndex(DistanceEngine([0.0, 0.0], [-179.99, 179.0], precision))
+
+    found, distances = index.nearest(0.0, 179.99)
+    assert found.tolist() == [0]
+    assert distances[0] == pytest.approx(2.2, abs=0.1)
+
+    found, _ = index.within(0.0, 179.99, 5)
+    assert found.tolist() == [0]
+
+    found, _ = index.within(0.0, -179.99, 150)
+    assert found.tolist() == [0, 1]
+
+
+def test_matches_brute_force_around_the_globe():
+    rng = np.random.default_rng(7)
+    engine = DistanceEngine(rng.uniform(-70, 70, 3000), rng.uniform(-180, 180, 3000), 'haversine')
+    index = StationSpatialIndex(engine)
+    for lat, lng in zip(rng.uniform(-70, 70, 100).tolist(), rng.uniform(-180, 180, 100).tolist()):
+        assert index.nearest(lat, lng, 3)[0].tolist() == engine.nearest(lat, lng, 3)[0].tolist()
+        assert sorted(index.within(lat, lng, 300)[0].tolist()) == sorted(engine.within(lat, lng, 300)[0].tolist())
+
+
+def test_rejects_non_finite_coordinates():
+    index = StationSpatialIndex(DistanceEngine([31.3], [75.6]))
+    with pytest.raises(ValueError):
+        index.nearest(float('inf'), 75.6)
+    with pytest.raises(ValueError):
+        index.within(31.3, float('nan'), 5)
+    # A huge but finite radius covers the globe instead of overflowing
+    assert index.within(31.3, 75.6, 1e308)[0].tolist() == [0]